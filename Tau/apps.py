@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class TauConfig(AppConfig):
+    name = "Tau"
+
+    def ready(self):
+        # Count SQL per resolver on every connection (see metrics.py)
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_sql_timer
+
+        connection_created.connect(install_sql_timer, dispatch_uid="tau-sql-timer")
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Tau.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up: it resolves URLs
+from Tau.limits import RequestSizeLimitMiddleware  # noqa: E402
+
+# Oversized bodies are refused before Django reads them (see Tau/limits.py)
+application = RequestSizeLimitMiddleware(django_application)
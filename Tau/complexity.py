@@ -0,0 +1,228 @@
+"""
+Static cost and depth limits for GraphQL operations.
+
+Before any resolver runs, QueryCostExtension estimates what an operation
+will cost and rejects it if that is over GRAPHQL_MAX_COST (or nested
+deeper than GRAPHQL_MAX_DEPTH). One expensive document would otherwise
+keep a worker, and the database, busy for everyone else.
+
+The estimate only looks at the document, so it is computed once per
+document and operation and cached next to the parsed AST (see
+documents.py). It is deliberately pessimistic:
+
+- every field costs 1, image URL fields (storage, renditions) more, see
+  FIELD_COSTS;
+- the cost of a list's items is multiplied by its expected length: the
+  page size for paginated fields ('first' / 'limitPerRail'; a variable
+  counts as the largest page), LIST_SIZES for the small lists we know,
+  and UNPAGINATED_LIST_SIZE for the rest (e.g. Query.movies, which
+  returns the whole catalog);
+- aliases, fragments and inline fragments are all counted, as if every
+  @skip/@include let the field through.
+
+Introspection fields cost nothing and don't count toward the depth, so
+GraphiQL keeps working.
+"""
+
+from functools import lru_cache
+
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    IntValueNode,
+    NullValueNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_list_type,
+)
+from graphql.utilities import get_operation_ast
+from strawberry.extensions import SchemaExtension
+from strawberry.schema.execute import validate_document
+
+from streaming.pagination import MAX_PAGE_SIZE, page_size
+
+from .documents import cached_parse
+from .metrics import QUERIES_REJECTED
+
+IMAGE_FIELD_COST = 5
+
+# "Type.field" -> cost of one call; every other field costs 1
+FIELD_COSTS = {
+    "MovieType.posterMobileUrl": IMAGE_FIELD_COST,
+    "MovieType.posterDesktopUrl": IMAGE_FIELD_COST,
+    "MovieType.backdropLargeUrl": IMAGE_FIELD_COST,
+    "MovieType.posterSrcset": IMAGE_FIELD_COST,
+    "MovieType.backdropSrcset": IMAGE_FIELD_COST,
+    "MovieType.posterOriginalUrl": IMAGE_FIELD_COST,
+    "MovieType.backdropOriginalUrl": IMAGE_FIELD_COST,
+}
+
+# Arguments that bound the length of the lists below the field
+PAGE_ARGUMENTS = ("first", "limitPerRail")
+
+# Expected length of the lists that aren't paginated but stay small. These
+# are estimates, not limits: nothing stops the catalog from having more
+# categories than this (a longer list runs, it's just under-counted). The
+# cost is computed once per document, so it can't follow the real counts
+LIST_SIZES = {
+    "Query.categories": 50,
+    "Query.homeRails": 50,
+    "CatalogFacets.categories": 50,
+    "MovieType.categories": 3,
+    # One entry per width and format (streaming/renditions.py)
+    "MovieType.posterSrcset": 8,
+    "MovieType.backdropSrcset": 8,
+}
+
+# Any other list without a page size: as long as the catalog
+UNPAGINATED_LIST_SIZE = 250
+
+
+class Analysis:
+    """Cost and depth of one operation of a document."""
+
+    def __init__(self, schema, document):
+        self.schema = schema
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        # (selection set, page size) -> (cost, depth). Fragments used many
+        # times are analyzed once, so nesting them can't blow up the analysis
+        self.memo = {}
+
+    def operation(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        return self.selection_set(root_type, operation.selection_set, None)
+
+    def selection_set(self, parent_type, selection_set, page):
+        key = (id(selection_set), page)
+        if key not in self.memo:
+            self.memo[key] = self.selections(parent_type, selection_set.selections, page)
+        return self.memo[key]
+
+    def selections(self, parent_type, selections, page):
+        cost = depth = 0
+        for selection in selections:
+            if isinstance(selection, FieldNode):
+                field_cost, field_depth = self.field(parent_type, selection, page)
+            else:
+                if isinstance(selection, FragmentSpreadNode):
+                    selection = self.fragments[selection.name.value]
+                type_condition = selection.type_condition
+                fragment_type = (
+                    self.schema.get_type(type_condition.name.value) if type_condition else parent_type
+                )
+                field_cost, field_depth = self.selection_set(fragment_type, selection.selection_set, page)
+            cost += field_cost
+            depth = max(depth, field_depth)
+        return cost, depth
+
+    def field(self, parent_type, node, page):
+        name = node.name.value
+        if name.startswith("__"):
+            return 0, 0
+        coordinate = f"{parent_type.name}.{name}"
+        field = parent_type.fields[name]
+        cost = FIELD_COSTS.get(coordinate, 1)
+        if node.selection_set is None:
+            return cost, 1
+
+        size = self.page_size(node)
+        if size is not None:
+            page = size
+        children, depth = self.selection_set(get_named_type(field.type), node.selection_set, page)
+        if is_list_type(get_nullable_type(field.type)):
+            children *= LIST_SIZES.get(coordinate, UNPAGINATED_LIST_SIZE if page is None else page)
+        return cost + children, depth + 1
+
+    @staticmethod
+    def page_size(node):
+        for argument in node.arguments:
+            if argument.name.value not in PAGE_ARGUMENTS:
+                continue
+            value = argument.value
+            if isinstance(value, VariableNode):
+                # Could be anything: assume the largest page
+                return MAX_PAGE_SIZE
+            if isinstance(value, NullValueNode):
+                return page_size(None)
+            if isinstance(value, IntValueNode):
+                return page_size(max(int(value.value), 0))
+        return None
+
+
+def analyze(schema, document, operation_name=None):
+    """
+    (cost, depth) of the operation that would run, or None if there's no
+    such operation (execution reports that).
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return None
+    return Analysis(schema, document).operation(operation)
+
+
+@lru_cache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+def cached_analyze(schema, query, operation_name):
+    # 'schema' is the graphql-core schema, hashed by identity
+    return analyze(schema, cached_parse(query), operation_name)
+
+
+class QueryCostExtension(SchemaExtension):
+    """
+    Reject operations over the cost or depth budget (see the module
+    docstring) at validation time. List it after DocumentCacheExtension,
+    whose validation result it reuses.
+    """
+
+    def on_validate(self):
+        execution_context = self.execution_context
+        if execution_context.graphql_document is not None:
+            if execution_context.errors is None:
+                # Not validated by DocumentCacheExtension: the analysis needs a valid document
+                execution_context.errors = validate_document(
+                    execution_context.schema._schema,
+                    execution_context.graphql_document,
+                    execution_context.validation_rules,
+                )
+            if not execution_context.errors:
+                error = self.check(execution_context)
+                if error is not None:
+                    # Strawberry stops here, before execution
+                    execution_context.errors = [error]
+        yield
+
+    @staticmethod
+    def check(execution_context):
+        schema = execution_context.schema._schema
+        if execution_context.parse_options:
+            # Not the document of cached_parse()
+            result = analyze(schema, execution_context.graphql_document, execution_context.operation_name)
+        else:
+            result = cached_analyze(schema, execution_context.query, execution_context.operation_name)
+        return None if result is None else over_budget(*result)
+
+
+def over_budget(cost, depth):
+    """The error for an operation over budget, or None. A limit of 0 is no limit."""
+    max_depth = settings.GRAPHQL_MAX_DEPTH
+    if max_depth and depth > max_depth:
+        QUERIES_REJECTED.inc(1, "depth")
+        return GraphQLError(
+            f"Query is nested {depth} levels deep, the maximum is {max_depth}",
+            extensions={"code": "QUERY_TOO_DEEP", "depth": depth, "maxDepth": max_depth},
+        )
+    max_cost = settings.GRAPHQL_MAX_COST
+    if max_cost and cost > max_cost:
+        QUERIES_REJECTED.inc(1, "cost")
+        return GraphQLError(
+            f"Query cost {cost} is over the limit of {max_cost}",
+            extensions={"code": "QUERY_TOO_COMPLEX", "cost": cost, "maxCost": max_cost},
+        )
+    return None
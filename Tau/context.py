@@ -0,0 +1,36 @@
+"""
+Per-request GraphQL context.
+
+Besides the Django request/response, every request gets its own set of
+DataLoaders. A loader collects all the .load(key) calls made while one
+"level" of the query resolves and runs ONE batched query for them, so
+e.g. the categories of 300 movies cost a single SQL query.
+
+Loaders cache their results, which is why they must never outlive the
+request that created them.
+"""
+
+from dataclasses import dataclass, field
+
+from strawberry.dataloader import DataLoader
+from strawberry.django.context import StrawberryDjangoContext
+
+
+@dataclass
+class TauContext(StrawberryDjangoContext):
+    loaders: dict = field(default_factory=dict)
+
+
+def get_loader(info, load_fn):
+    """
+    The request's DataLoader for 'load_fn' (an async batch function),
+    created on first use.
+    """
+    loaders = getattr(info.context, "loaders", None)
+    if loaders is None:
+        # Executed without our view (e.g. schema.execute in a script):
+        # still correct, just not batched
+        return DataLoader(load_fn=load_fn, cache=False)
+    if load_fn not in loaders:
+        loaders[load_fn] = DataLoader(load_fn=load_fn)
+    return loaders[load_fn]
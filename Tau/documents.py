@@ -0,0 +1,127 @@
+"""
+Query documents: persisted queries and the parse/validate cache.
+
+Our frontend sends the same handful of GraphQL documents over and over.
+Two things make that cheap:
+
+1. DocumentCacheExtension keeps the parsed AST and the validation result
+   of recent documents in an LRU, so a repeated query skips both steps.
+
+2. Automatic persisted queries (the Apollo "APQ" protocol): the client
+   may send only the sha256 of the query in
+   extensions.persistedQuery.sha256Hash. If we don't know that hash yet we
+   answer PersistedQueryNotFound and the client retries once with the full
+   text, which we then remember (in the Django cache, shared by workers).
+   Anyone can register a document, so an entry expires after
+   PERSISTED_QUERY_TIMEOUT without use, and documents longer than
+   PERSISTED_QUERY_MAX_LENGTH are run but not remembered.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError
+from strawberry.extensions import SchemaExtension
+from strawberry.schema.execute import parse_document, validate_document
+
+PERSISTED_QUERY_KEY = "apq:{}"
+
+
+@lru_cache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+def cached_parse(query):
+    return parse_document(query)
+
+
+@lru_cache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+def cached_validate(schema, query, validation_rules):
+    # 'schema' is the graphql-core schema, hashed by identity
+    return validate_document(schema, cached_parse(query), list(validation_rules))
+
+
+class DocumentCacheExtension(SchemaExtension):
+    """
+    Serve parsing and validation from the LRUs above.
+
+    Strawberry reuses extension *instances* across requests, which isn't
+    thread safe, so register this one as a class: the caches are module
+    level and shared, the extension object is per request.
+    """
+
+    def on_parse(self):
+        execution_context = self.execution_context
+        if not execution_context.parse_options:
+            try:
+                execution_context.graphql_document = cached_parse(execution_context.query)
+            except GraphQLError:
+                # Leave it to strawberry so the syntax error is reported as usual
+                pass
+        yield
+
+    def on_validate(self):
+        execution_context = self.execution_context
+        if execution_context.graphql_document is not None and execution_context.errors is None:
+            errors = cached_validate(
+                execution_context.schema._schema,
+                execution_context.query,
+                tuple(execution_context.validation_rules),
+            )
+            # Copy: the list ends up in the response and must not be shared
+            execution_context.errors = list(errors)
+        yield
+
+
+class PersistedQueryError(Exception):
+    """An APQ request we can't serve. Sent back as a regular GraphQL error."""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+    def as_json(self):
+        return {"errors": [{"message": self.message, "extensions": {"code": self.code}}]}
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def resolve_persisted_query(query, extensions):
+    """
+    Return the query text to execute for a request.
+
+    'extensions' is the request's "extensions" member (dict, JSON string
+    from a GET request, or None). Raises PersistedQueryError when the hash
+    is unknown or doesn't match the text.
+    """
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            extensions = None
+    persisted = (extensions or {}).get("persistedQuery")
+    if not persisted:
+        return query
+
+    if persisted.get("version") != 1:
+        raise PersistedQueryError("Unsupported persisted query version", "PERSISTED_QUERY_NOT_SUPPORTED")
+    sha256_hash = persisted.get("sha256Hash") or ""
+
+    key = PERSISTED_QUERY_KEY.format(sha256_hash)
+    if query is None:
+        query = cache.get(key)
+        if query is None:
+            raise PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+        # Documents in use never expire; the rest do
+        cache.touch(key, settings.PERSISTED_QUERY_TIMEOUT)
+        return query
+
+    # Full text + hash: check it, then remember it for next time
+    if query_hash(query) != sha256_hash:
+        raise PersistedQueryError("provided sha does not match query", "INVALID_PERSISTED_QUERY")
+    if len(query) <= settings.PERSISTED_QUERY_MAX_LENGTH:
+        cache.set(key, query, timeout=settings.PERSISTED_QUERY_TIMEOUT)
+    return query
@@ -0,0 +1,78 @@
+"""
+Request body size limits, enforced at the ASGI level.
+
+Under ASGI, Django reads the whole request body (ASGIHandler.read_body)
+before any view or upload handler runs, so the checks in
+streaming/uploads.py can only refuse a body that was already received.
+This middleware sits in front of Django (Tau/asgi.py) and refuses it
+before reading it:
+    - a Content-Length over the limit gets a 413 without a byte read
+    - a body sent without one (chunked) is counted as it arrives and cut
+      off with a 413 as soon as it goes over
+
+The limit is MAX_UPLOAD_REQUEST_SIZE, or MAX_IMPORT_REQUEST_SIZE for the
+view that takes bulk import files (the one routed with allow_imports=True,
+see Tau/urls.py). nginx applies the same limits first (client_max_body_size).
+"""
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+
+def max_request_size(path):
+    """The largest body the view at 'path' accepts."""
+    try:
+        view = resolve(path).func
+    except Resolver404:
+        return settings.MAX_UPLOAD_REQUEST_SIZE
+    # as_view() keeps its arguments on the view function, csrf_exempt copies them
+    if getattr(view, "view_initkwargs", {}).get("allow_imports"):
+        return settings.MAX_IMPORT_REQUEST_SIZE
+    return settings.MAX_UPLOAD_REQUEST_SIZE
+
+
+async def send_too_large(send):
+    body = b"Request body is too large"
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"text/plain"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RequestSizeLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit = max_request_size(scope["path"])
+        headers = dict(scope["headers"])
+        try:
+            content_length = int(headers.get(b"content-length", b""))
+        except ValueError:
+            content_length = None
+        if content_length is not None and content_length > limit:
+            return await send_too_large(send)
+
+        received = 0
+        refused = False
+
+        async def limited_receive():
+            nonlocal received, refused
+            if refused:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Django sees a client that went away and answers nothing
+                    refused = True
+                    await send_too_large(send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        return await self.app(scope, limited_receive, send)
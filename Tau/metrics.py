@@ -0,0 +1,357 @@
+"""
+Per-resolver timing and SQL accounting, exported for Prometheus.
+
+MetricsExtension times every resolver we wrote (fields resolved straight
+from an attribute are skipped: they cost nothing and are most of the
+calls) and counts the SQL each one issues. The current field travels in a
+ContextVar, which sync_to_async copies into its thread, so a query is
+charged to the field that awaited it. The execute wrapper that does the
+counting is installed on every database connection (see apps.py) and is a
+single ContextVar lookup outside of an instrumented request.
+
+Numbers are per process. /metrics shows the worker that answered the
+scrape, which is how Prometheus expects multi-process servers to be
+scraped (one target per worker) or summed.
+
+A request sent with the GRAPHQL_TIMING_HEADER header by a staff user (or
+anyone, with DEBUG) also gets a summary in the response's "extensions":
+
+    "timing": {"totalMs": 41.2, "authMs": 0.1, "sqlQueries": 3, "sqlMs": 6.0,
+               "cache": "MISS", "fields": {"Query.catalog": {"calls": 1, "ms": 38.9, ...}}}
+"""
+
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from strawberry.extensions import SchemaExtension
+from strawberry.extensions.tracing.utils import should_skip_tracing
+
+# Seconds; Prometheus' defaults, plus finer steps at the bottom for fast resolvers
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Where the running SQL is charged: the FieldStats of a resolver, the
+# RequestStats of an operation (outside resolvers), or None (not measured)
+current_field = ContextVar("current_field", default=None)
+
+
+# --- Prometheus exposition -----------------------------------------------------
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [count per bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[index] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for label_values, row in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, row):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{format_labels(names, label_values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{format_labels(names, label_values + ('+Inf',))} {row[-1]}")
+                labels = format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{labels} {row[-2]}")
+                lines.append(f"{self.name}_count{labels} {row[-1]}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+OPERATION_SECONDS = Histogram(
+    "tau_graphql_operation_seconds", "Time spent executing GraphQL operations.", ("operation",)
+)
+FIELD_SECONDS = Histogram(
+    "tau_graphql_field_seconds", "Wall time of each resolver call, awaits included.", ("field",)
+)
+FIELD_SQL_QUERIES = Counter(
+    "tau_graphql_field_sql_queries_total", "SQL queries issued by resolvers.", ("field",)
+)
+FIELD_SQL_SECONDS = Counter(
+    "tau_graphql_field_sql_seconds_total", "Time spent in SQL issued by resolvers.", ("field",)
+)
+AUTH_SECONDS = Histogram(
+    "tau_jwt_auth_seconds", "Time the JWT middleware took to authenticate a GraphQL request."
+)
+QUERIES_REJECTED = Counter(
+    "tau_graphql_rejected_total", "Operations rejected by the cost and depth limits (complexity.py).", ("reason",)
+)
+RATE_LIMIT_ALLOWED = Counter(
+    "tau_rate_limit_allowed_total", "Attempts let through by the rate limiter (users/ratelimit.py).", ("operation",)
+)
+RATE_LIMIT_REFUSED = Counter(
+    "tau_rate_limit_refused_total", "Attempts refused by the rate limiter, by the limit reached.", ("operation", "scope")
+)
+
+METRICS = [
+    OPERATION_SECONDS, FIELD_SECONDS, FIELD_SQL_QUERIES, FIELD_SQL_SECONDS, AUTH_SECONDS,
+    QUERIES_REJECTED, RATE_LIMIT_ALLOWED, RATE_LIMIT_REFUSED,
+]
+
+
+def cache_lines():
+    """Hit/miss counters of the caches on the request path, read at scrape time."""
+    from streaming.cache import stats as catalog_stats
+    from users.auth import token_users
+
+    from .documents import cached_parse
+
+    parse = cached_parse.cache_info()
+    catalog = catalog_stats.as_dict()
+    counts = {
+        "catalog": (catalog["hits"], catalog["misses"]),
+        "document": (parse.hits, parse.misses),
+        "jwt_user": (token_users.hits, token_users.misses),
+    }
+    lines = []
+    for result in ("hits", "misses"):
+        name = f"tau_cache_{result}_total"
+        lines += [f"# HELP {name} Cache {result} in this process.", f"# TYPE {name} counter"]
+        for cache_name, (hits, misses) in counts.items():
+            lines.append(f'{name}{{cache="{cache_name}"}} {hits if result == "hits" else misses}')
+    return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += cache_lines()
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. METRICS_TOKEN must be sent as a Bearer token;
+    without one configured the endpoint is only served with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponseForbidden()
+    elif not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --- SQL accounting -------------------------------------------------------------
+
+def sql_timer(execute, sql, params, many, context):
+    """Execute wrapper (see apps.py): charge the query to the current field, if any."""
+    stats = current_field.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(time.perf_counter() - start)
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    # connection_created receiver: every new connection, in every thread
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+# --- The extension --------------------------------------------------------------
+
+class FieldStats:
+    __slots__ = ("durations", "queries", "sql_seconds", "request")
+
+    def __init__(self, request):
+        self.durations = []
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.request = request
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.request.add_query(seconds)
+
+
+class RequestStats:
+    """Everything measured during one operation. Request scoped: no locking."""
+
+    __slots__ = ("fields", "queries", "sql_seconds")
+
+    def __init__(self):
+        self.fields = {}
+        self.queries = 0
+        self.sql_seconds = 0.0
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.sql_seconds += seconds
+
+    def field(self, name):
+        stats = self.fields.get(name)
+        if stats is None:
+            stats = self.fields[name] = FieldStats(self)
+        return stats
+
+
+# (parent type, field name) -> skip? Decided once per field of the schema
+_skip = {}
+
+
+class MetricsExtension(SchemaExtension):
+    """
+    Per-field timing and SQL counts (see the module docstring). Register it
+    as a class: strawberry then creates one instance per operation.
+    """
+
+    def __init__(self, *, execution_context=None):
+        self.execution_context = execution_context
+        self.stats = RequestStats()
+        self.total = 0.0
+
+    def on_execute(self):
+        # Queries run outside of any resolver (e.g. by other extensions)
+        # count toward the request's totals only
+        token = current_field.set(self.stats)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current_field.reset(token)
+            self.total = time.perf_counter() - start
+            self.flush()
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        key = (info.parent_type.name, info.field_name)
+        skip = _skip.get(key)
+        if skip is None:
+            skip = _skip[key] = should_skip_tracing(_next, info)
+        if skip:
+            return _next(root, info, *args, **kwargs)
+
+        stats = self.stats.field(f"{key[0]}.{key[1]}")
+        token = current_field.set(stats)
+        start = time.perf_counter()
+        try:
+            result = _next(root, info, *args, **kwargs)
+        except Exception:
+            stats.durations.append(time.perf_counter() - start)
+            raise
+        finally:
+            current_field.reset(token)
+        if isawaitable(result):
+            return self.await_result(result, stats, start)
+        stats.durations.append(time.perf_counter() - start)
+        return result
+
+    async def await_result(self, result, stats, start):
+        token = current_field.set(stats)
+        try:
+            return await result
+        finally:
+            current_field.reset(token)
+            stats.durations.append(time.perf_counter() - start)
+
+    def flush(self):
+        """Add this operation to the process-wide metrics, once, at the end."""
+        operation_type = self.execution_context.operation_type
+        OPERATION_SECONDS.observe(self.total, getattr(operation_type, "value", "unknown"))
+        for name, stats in self.stats.fields.items():
+            for duration in stats.durations:
+                FIELD_SECONDS.observe(duration, name)
+            if stats.queries:
+                FIELD_SQL_QUERIES.inc(stats.queries, name)
+                FIELD_SQL_SECONDS.inc(stats.sql_seconds, name)
+        auth = getattr(self.request, "auth_seconds", None)
+        if auth is not None:
+            AUTH_SECONDS.observe(auth)
+
+    @property
+    def request(self):
+        return getattr(self.execution_context.context, "request", None)
+
+    def wants_summary(self):
+        request = self.request
+        if request is None or not request.headers.get(settings.GRAPHQL_TIMING_HEADER):
+            return False
+        user = getattr(request, "user", None)
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    def get_results(self):
+        if not self.wants_summary():
+            return {}
+        fields = sorted(self.stats.fields.items(), key=lambda item: -sum(item[1].durations))
+        response = getattr(self.execution_context.context, "response", None)
+        auth = getattr(self.request, "auth_seconds", None)
+        return {"timing": {
+            "totalMs": round(self.total * 1000, 2),
+            "authMs": None if auth is None else round(auth * 1000, 2),
+            "sqlQueries": self.stats.queries,
+            "sqlMs": round(self.stats.sql_seconds * 1000, 2),
+            "cache": response.get("X-Catalog-Cache") if response is not None else None,
+            "fields": {
+                name: {
+                    "calls": len(stats.durations),
+                    "ms": round(sum(stats.durations) * 1000, 2),
+                    "sqlQueries": stats.queries,
+                    "sqlMs": round(stats.sql_seconds * 1000, 2),
+                }
+                for name, stats in fields
+            },
+        }}
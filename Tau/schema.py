@@ -1,5 +1,10 @@
 import strawberry
 from gqlauth.core.middlewares import JwtSchema
+from django.conf import settings
+from streaming.cache import CatalogCacheExtension
+from Tau.complexity import QueryCostExtension
+from Tau.documents import DocumentCacheExtension
+from Tau.metrics import MetricsExtension
 
 # 1. Import the schema classes from your apps
 # We alias them (as ...Query) to avoid name collisions
@@ -20,4 +25,19 @@ class Mutation(UserMutation, StreamingMutation):
 
 # 4. Create the Final Schema
 # We use JwtSchema to ensure the Authentication Middleware works for everything
-schema = JwtSchema(query=Query, mutation=Mutation)
\ No newline at end of file
+# Nested relations (e.g. MovieType.categories) are batched by request-scoped
+# DataLoaders (see Tau/context.py), one query per relation per request.
+# The catalog cache runs first so a cache hit skips execution entirely.
+# The document cache skips parsing/validation for queries we've seen before.
+# Operations over the cost/depth budget are rejected before they run (Tau/complexity.py).
+# Metrics time each resolver and count its SQL (see Tau/metrics.py).
+schema = JwtSchema(
+    query=Query,
+    mutation=Mutation,
+    extensions=[
+        DocumentCacheExtension,
+        QueryCostExtension,
+        CatalogCacheExtension,
+        *([MetricsExtension] if settings.GRAPHQL_METRICS else []),
+    ],
+)
\ No newline at end of file
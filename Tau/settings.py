@@ -43,8 +43,12 @@ AUTH_USER_MODEL = 'users.CustomUser'
 
 # --- 2. AUTHENTICATION BACKENDS ---
 AUTHENTICATION_BACKENDS = [
-    "users.backends.EmailBackend",  # Custom backend for email-based login
-    "django.contrib.auth.backends.ModelBackend",  # Default Django backend
+    # Custom backend for email-based login. It does everything ModelBackend
+    # does, and a failed login stops there instead of being hashed twice
+    "users.backends.EmailBackend",
+    # Never reached by a password login; kept so that sessions it logged in
+    # (the admin's) still load their user instead of being logged out
+    "django.contrib.auth.backends.ModelBackend",
     # Note: JWT authentication is handled by gqlauth.core.middlewares.django_jwt_middleware
     # in the MIDDLEWARE section, not here
 ]
@@ -53,7 +57,7 @@ AUTHENTICATION_BACKENDS = [
 # --- 3. EMAIL BACKEND ---
 # Check for SMTP credentials in environment
 if os.environ.get('EMAIL_HOST_USER') and os.environ.get('EMAIL_HOST_PASSWORD'):
-    EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
     EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
     EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
     EMAIL_USE_TLS = True
@@ -62,7 +66,14 @@ if os.environ.get('EMAIL_HOST_USER') and os.environ.get('EMAIL_HOST_PASSWORD'):
     DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 else:
     # Fallback to console for development if no credentials provided
-    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+    EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Requests only queue their emails (users/mail.py); 'manage.py send_queued_email'
+# delivers them with EMAIL_DELIVERY_BACKEND, outside of any request
+EMAIL_BACKEND = 'users.mail.OutboxBackend'
+# A failed email is retried after EMAIL_OUTBOX_RETRY_DELAY seconds, doubling each time
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.environ.get('EMAIL_OUTBOX_RETRY_DELAY', 30))
 
 # --- 4. GQLAUTH SETTINGS ---
 # Email-based login is handled by the custom EmailBackend in AUTHENTICATION_BACKENDS
@@ -94,6 +105,29 @@ GRAPHQL_JWT = {
     "JWT_COOKIE_SAMESITE": "Lax",          # CSRF protection (Lax allows navigation)
 }
 
+# Rate limits of the mutations that hash a password or send an email
+# (users/ratelimit.py): (attempts, seconds) per client IP and/or per account
+RATE_LIMITS = {
+    "login": {"ip": (30, 60), "account": (10, 300)},
+    "register": {"ip": (10, 3600), "account": (3, 3600)},
+    "password_change": {"ip": (10, 300), "account": (5, 300)},
+    "delete_account": {"ip": (10, 300), "account": (5, 300)},
+    "password_reset": {"ip": (10, 3600)},
+    "password_reset_email": {"ip": (10, 3600), "account": (3, 3600)},
+}
+# users.ratelimit.MemoryBackend (per process) or users.ratelimit.CacheBackend
+# (RATE_LIMIT_CACHE, shared when that cache is Redis/memcached). With several
+# workers, use the latter (docker-compose.yml does; see streaming/checks.py)
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "users.ratelimit.MemoryBackend")
+RATE_LIMIT_CACHE = os.environ.get("RATE_LIMIT_CACHE", "default")
+# Proxies in front of Django that append to X-Forwarded-For (1 behind our nginx)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0))
+
+# Verified tokens -> their user, per process (users/auth.py). An entry lives
+# JWT_USER_CACHE_TTL seconds at most, and never past the token's expiry.
+JWT_USER_CACHE_SIZE = int(os.environ.get("JWT_USER_CACHE_SIZE", 1024))
+JWT_USER_CACHE_TTL = int(os.environ.get("JWT_USER_CACHE_TTL", 60))
+
 # Required by gqlauth to initialize, even if you don't use Stripe
 STRIPE_PUBLISHABLE_KEY = "dummy"
 
@@ -106,6 +140,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     
     # Third Party
     'strawberry_django',
@@ -114,6 +149,7 @@ INSTALLED_APPS = [
     "gqlauth",
 
     # Local Apps
+    'Tau.apps.TauConfig',  # Project wide pieces: metrics (Tau/metrics.py)
     'streaming',
     'users',
 ]
@@ -129,7 +165,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     
-    'gqlauth.core.middlewares.django_jwt_middleware', # <--- ADDED (Must be after AuthMiddleware)
+    'users.middleware.jwt_middleware', # <--- gqlauth's JWT middleware, cached (Must be after AuthMiddleware)
     
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -185,6 +221,82 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing (users/hashers.py)
+# New passwords, and existing ones as their owners log in, are hashed with
+# PASSWORD_HASHER: "scrypt", "argon2" (needs argon2-cffi) or "pbkdf2", and the
+# costs below. 'python -m benchmarks.hashing' measures logins per second and
+# core for each
+PASSWORD_HASHER = os.environ.get("PASSWORD_HASHER", "scrypt")
+# OWASP's minimum for scrypt (2**14, 8, 5): about as slow as PBKDF2 below, but
+# each hash also takes 16 MiB, which is what makes GPUs and ASICs inefficient
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ.get("PASSWORD_SCRYPT_WORK_FACTOR", 2**14))
+PASSWORD_SCRYPT_BLOCK_SIZE = int(os.environ.get("PASSWORD_SCRYPT_BLOCK_SIZE", 8))
+PASSWORD_SCRYPT_PARALLELISM = int(os.environ.get("PASSWORD_SCRYPT_PARALLELISM", 5))
+# Argon2id; memory in KiB. OWASP's minimum (19 MiB, 2 passes, 1 lane)
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get("PASSWORD_ARGON2_TIME_COST", 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get("PASSWORD_ARGON2_MEMORY_COST", 19456))
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get("PASSWORD_ARGON2_PARALLELISM", 1))
+# Django 5.0's default: the hashes made before scrypt
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 720_000))
+
+_PASSWORD_HASHERS = {
+    "scrypt": "users.hashers.ScryptPasswordHasher",
+    "argon2": "users.hashers.Argon2PasswordHasher",
+    "pbkdf2": "users.hashers.PBKDF2PasswordHasher",
+}
+# The first one hashes, all of them verify
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+]
+
+
+# Cache
+# Local memory by default (tests, single process). Point DJANGO_CACHE_BACKEND /
+# DJANGO_CACHE_LOCATION at a shared backend (e.g. Redis) when running several workers:
+#   DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   DJANGO_CACHE_LOCATION=redis://redis:6379/0
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", "tau-default"),
+    }
+}
+
+# How long (seconds) a cached catalog response may live, even without changes
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", 300))
+
+# HTTP caching of catalog queries sent with GET (browsers, nginx, CDNs).
+# Clients may reuse a response for MAX_AGE seconds, then serve it stale for
+# up to STALE_WHILE_REVALIDATE more while it is refreshed in the background.
+CATALOG_HTTP_MAX_AGE = int(os.environ.get("CATALOG_HTTP_MAX_AGE", 60))
+CATALOG_HTTP_STALE_WHILE_REVALIDATE = int(os.environ.get("CATALOG_HTTP_STALE_WHILE_REVALIDATE", 600))
+
+
+# How many distinct GraphQL documents keep their parsed/validated form in memory
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.environ.get("GRAPHQL_DOCUMENT_CACHE_SIZE", 256))
+# Persisted queries (Tau/documents.py) are registered by any client: each one
+# is forgotten after this many seconds without use, and longer documents
+# (characters) are never stored. Ours are a few hundred characters
+PERSISTED_QUERY_TIMEOUT = int(os.environ.get("PERSISTED_QUERY_TIMEOUT", 7 * 24 * 3600))
+PERSISTED_QUERY_MAX_LENGTH = int(os.environ.get("PERSISTED_QUERY_MAX_LENGTH", 10_000))
+
+# Budget of a GraphQL operation, estimated before it runs (Tau/complexity.py).
+# Over it, the operation is rejected. 0 means no limit. The default lets
+# through every field of every movie once (33751), but not twice; the
+# frontend's pages cost far less (see QueryCostTest in Tau/tests.py).
+GRAPHQL_MAX_COST = int(os.environ.get("GRAPHQL_MAX_COST", 40000))
+GRAPHQL_MAX_DEPTH = int(os.environ.get("GRAPHQL_MAX_DEPTH", 10))
+
+# Per-resolver timing and SQL counts (Tau/metrics.py), scraped from /metrics.
+# Off: the extension isn't even installed.
+GRAPHQL_METRICS = os.environ.get("GRAPHQL_METRICS", "True") == "True"
+# Requests with this header get a timing summary in "extensions" (staff, or DEBUG)
+GRAPHQL_TIMING_HEADER = "X-Debug-Timing"
+# /metrics requires "Authorization: Bearer <METRICS_TOKEN>". Unset, it is only
+# served with DEBUG on (and nginx never proxies it, see nginx/default.conf)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
 # Internationalization
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
@@ -200,11 +312,32 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 STATIC_ROOT = BASE_DIR / "static"
 
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Poster/backdrop originals: one file per distinct image (streaming/storage.py)
+    "originals": {"BACKEND": "streaming.storage.ContentAddressedStorage"},
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Threads used to generate poster/backdrop renditions after an upload
+RENDITION_WORKERS = int(os.environ.get("RENDITION_WORKERS", 2))
+# Processes used for the renditions of bulk imports (CPU bound, many at once)
+RENDITION_PROCESSES = int(os.environ.get("RENDITION_PROCESSES", 2))
+
 # File Upload Handlers for GraphQL
+# Uploads are streamed to a temporary file chunk by chunk (never kept in RAM),
+# and their image header and size are checked while they arrive.
 FILE_UPLOAD_HANDLERS = [
-    "django.core.files.uploadhandler.MemoryFileUploadHandler",
-    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
-]
\ No newline at end of file
+    "streaming.uploads.StreamingImageUploadHandler",
+]
+MAX_IMAGE_UPLOAD_SIZE = int(os.environ.get("MAX_IMAGE_UPLOAD_SIZE", 30 * 1024 * 1024))  # Per file
+# Both request limits are repeated in nginx/default.conf (client_max_body_size)
+MAX_UPLOAD_REQUEST_SIZE = 2 * MAX_IMAGE_UPLOAD_SIZE + 1024 * 1024  # Poster + backdrop + form fields
+# Bulk import files (.csv/.jsonl manifest, .zip of images) have their own
+# limits, on their own endpoint (/graphql/import/) only
+MAX_IMPORT_UPLOAD_SIZE = int(os.environ.get("MAX_IMPORT_UPLOAD_SIZE", 512 * 1024 * 1024))
+MAX_IMPORT_REQUEST_SIZE = MAX_IMPORT_UPLOAD_SIZE + 1024 * 1024  # Archive + manifest + form fields
+MAX_IMAGE_PIXELS = 60_000_000  # ~8K x 7K, anything bigger is likely a decompression bomb
\ No newline at end of file
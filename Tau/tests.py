@@ -0,0 +1,279 @@
+import hashlib
+import json
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from gqlauth.jwt.types_ import TokenType
+from strawberry.schema.execute import parse_document, validate_document
+from Tau.schema import schema
+from streaming.models import Category, Movie
+from users.models import CustomUser
+from graphql import get_introspection_query
+from .complexity import analyze, cached_analyze
+from .documents import cached_parse, cached_validate
+from .metrics import METRICS
+
+
+class PersistedQueryTest(TestCase):
+    """Automatic persisted queries: send a hash, fall back to the full text once."""
+
+    query = "{ categories { slug } }"
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.extensions = {
+            "persistedQuery": {
+                "version": 1,
+                "sha256Hash": hashlib.sha256(self.query.encode()).hexdigest(),
+            }
+        }
+
+    def post(self, payload):
+        response = self.client.post("/graphql/", data=json.dumps(payload), content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_unknown_hash_then_register_then_hash_only(self):
+        # 1. Hash only: the server doesn't know it yet
+        content = self.post({"extensions": self.extensions})
+        self.assertEqual(content["errors"][0]["message"], "PersistedQueryNotFound")
+
+        # 2. The client retries with the full text, which gets stored
+        content = self.post({"query": self.query, "extensions": self.extensions})
+        self.assertEqual(content["data"], {"categories": []})
+
+        # 3. From now on the hash alone is enough, also over GET
+        content = self.post({"extensions": self.extensions})
+        self.assertEqual(content["data"], {"categories": []})
+        response = self.client.get("/graphql/", {"extensions": json.dumps(self.extensions)})
+        self.assertEqual(json.loads(response.content)["data"], {"categories": []})
+
+    def test_entries_expire_unless_used(self):
+        key = f"apq:{self.extensions['persistedQuery']['sha256Hash']}"
+        with override_settings(PERSISTED_QUERY_TIMEOUT=60), \
+                mock.patch.object(cache, "touch", wraps=cache.touch) as touch, \
+                mock.patch.object(cache, "set", wraps=cache.set) as set_:
+            self.post({"query": self.query, "extensions": self.extensions})
+            set_.assert_any_call(key, self.query, timeout=60)
+            # Every use pushes the expiry back
+            self.post({"extensions": self.extensions})
+            touch.assert_any_call(key, 60)
+
+    @override_settings(PERSISTED_QUERY_MAX_LENGTH=10)
+    def test_long_documents_are_run_but_not_stored(self):
+        content = self.post({"query": self.query, "extensions": self.extensions})
+        self.assertEqual(content["data"], {"categories": []})
+
+        content = self.post({"extensions": self.extensions})
+        self.assertEqual(content["errors"][0]["message"], "PersistedQueryNotFound")
+
+    def test_hash_mismatch_is_rejected(self):
+        self.extensions["persistedQuery"]["sha256Hash"] = "0" * 64
+        content = self.post({"query": self.query, "extensions": self.extensions})
+        self.assertEqual(content["errors"][0]["extensions"]["code"], "INVALID_PERSISTED_QUERY")
+
+
+class DocumentCacheTest(TestCase):
+    """A repeated document is parsed and validated only once."""
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        cached_parse.cache_clear()
+        cached_validate.cache_clear()
+
+    def post(self, query):
+        response = self.client.post("/graphql/", data=json.dumps({"query": query}), content_type="application/json")
+        return json.loads(response.content)
+
+    def test_repeat_skips_parse_and_validate(self):
+        query = "{ me { username } }"
+        with mock.patch("Tau.documents.parse_document", wraps=parse_document) as parse, \
+                mock.patch("Tau.documents.validate_document", wraps=validate_document) as validate:
+            for _ in range(3):
+                self.assertEqual(self.post(query)["data"], {"me": None})
+
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(validate.call_count, 1)
+
+    def test_invalid_query_still_reports_errors(self):
+        for _ in range(2):
+            content = self.post("{ doesNotExist }")
+            self.assertIn("Cannot query field 'doesNotExist'", content["errors"][0]["message"])
+
+        content = self.post("{ broken ")
+        self.assertIn("Syntax Error", content["errors"][0]["message"])
+
+
+class MetricsTest(TestCase):
+    """Per-resolver timing and SQL counts: /metrics and the debug summary."""
+
+    query = "{ movies { title categories { slug } } }"
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()  # No catalog cache hits: the resolvers must run
+        for metric in METRICS:
+            metric.clear()
+        category = Category.objects.create(name="Drama", slug="drama")
+        for number in range(3):
+            movie = Movie.objects.create(title=f"Movie {number}", description="", year=2000, duration_minutes=90)
+            movie.categories.add(category)
+
+    def post(self, **headers):
+        response = self.client.post(
+            "/graphql/", data=json.dumps({"query": self.query}), content_type="application/json", **headers
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_resolvers_are_timed_and_their_sql_counted(self):
+        self.post()
+        metrics = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+
+        self.assertIn('tau_graphql_field_seconds_count{field="Query.movies"} 1', metrics)
+        self.assertIn('tau_graphql_field_sql_queries_total{field="Query.movies"} 1', metrics)
+        # Three calls, one batched query (DataLoader), charged to the field that awaited it
+        self.assertIn('tau_graphql_field_seconds_count{field="MovieType.categories"} 3', metrics)
+        self.assertIn('tau_graphql_field_sql_queries_total{field="MovieType.categories"} 1', metrics)
+        self.assertIn('tau_graphql_operation_seconds_count{operation="query"} 1', metrics)
+        self.assertIn('tau_cache_misses_total{cache="catalog"}', metrics)
+        # Plain attributes aren't instrumented
+        self.assertNotIn("MovieType.title", metrics)
+
+    def test_timing_summary_needs_the_header_and_a_staff_user(self):
+        self.assertNotIn("extensions", self.post())
+        self.assertNotIn("extensions", self.post(HTTP_X_DEBUG_TIMING="1"))
+
+        staff = CustomUser.objects.create_user(
+            username="staff", email="staff@example.com", password="Str0ng!Passw0rd123", is_staff=True
+        )
+        token = TokenType.from_user(staff).token
+        authorization = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+        self.assertNotIn("extensions", self.post(**authorization))
+
+        cache.clear()  # The earlier requests cached the response
+        timing = self.post(HTTP_X_DEBUG_TIMING="1", **authorization)["extensions"]["timing"]
+        self.assertEqual(timing["sqlQueries"], 2)
+        self.assertEqual(timing["cache"], "MISS")
+        self.assertIsNotNone(timing["authMs"])
+        self.assertEqual(timing["fields"]["MovieType.categories"]["calls"], 3)
+        self.assertEqual(timing["fields"]["MovieType.categories"]["sqlQueries"], 1)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+    def test_metrics_need_a_token_outside_debug(self):
+        # The default configuration: no METRICS_TOKEN
+        self.assertEqual(settings.METRICS_TOKEN, "")
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+
+class QueryCostTest(TestCase):
+    """Operations over the cost or depth budget are rejected before they run."""
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        cached_analyze.cache_clear()
+
+    def cost(self, query):
+        return analyze(schema._schema, parse_document(query))
+
+    def post(self, query):
+        response = self.client.post("/graphql/", data=json.dumps({"query": query}), content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_costs(self):
+        self.assertEqual(self.cost("{ movies { title } }"), (1 + 250, 2))
+        # Image URLs cost more, unpaginated lists more than pages
+        self.assertEqual(self.cost("{ movies { posterMobileUrl } }"), (1 + 250 * 5, 2))
+        self.assertEqual(self.cost("{ moviesConnection(first: 10) { edges { node { title } } } }"), (1 + 1 + 10 * 2, 4))
+        self.assertEqual(self.cost("query ($n: Int) { moviesConnection(first: $n) { edges { cursor } } }")[0], 1 + 1 + 100)
+        # Aliases and fragments are all counted
+        self.assertEqual(
+            self.cost("{ a: movies { ...F } b: movies { ...F } } fragment F on MovieType { categories { slug } }"),
+            (2 * (1 + 250 * (1 + 3)), 3),
+        )
+        self.assertEqual(self.cost(get_introspection_query()), (0, 0))
+
+    def test_frontend_documents_fit_the_default_budget(self):
+        home = """
+        query Home($first: Int, $after: String) {
+            categories { id name slug }
+            moviesConnection(first: $first, after: $after) {
+                edges {
+                    cursor
+                    node {
+                        id title description year durationFormatted
+                        isNew isStudentProduction isFromFestival
+                        posterMobileUrl posterDesktopUrl backdropLargeUrl
+                        posterSrcset { url width format bytes }
+                        categories { id name slug }
+                    }
+                }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+        """
+        by_category = """
+        query ByCategory($slug: String!) {
+            moviesByCategory(categorySlug: $slug) {
+                id title year durationFormatted posterMobileUrl
+                categories { slug }
+            }
+        }
+        """
+        self.assertEqual(self.cost(home), (7356, 5))
+        self.assertEqual(self.cost(by_category), (3251, 3))
+
+        # Every field of every movie fits once, but not twice
+        movie = """
+            id title description year durationMinutes durationFormatted
+            isNew isStudentProduction isFromFestival renditionsStatus
+            categories { id name slug }
+            posterMobileUrl posterDesktopUrl backdropLargeUrl
+            posterSrcset { url width height format bytes }
+            backdropSrcset { url width height format bytes }
+            posterOriginalUrl backdropOriginalUrl
+        """
+        cost, _ = self.cost(f"{{ movies {{ {movie} }} }}")
+        self.assertEqual(cost, 33751)
+        self.assertLess(cost, settings.GRAPHQL_MAX_COST)
+        self.assertGreater(2 * cost, settings.GRAPHQL_MAX_COST)
+        self.assertNotIn("errors", self.post(f"{{ movies {{ {movie} }} }}"))
+
+    @override_settings(GRAPHQL_MAX_COST=300)
+    def test_expensive_query_is_rejected_before_any_resolver(self):
+        with self.assertNumQueries(0):
+            content = self.post("{ movies { title categories { slug } } }")
+        self.assertIsNone(content["data"])
+        error = content["errors"][0]
+        self.assertEqual(error["extensions"], {"code": "QUERY_TOO_COMPLEX", "cost": 1 + 250 * (1 + 1 + 3), "maxCost": 300})
+
+        # A page of the same movies fits
+        content = self.post("{ moviesConnection(first: 20) { edges { node { title categories { slug } } } } }")
+        self.assertNotIn("errors", content)
+
+    @override_settings(GRAPHQL_MAX_DEPTH=3)
+    def test_deep_query_is_rejected(self):
+        content = self.post("{ catalog { edges { node { categories { slug } } } } }")
+        self.assertEqual(content["errors"][0]["extensions"]["code"], "QUERY_TOO_DEEP")
+        self.assertNotIn("errors", self.post(get_introspection_query()))
+
+    def test_analysis_is_cached_with_the_document(self):
+        query = "{ categories { slug } }"
+        with mock.patch("Tau.complexity.analyze", wraps=analyze) as analyzed:
+            for _ in range(3):
+                self.assertEqual(self.post(query)["data"], {"categories": []})
+        self.assertEqual(analyzed.call_count, 1)
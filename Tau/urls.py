@@ -18,14 +18,18 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from strawberry.django.views import GraphQLView
+from Tau.metrics import metrics_view
 from Tau.schema import schema
+from Tau.views import TauGraphQLView
 from django.conf import settings
 from django.conf.urls.static import static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("graphql/", csrf_exempt(GraphQLView.as_view(schema=schema))),
+    path("graphql/", csrf_exempt(TauGraphQLView.as_view(schema=schema))),
+    # bulkImportMovies: the only endpoint taking MAX_IMPORT_UPLOAD_SIZE files
+    path("graphql/import/", csrf_exempt(TauGraphQLView.as_view(schema=schema, allow_imports=True))),
+    path("metrics", metrics_view),
 ]
 
 if settings.DEBUG:
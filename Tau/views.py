@@ -0,0 +1,78 @@
+"""
+The GraphQL endpoint.
+
+A thin layer over strawberry's AsyncGraphQLView that adds automatic
+persisted queries (see Tau/documents.py), our per-request context
+(see Tau/context.py) and 304 responses for conditional GET requests
+(see streaming/cache.py).
+
+The same view also serves /graphql/import/ (allow_imports=True), the only
+endpoint that takes bulk import files and their larger body size (see
+streaming/uploads.py).
+
+The view is async so that under uvicorn one worker can keep many requests
+in flight: resolvers await the database instead of each request holding
+a thread.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotModified, JsonResponse
+from strawberry.django.views import AsyncGraphQLView
+from strawberry.http import GraphQLRequestData
+from strawberry.http.exceptions import HTTPException
+
+from .context import TauContext
+from .documents import PersistedQueryError, resolve_persisted_query
+
+
+def load_form(request):
+    # Django parses the whole body the first time FILES (or POST) is read
+    return request.FILES
+
+
+class TauGraphQLView(AsyncGraphQLView):
+    allow_imports = False
+
+    async def get_context(self, request, response):
+        return TauContext(request=request, response=response)
+
+    async def parse_http_body(self, request):
+        # Same as strawberry's version, but we also read "extensions"
+        content_type = request.content_type or ""
+
+        if request.method == "GET":
+            data = self.parse_query_params(request.query_params)
+        elif "application/json" in content_type:
+            data = self.parse_json(await request.get_body())
+        elif content_type.startswith("multipart/form-data"):
+            # Parsing runs the upload handler (disk writes, image header
+            # checks, hashing): in a thread, not on the event loop
+            await sync_to_async(load_form)(request.request)
+            data = await self.parse_multipart(request)
+        else:
+            raise HTTPException(400, "Unsupported content type")
+
+        return GraphQLRequestData(
+            query=resolve_persisted_query(data.get("query"), data.get("extensions")),
+            variables=data.get("variables"),
+            operation_name=data.get("operationName"),
+        )
+
+    def create_response(self, response_data, sub_response):
+        if sub_response.status_code == 304:
+            # If-None-Match matched: headers (ETag, Cache-Control) but no body
+            response = HttpResponseNotModified()
+            for name, value in sub_response.items():
+                if name.lower() != "content-type":
+                    response[name] = value
+            return response
+        return super().create_response(response_data, sub_response)
+
+    async def dispatch(self, request, *args, **kwargs):
+        # The upload handler reads it when the body is parsed
+        request.allow_import_uploads = self.allow_imports
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except PersistedQueryError as e:
+            # Apollo clients look for this error to resend the full query
+            return JsonResponse(e.as_json())
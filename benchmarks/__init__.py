@@ -0,0 +1,62 @@
+"""
+Benchmarks for the Tau API.
+
+Every module here is a small script you run from the project root:
+
+    python -m benchmarks.rendition_urls --help
+
+They create (and destroy) a throwaway test database, exactly like
+'manage.py test' does, so they never touch real data.
+"""
+
+import contextlib
+import os
+import statistics
+import time
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Tau.settings")
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    """Create a test database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(fn, repeat):
+    """Run fn() 'repeat' times and return the durations in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(label, samples):
+    """Print one line: mean / p50 / p95 in milliseconds."""
+    print(
+        f"{label:<40} mean {statistics.mean(samples) * 1000:9.3f} ms"
+        f"   p50 {percentile(samples, 50) * 1000:9.3f} ms"
+        f"   p95 {percentile(samples, 95) * 1000:9.3f} ms"
+    )
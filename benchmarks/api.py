@@ -0,0 +1,616 @@
+"""
+Reproducible benchmark of the GraphQL API, to compare commits.
+
+Seeds a synthetic catalog in a throwaway database: --movies movies in
+--categories categories, sharing --images generated poster/backdrop pairs
+(with their renditions), and a verified user. Then every scenario runs
+for --duration seconds with --concurrency clients:
+
+    home                the anonymous home page: categories + first page
+    movies_by_category  moviesByCategory of a random category
+    login               tokenAuth
+    refresh             refreshToken in cookie mode, as the web app does it
+    create_movie        createMovie with a new poster and backdrop upload
+
+--transport asgi calls the ASGI application directly, in this process
+(no network, no server); --transport http goes through a uvicorn server
+started in a thread of this process. Both by default. For every scenario
+we print req/s, p50/p95/p99 latency and SQL queries per request.
+
+    python -m benchmarks.api --movies 1000
+    python -m benchmarks.api --movies 100000 --json after.json
+    python -m benchmarks.api --movies 100000 --compare after.json
+
+--json saves the results along with the commit they were measured on, and
+--compare prints how this run differs from such a file. Runs with the same
+--seed and sizes seed the same catalog.
+
+Catalog queries carry an unused variable that changes on every request,
+so they measure resolvers + ORM, not the catalog cache (unless
+--catalog-cache). createMovie schedules renditions in the background:
+each scenario waits for such work before the next one starts, and its
+queries count toward the scenario that caused it. Rate limits are off.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+
+from benchmarks import percentile, setup_django, test_database
+from benchmarks.document_cache import HOME_QUERY
+from benchmarks.load_test import Connection, Target
+from benchmarks.search import make_vocabulary
+
+SCENARIOS = ["home", "movies_by_category", "login", "refresh", "create_movie"]
+TRANSPORTS = ["asgi", "http"]
+USERNAME = "bench"
+PASSWORD = "Str0ng!Passw0rd123"
+BATCH_SIZE = 5000
+
+BY_CATEGORY_QUERY = """
+query ByCategory($slug: String!) {
+    moviesByCategory(categorySlug: $slug) {
+        id title year durationFormatted posterMobileUrl
+        categories { slug }
+    }
+}
+"""
+
+LOGIN_MUTATION = """
+mutation Login($username: String!, $password: String!) {
+    tokenAuth(username: $username, password: $password) { success errors token { token } }
+}
+"""
+
+REFRESH_MUTATION = """
+mutation Refresh {
+    refreshToken(refreshToken: "cookie-mode", revokeRefreshToken: true) { success errors token { token } }
+}
+"""
+
+CREATE_MOVIE_MUTATION = """
+mutation CreateMovie($poster: Upload, $backdrop: Upload) {
+    createMovie(movieData: {
+        title: "Benchmark", description: "", year: 2024, durationMinutes: 90, categoryIds: [],
+        isNew: true, isStudentProduction: false, isFromFestival: false,
+        posterOriginal: $poster, backdropOriginal: $backdrop
+    }) { id }
+}
+"""
+
+
+# --- Seeding -------------------------------------------------------------------
+
+def make_image(rng, size):
+    """A JPEG gradient in random colors: small, but real work for the renditions."""
+    from PIL import Image, ImageOps
+
+    black, white = (tuple(rng.randrange(256) for _ in range(3)) for _ in range(2))
+    image = ImageOps.colorize(Image.radial_gradient("L").resize(size), black, white)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def seed(rng, movies, categories, images):
+    """Fill the database. Returns the category slugs."""
+    from django.core.files.base import ContentFile
+    from gqlauth.models import UserStatus
+
+    from streaming.models import Category, Movie
+    from streaming.renditions import generate_renditions
+    from streaming.storage import originals_storage
+    from users.models import CustomUser
+
+    storage = originals_storage()
+    pairs = [
+        (
+            storage.save("movies/posters/seed.jpg", ContentFile(make_image(rng, (400, 600)))),
+            storage.save("movies/backdrops/seed.jpg", ContentFile(make_image(rng, (1280, 720)))),
+        )
+        for _ in range(images)
+    ]
+    slugs = [f"category-{number}" for number in range(categories)]
+    category_ids = [
+        category.pk
+        for category in Category.objects.bulk_create(
+            Category(name=f"Category {number}", slug=slug) for number, slug in enumerate(slugs)
+        )
+    ]
+
+    vocabulary = make_vocabulary(rng, 2000)
+    Through = Movie.categories.through
+    for start in range(0, movies, BATCH_SIZE):
+        batch = []
+        for number in range(start, min(start + BATCH_SIZE, movies)):
+            poster, backdrop = pairs[number % len(pairs)]
+            batch.append(Movie(
+                title=" ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))).title(),
+                description=" ".join(rng.choice(vocabulary) for _ in range(rng.randint(10, 30))),
+                year=rng.randint(1950, 2025),
+                duration_minutes=rng.randint(60, 180),
+                is_new=rng.random() < 0.1,
+                is_student_production=rng.random() < 0.2,
+                is_from_festival=rng.random() < 0.15,
+                is_active=rng.random() > 0.05,
+                poster_original=poster,
+                backdrop_original=backdrop,
+            ))
+        Movie.objects.bulk_create(batch)
+        Through.objects.bulk_create(
+            Through(movie_id=movie.pk, category_id=category_id)
+            for movie in batch
+            for category_id in rng.sample(category_ids, min(len(category_ids), rng.randint(1, 3)))
+        )
+
+    # Movies with the same images have the same renditions: generate them
+    # once per pair and copy the manifest
+    for poster, _ in pairs:
+        first = Movie.objects.filter(poster_original=poster).first()
+        if first is None:
+            continue
+        generate_renditions(first.pk)
+        first.refresh_from_db()
+        Movie.objects.filter(poster_original=poster).update(
+            renditions=first.renditions, renditions_status=first.renditions_status
+        )
+
+    user = CustomUser.objects.create_user(username=USERNAME, email="bench@example.com", password=PASSWORD)
+    UserStatus.objects.filter(user=user).update(verified=True)
+    return slugs
+
+
+class QueryCounter:
+    """Execute wrapper counting the SQL queries of every connection, in every thread."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        from django.db import connection
+        from django.db.backends.signals import connection_created
+
+        def add(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(add, weak=False)
+        add(None, connection)
+
+
+# --- Clients -------------------------------------------------------------------
+
+class RequestFailed(Exception):
+    pass
+
+
+class Client:
+    """One simulated user: its own connection and cookie jar."""
+
+    def __init__(self):
+        self.cookies = {}
+
+    async def post(self, body, content_type="application/json"):
+        headers = []
+        if self.cookies:
+            headers.append(("cookie", "; ".join(f"{name}={value}" for name, value in self.cookies.items())))
+        status, response_headers, content = await self.send(body, content_type, headers)
+        for name, value in response_headers:
+            if name == "set-cookie":
+                for morsel in SimpleCookie(value).values():
+                    self.cookies[morsel.key] = morsel.value
+        if status != 200:
+            raise RequestFailed(f"HTTP {status}: {content[:200]!r}")
+        content = json.loads(content)
+        if content.get("errors"):
+            raise RequestFailed(content["errors"][0].get("message"))
+        return content["data"]
+
+    async def graphql(self, query, variables=None):
+        return await self.post(json.dumps({"query": query, "variables": variables or {}}).encode())
+
+    async def upload(self, query, files):
+        """A GraphQL multipart request; 'files' maps variable names to (filename, bytes)."""
+        boundary = f"tau-benchmark-{random.getrandbits(64):x}"
+        operations = {"query": query, "variables": {name: None for name in files}}
+        file_map = {str(index): [f"variables.{name}"] for index, name in enumerate(files)}
+        parts = [
+            ('name="operations"', json.dumps(operations).encode()),
+            ('name="map"', json.dumps(file_map).encode()),
+        ] + [
+            (f'name="{index}"; filename="{filename}"\r\nContent-Type: image/jpeg', content)
+            for index, (filename, content) in enumerate(files.values())
+        ]
+        body = b"".join(
+            f"--{boundary}\r\nContent-Disposition: form-data; {disposition}\r\n\r\n".encode() + content + b"\r\n"
+            for disposition, content in parts
+        ) + f"--{boundary}--\r\n".encode()
+        return await self.post(body, f"multipart/form-data; boundary={boundary}")
+
+    def close(self):
+        pass
+
+
+class ASGIClient(Client):
+    """Calls the ASGI application directly, like a server would."""
+
+    def __init__(self, application):
+        super().__init__()
+        self.application = application
+
+    async def send(self, body, content_type, headers):
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/graphql/",
+            "raw_path": b"/graphql/",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [
+                (b"host", b"localhost"),
+                (b"content-type", content_type.encode()),
+                (b"content-length", str(len(body)).encode()),
+            ] + [(name.encode(), value.encode()) for name, value in headers],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        never = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Django listens for a disconnect while it works: the client stays
+            await never.wait()
+
+        response = {"body": []}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    (name.decode("latin-1").lower(), value.decode("latin-1"))
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self.application(scope, receive, send)
+        return response["status"], response["headers"], b"".join(response["body"])
+
+
+class HTTPClient(Client):
+    """Talks HTTP/1.1 to a server over one keep-alive connection."""
+
+    def __init__(self, target):
+        super().__init__()
+        self.connection = Connection(target)
+
+    async def send(self, body, content_type, headers):
+        return await self.connection.request(body, content_type, headers)
+
+    def close(self):
+        self.connection.close()
+
+
+@contextlib.contextmanager
+def local_server(application):
+    """A uvicorn server in a thread of this process. Yields its Target."""
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(application, lifespan="off", log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("uvicorn did not start")
+        time.sleep(0.01)
+    try:
+        yield Target(f"http://127.0.0.1:{sock.getsockname()[1]}/graphql/")
+    finally:
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+
+# --- Scenarios -----------------------------------------------------------------
+
+class Run:
+    """What the scenarios share: the seeded data and a source of unique values."""
+
+    def __init__(self, rng, slugs, catalog_cache):
+        self.rng = rng
+        self.slugs = slugs
+        self.catalog_cache = catalog_cache
+        self.counter = itertools.count()
+        self.poster = make_image(rng, (400, 600))
+        self.backdrop = make_image(rng, (1280, 720))
+
+    def catalog_variables(self, **variables):
+        if not self.catalog_cache:
+            # An unused variable still changes the catalog cache key
+            variables["nonce"] = next(self.counter)
+        return variables
+
+    def unique(self, image):
+        # Bytes after the end of a JPEG are ignored by decoders but not by
+        # the content-addressed storage: every upload is a new file
+        return image + next(self.counter).to_bytes(8, "big")
+
+
+async def home(client, run):
+    data = await client.graphql(HOME_QUERY, run.catalog_variables(first=20))
+    assert data["moviesConnection"]["edges"], data
+
+
+async def movies_by_category(client, run):
+    await client.graphql(BY_CATEGORY_QUERY, run.catalog_variables(slug=run.rng.choice(run.slugs)))
+
+
+async def login(client, run):
+    data = await client.graphql(LOGIN_MUTATION, {"username": USERNAME, "password": PASSWORD})
+    if not data["tokenAuth"]["success"]:
+        raise RequestFailed(data["tokenAuth"]["errors"])
+
+
+async def refresh(client, run):
+    data = await client.graphql(REFRESH_MUTATION)
+    if not data["refreshToken"]["success"]:
+        raise RequestFailed(data["refreshToken"]["errors"])
+
+
+async def create_movie(client, run):
+    await client.upload(CREATE_MOVIE_MUTATION, {
+        "poster": ("poster.jpg", run.unique(run.poster)),
+        "backdrop": ("backdrop.jpg", run.unique(run.backdrop)),
+    })
+
+
+# name -> (once per client before measuring, one request)
+STEPS = {
+    "home": (None, home),
+    "movies_by_category": (None, movies_by_category),
+    "login": (None, login),
+    # The refresh cookie comes from logging in
+    "refresh": (login, refresh),
+    "create_movie": (None, create_movie),
+}
+
+
+async def run_scenario(name, make_client, run, queries, args):
+    from streaming.renditions import wait_for_renditions
+
+    setup, step = STEPS[name]
+    clients = [make_client() for _ in range(args.concurrency)]
+    latencies, errors = [], []
+
+    async def user(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(step(client, run), args.timeout)
+            except (RequestFailed, AssertionError, OSError, asyncio.IncompleteReadError,
+                    asyncio.TimeoutError, ValueError, KeyError) as error:
+                errors.append(repr(error))
+                if isinstance(client, HTTPClient):
+                    client.close()
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        for client in clients:
+            if setup is not None:
+                await setup(client, run)
+            # Warm up: imports, connections, document cache
+            await step(client, run)
+        queries_before = queries.count
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(user(client) for client in clients))
+        elapsed = time.perf_counter() - started
+        # Background work (renditions) would slow the next scenario down:
+        # it counts toward this one, in queries and in time to catch up
+        drained = time.perf_counter()
+        await asyncio.to_thread(wait_for_renditions)
+        background = time.perf_counter() - drained
+        query_count = queries.count - queries_before
+    finally:
+        for client in clients:
+            client.close()
+
+    result = {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "queries_per_request": query_count / max(len(latencies) + len(errors), 1),
+        "background_seconds": background,
+    }
+    for pct in (50, 95, 99):
+        result[f"p{pct}_ms"] = percentile(latencies, pct) * 1000 if latencies else None
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+async def run_transport(transport, run, queries, args):
+    from asgiref.sync import sync_to_async
+    from django.db import connections
+
+    from Tau.asgi import application
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        if transport == "asgi":
+            def make_client():
+                return ASGIClient(application)
+        else:
+            target = stack.enter_context(local_server(application))
+
+            def make_client():
+                return HTTPClient(target)
+
+        for name in args.scenarios:
+            # refreshToken prints debug lines; keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = await run_scenario(name, make_client, run, queries, args)
+            print_row(name, result)
+            results[name] = result
+    # The ORM ran in asgiref's thread: don't leave its connection behind
+    await sync_to_async(connections.close_all)()
+    return results
+
+
+# --- Reporting -----------------------------------------------------------------
+
+def ms(value):
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_row(name, result):
+    print(
+        f"  {name:<20} {result['rps']:9.1f} req/s   p50 {ms(result['p50_ms'])} ms"
+        f"   p95 {ms(result['p95_ms'])} ms   p99 {ms(result['p99_ms'])} ms"
+        f"   {result['queries_per_request']:6.1f} queries/req   errors {result['errors']}"
+    )
+    if result["background_seconds"] >= 0.1:
+        print(f"  {'':<20} background work finished {result['background_seconds']:.1f} s after the last request")
+    if result.get("first_error"):
+        print(f"  {'':<20} first error: {result['first_error']}")
+
+
+def git(*command):
+    try:
+        return subprocess.run(["git", *command], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def describe(args):
+    """Where and on what these numbers were measured."""
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "catalog": {"movies": args.movies, "categories": args.categories, "images": args.images, "seed": args.seed},
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "catalog_cache": args.catalog_cache,
+    }
+
+
+def change(before, after):
+    if before is None or after is None or not before:
+        return f"{'':>8}"
+    return f"{(after - before) / before * 100:+7.1f}%"
+
+
+def compare(before, after):
+    print(f"\ncompared to {before.get('commit', '?')[:12]} ({before.get('date', '?')})")
+    if before.get("catalog") != after["catalog"] or before.get("concurrency") != after["concurrency"]:
+        print("  warning: different catalog or concurrency, the numbers aren't comparable")
+    for transport, scenarios in after["results"].items():
+        for name, result in scenarios.items():
+            old = before.get("results", {}).get(transport, {}).get(name)
+            if old is None:
+                continue
+            print(
+                f"  {transport:<4} {name:<20} req/s {old['rps']:9.1f} -> {result['rps']:9.1f} "
+                f"{change(old['rps'], result['rps'])}   p95 {ms(old['p95_ms'])} -> {ms(result['p95_ms'])} ms "
+                f"{change(old['p95_ms'], result['p95_ms'])}   queries/req "
+                f"{old['queries_per_request']:.1f} -> {result['queries_per_request']:.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=1000, help="e.g. 1000, 10000, 100000")
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--images", type=int, default=8, help="distinct poster/backdrop pairs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--scenario", dest="scenarios", action="append", choices=SCENARIOS,
+        help="scenario to run (repeat for several; default: all)",
+    )
+    parser.add_argument(
+        "--transport", dest="transports", action="append", choices=TRANSPORTS,
+        help="asgi (in-process) or http (local uvicorn server); default: both",
+    )
+    parser.add_argument("--concurrency", type=int, default=10, help="simulated users")
+    parser.add_argument("--duration", type=float, default=5, help="seconds per scenario")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds before a request counts as failed")
+    parser.add_argument("--catalog-cache", action="store_true", help="let the catalog cache answer")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file (--json) of an earlier run to compare with")
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or SCENARIOS
+    args.transports = args.transports or TRANSPORTS
+    before = None
+    if args.compare:
+        with open(args.compare) as results_file:
+            before = json.load(results_file)
+
+    setup_django()
+
+    from django.test import override_settings
+
+    media_root = tempfile.mkdtemp()
+    try:
+        # One client logs in thousands of times a second: without limits
+        # (users/ratelimit.py) or every login after the first few is refused
+        with override_settings(MEDIA_ROOT=media_root, RATE_LIMITS={}), test_database():
+            rng = random.Random(args.seed)
+            started = time.perf_counter()
+            slugs = seed(rng, args.movies, args.categories, args.images)
+            print(
+                f"{args.movies} movies, {args.categories} categories, {args.images} image pairs"
+                f" (seeded in {time.perf_counter() - started:.1f} s)"
+            )
+            print(f"{args.concurrency} clients, {args.duration:g} s per scenario\n")
+
+            queries = QueryCounter()
+            queries.install()
+            run = Run(rng, slugs, args.catalog_cache)
+            summary = describe(args)
+            summary["results"] = {}
+            for transport in args.transports:
+                print(transport)
+                summary["results"][transport] = asyncio.run(run_transport(transport, run, queries, args))
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(summary, output, indent=2)
+    if before is not None:
+        compare(before, summary)
+
+
+if __name__ == "__main__":
+    main()
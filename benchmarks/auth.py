@@ -0,0 +1,71 @@
+"""
+Cost of an authenticated '{ me { username } }' request: gqlauth's JWT
+middleware (decode + user query every time) against users.middleware
+(token -> user cache, one decode per request at most).
+
+Runs the whole Django stack in-process with the test client.
+
+    python -m benchmarks.auth --repeat 500
+"""
+
+import argparse
+import json
+
+from benchmarks import measure, report, setup_django, test_database
+
+ME_QUERY = json.dumps({"query": "{ me { username } }"})
+
+GQLAUTH_MIDDLEWARE = "gqlauth.core.middlewares.django_jwt_middleware"
+CACHED_MIDDLEWARE = "users.middleware.jwt_middleware"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+    from gqlauth.jwt.types_ import TokenType
+
+    from users.auth import token_users
+    from users.models import CustomUser
+
+    with test_database():
+        user = CustomUser.objects.create_user(
+            username="bench", email="bench@example.com", password="Str0ng!Passw0rd123"
+        )
+        token = TokenType.from_user(user).token
+
+        def run(label, middleware, **headers):
+            middlewares = [m if m != CACHED_MIDDLEWARE else middleware for m in settings.MIDDLEWARE]
+            with override_settings(MIDDLEWARE=middlewares):
+                client = Client()
+                for name, value in headers.pop("cookies", {}).items():
+                    client.cookies[name] = value
+
+                def request():
+                    response = client.post("/graphql/", ME_QUERY, content_type="application/json", **headers)
+                    assert response.json()["data"]["me"]["username"] == "bench", response.content
+
+                token_users.clear()
+                request()  # Load the middleware, warm the caches
+                with CaptureQueriesContext(connection) as queries:
+                    request()
+                report(f"{label} ({len(queries)} queries)", measure(request, args.repeat))
+
+        print(f"authenticated 'me' request, {args.repeat} runs\n")
+        header = {"HTTP_AUTHORIZATION": f"JWT {token}"}
+        cookie = {"cookies": {settings.GRAPHQL_JWT["JWT_AUTH_COOKIE"]: token}}
+        run("header, gqlauth middleware", GQLAUTH_MIDDLEWARE, **header)
+        run("header, cached middleware", CACHED_MIDDLEWARE, **header)
+        run("cookie, cached", CACHED_MIDDLEWARE, **cookie)
+        print(f"\ncache: {token_users.hits} hits, {token_users.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
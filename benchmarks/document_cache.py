@@ -0,0 +1,64 @@
+"""
+Cost of parsing + validating a GraphQL document, with and without the cache.
+
+Uses the real schema and a typical home page query; no database needed.
+
+    python -m benchmarks.document_cache --repeat 2000
+"""
+
+import argparse
+
+from benchmarks import measure, report, setup_django
+
+HOME_QUERY = """
+query Home($first: Int, $after: String) {
+    categories { id name slug }
+    moviesConnection(first: $first, after: $after) {
+        edges {
+            cursor
+            node {
+                id title description year durationFormatted
+                isNew isStudentProduction isFromFestival
+                posterMobileUrl posterDesktopUrl backdropLargeUrl
+                posterSrcset { url width format bytes }
+                categories { id name slug }
+            }
+        }
+        pageInfo { hasNextPage endCursor }
+    }
+}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from graphql.validation import specified_rules
+    from strawberry.schema.execute import parse_document, validate_document
+
+    from Tau.documents import cached_parse, cached_validate
+    from Tau.schema import schema
+
+    graphql_schema = schema._schema
+    rules = tuple(specified_rules)
+
+    def uncached():
+        document = parse_document(HOME_QUERY)
+        assert not validate_document(graphql_schema, document, list(rules))
+
+    def cached():
+        cached_parse(HOME_QUERY)
+        assert not cached_validate(graphql_schema, HOME_QUERY, rules)
+
+    cached()  # Warm the cache, like every request after the first one
+    print(f"parse + validate of the home page query, {args.repeat} runs\n")
+    report("without cache", measure(uncached, args.repeat))
+    report("with cache", measure(cached, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Login throughput per core for each password hasher (users/hashers.py).
+
+For every hasher, with the costs given here (the settings' by default),
+times authenticate() for a correct password, a wrong one and an account
+that doesn't exist, one login at a time: logins/s is what one core can
+do. "pbkdf2, before" is PBKDF2 with ModelBackend trying every login
+too, as it used to: failed logins hashed twice.
+
+    python -m benchmarks.hashing --repeat 20
+    python -m benchmarks.hashing --hashers scrypt --scrypt 32768,8,3
+"""
+
+import argparse
+import statistics
+
+from benchmarks import measure, percentile, setup_django, test_database
+
+PASSWORD = "Str0ng!Passw0rd123"
+
+HASHERS = {
+    "pbkdf2": "users.hashers.PBKDF2PasswordHasher",
+    "scrypt": "users.hashers.ScryptPasswordHasher",
+    "argon2": "users.hashers.Argon2PasswordHasher",
+}
+
+
+def costs(value):
+    return tuple(int(part) for part in value.split(","))
+
+
+def configurations(args, settings):
+    """(label, settings overrides) for every configuration to measure."""
+    scrypt = args.scrypt or (
+        settings.PASSWORD_SCRYPT_WORK_FACTOR, settings.PASSWORD_SCRYPT_BLOCK_SIZE, settings.PASSWORD_SCRYPT_PARALLELISM
+    )
+    argon2 = args.argon2 or (
+        settings.PASSWORD_ARGON2_TIME_COST, settings.PASSWORD_ARGON2_MEMORY_COST, settings.PASSWORD_ARGON2_PARALLELISM
+    )
+    iterations = args.pbkdf2_iterations or settings.PASSWORD_PBKDF2_ITERATIONS
+
+    for name in args.hashers.split(","):
+        overrides = {
+            "PASSWORD_HASHERS": [HASHERS[name]] + [path for other, path in HASHERS.items() if other != name],
+            "AUTHENTICATION_BACKENDS": settings.AUTHENTICATION_BACKENDS,
+        }
+        if name == "pbkdf2":
+            overrides["PASSWORD_PBKDF2_ITERATIONS"] = iterations
+            yield f"pbkdf2 {iterations} iterations, before", dict(
+                overrides,
+                # ModelBackend first: EmailBackend would stop a failed login before it
+                AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend", "users.backends.EmailBackend"],
+            )
+            yield f"pbkdf2 {iterations} iterations", overrides
+        elif name == "scrypt":
+            n, r, p = scrypt
+            overrides.update(
+                PASSWORD_SCRYPT_WORK_FACTOR=n, PASSWORD_SCRYPT_BLOCK_SIZE=r, PASSWORD_SCRYPT_PARALLELISM=p
+            )
+            yield f"scrypt n={n} r={r} p={p} ({128 * n * r >> 20} MiB)", overrides
+        elif name == "argon2":
+            t, m, p = argon2
+            overrides.update(
+                PASSWORD_ARGON2_TIME_COST=t, PASSWORD_ARGON2_MEMORY_COST=m, PASSWORD_ARGON2_PARALLELISM=p
+            )
+            yield f"argon2id t={t} m={m >> 10} MiB p={p}", overrides
+
+
+def report(label, samples):
+    mean = statistics.mean(samples)
+    print(
+        f"  {label:<18} mean {mean * 1000:8.1f} ms   p95 {percentile(samples, 95) * 1000:8.1f} ms"
+        f"   {1 / mean:7.1f} logins/s per core"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hashers", default="pbkdf2,scrypt,argon2", help="comma separated, among pbkdf2,scrypt,argon2")
+    parser.add_argument("--repeat", type=int, default=20, help="logins of each kind")
+    parser.add_argument("--scrypt", type=costs, help="work factor,block size,parallelism")
+    parser.add_argument("--argon2", type=costs, help="time cost,memory cost in KiB,parallelism")
+    parser.add_argument("--pbkdf2-iterations", type=int)
+    args = parser.parse_args()
+    for name in args.hashers.split(","):
+        if name not in HASHERS:
+            parser.error(f"unknown hasher {name!r}")
+
+    setup_django()
+
+    from django.conf import settings
+    from django.contrib.auth import authenticate
+    from django.test import override_settings
+
+    from users.models import CustomUser
+
+    with test_database():
+        print(f"authenticate(), {args.repeat} logins of each kind, one at a time\n")
+        for number, (label, overrides) in enumerate(configurations(args, settings)):
+            if label.startswith("argon2"):
+                try:
+                    import argon2  # noqa: F401
+                except ImportError:
+                    print(f"{label}: skipped, argon2-cffi is not installed\n")
+                    continue
+
+            with override_settings(**overrides):
+                email = f"bench{number}@example.com"
+                user = CustomUser.objects.create_user(username=f"bench{number}", email=email, password=PASSWORD)
+
+                def login(password, email=email):
+                    return authenticate(None, username=email, password=password)
+
+                # Warm up: connection, dummy hash
+                assert login(PASSWORD) == user
+                login("nope")
+                authenticate(None, username="nobody@example.com", password=PASSWORD)
+
+                print(label)
+                report("correct password", measure(lambda: login(PASSWORD), args.repeat))
+                report("wrong password", measure(lambda: login("Wr0ng!Passw0rd123"), args.repeat))
+                report(
+                    "unknown account",
+                    measure(lambda: authenticate(None, username="nobody@example.com", password=PASSWORD), args.repeat),
+                )
+                print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+HTTP load test for the GraphQL endpoint: how many concurrent clients can
+ONE worker serve before latency falls apart?
+
+Unlike the other benchmarks this one talks to running servers, so it can
+compare two builds side by side. For example, sync view vs async view:
+
+    # before: a checkout of the old code, on port 8001
+    git worktree add /tmp/tau-before <old commit>
+    (cd /tmp/tau-before && gunicorn Tau.asgi:application \\
+        -k uvicorn.workers.UvicornWorker -w 1 -b 127.0.0.1:8001)
+
+    # after: this checkout, on port 8000
+    gunicorn Tau.asgi:application -k uvicorn.workers.UvicornWorker -w 1 -b 127.0.0.1:8000
+
+    python -m benchmarks.load_test \\
+        --target before=http://127.0.0.1:8001/graphql/ \\
+        --target after=http://127.0.0.1:8000/graphql/
+
+Use a single worker (-w 1) on both sides: we measure what one process can
+keep in flight. Both servers should point at the same, seeded database.
+
+For every concurrency level we print req/s and latency percentiles, then
+the highest level whose p95 stays under --latency-budget-ms without errors:
+that is the "concurrency limit" of the build.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import urlsplit
+
+from . import percentile
+
+HOME_QUERY = """
+query Home {
+    movies {
+        id title year durationFormatted posterMobileUrl
+        categories { name slug }
+    }
+}
+"""
+
+
+class Target:
+    def __init__(self, spec):
+        label, _, url = spec.rpartition("=")
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise argparse.ArgumentTypeError(f"only http:// targets are supported: {url}")
+        self.label = label or url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection (stdlib only, no client library)."""
+
+    def __init__(self, target):
+        self.target = target
+        self.reader = self.writer = None
+
+    async def request(self, body, content_type="application/json", headers=()):
+        """POST 'body'. Returns (status, headers, content); headers are (lowercase name, value) pairs."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.target.host, self.target.port)
+        extra = "".join(f"{name}: {value}\r\n" for name, value in headers)
+        head = (
+            f"POST {self.target.path} HTTP/1.1\r\n"
+            f"Host: {self.target.host}:{self.target.port}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{extra}"
+            "\r\n"
+        )
+        self.writer.write(head.encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = []
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers.append((name.strip().lower(), value.strip()))
+        headers = dict(response_headers)
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            content = b""
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                content += chunk[:-2]
+        else:
+            content = await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, response_headers, content
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def client(target, payloads, deadline, timeout, latencies, errors):
+    """Send requests back to back until the deadline."""
+    connection = Connection(target)
+    try:
+        while time.perf_counter() < deadline:
+            body = next(payloads)
+            start = time.perf_counter()
+            try:
+                status, _, content = await asyncio.wait_for(connection.request(body), timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError, IndexError):
+                errors.append(time.perf_counter() - start)
+                connection.close()
+                continue
+            if status != 200 or b'"errors"' in content:
+                errors.append(time.perf_counter() - start)
+            else:
+                latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+
+
+def make_payloads(query, bust_cache):
+    # An unused variable changes the catalog cache key without changing the
+    # query, so we measure resolvers + ORM instead of cache hits
+    for nonce in itertools.count():
+        payload = {"query": query}
+        if bust_cache:
+            payload["variables"] = {"nonce": nonce}
+        yield json.dumps(payload).encode()
+
+
+async def run_level(target, concurrency, duration, timeout, payloads):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(target, payloads, deadline, timeout, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    result = {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+    }
+    for pct in (50, 95, 99):
+        result[f"p{pct}_ms"] = percentile(latencies, pct) * 1000 if latencies else None
+    return result
+
+
+def print_row(result):
+    def ms(value):
+        return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+    print(
+        f"  c={result['concurrency']:<5} {result['rps']:9.1f} req/s"
+        f"   p50 {ms(result['p50_ms'])} ms   p95 {ms(result['p95_ms'])} ms"
+        f"   p99 {ms(result['p99_ms'])} ms   errors {result['errors']}"
+    )
+
+
+def concurrency_limit(results, budget_ms):
+    """Highest level that stayed under the p95 budget with no errors."""
+    limit = None
+    for result in results:
+        if result["errors"] or result["p95_ms"] is None or result["p95_ms"] > budget_ms:
+            break
+        limit = result["concurrency"]
+    return limit
+
+
+async def main(args):
+    query = open(args.query_file).read() if args.query_file else HOME_QUERY
+    summary = {}
+    for target in args.target:
+        print(f"{target.label}")
+        payloads = make_payloads(query, not args.no_cache_busting)
+        # Warm up: imports, DB connections, document cache
+        await run_level(target, 1, 1, args.timeout, payloads)
+        results = []
+        for concurrency in args.concurrency:
+            result = await run_level(target, concurrency, args.duration, args.timeout, payloads)
+            print_row(result)
+            results.append(result)
+        summary[target.label] = {
+            "limit": concurrency_limit(results, args.latency_budget_ms),
+            "results": results,
+        }
+
+    print()
+    for label, data in summary.items():
+        print(f"{label:<20} concurrency limit (p95 <= {args.latency_budget_ms:g} ms): {data['limit']}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(summary, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--target", type=Target, action="append", required=True,
+        help="label=url of a running GraphQL endpoint (repeat to compare builds)",
+    )
+    parser.add_argument(
+        "--concurrency", default=[1, 10, 25, 50, 100, 200],
+        type=lambda value: [int(level) for level in value.split(",")],
+        help="comma separated numbers of concurrent clients (default: 1,10,25,50,100,200)",
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds before a request counts as failed")
+    parser.add_argument("--latency-budget-ms", type=float, default=500)
+    parser.add_argument("--query-file", help="GraphQL query to send (default: the home page query)")
+    parser.add_argument("--no-cache-busting", action="store_true", help="let the catalog cache answer")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""
+Listing poster URLs for N movies: imagekit lookup vs. rendition manifest.
+
+"before" is how MovieType.poster_*_url used to work: the posters were
+imagekit ImageSpecFields, and .url with the default JustInTime strategy
+checks (through its cache, and on a miss through the storage) that the
+file exists. The old specs are re-declared below for the comparison.
+"after" is the manifest path used today: pure string formatting.
+
+    python -m benchmarks.rendition_urls --movies 500 --repeat 20
+    python -m benchmarks.rendition_urls --storage-latency-ms 20   # S3-like
+
+--storage-latency-ms adds a sleep to every storage.exists() call to show
+what a networked storage would cost.
+"""
+
+import argparse
+import io
+import shutil
+import tempfile
+import time
+
+from benchmarks import measure, report, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--storage-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.cache import cache
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import FileSystemStorage
+    from django.test import override_settings
+    from imagekit import ImageSpec, register
+    from imagekit.cachefiles import ImageCacheFile
+    from imagekit.cachefiles.strategies import JustInTime
+    from imagekit.processors import ResizeToFit
+    from PIL import Image
+
+    from streaming.models import Movie
+    from streaming.renditions import generate_renditions, rendition_url
+
+    class PosterMobile(ImageSpec):
+        processors = [ResizeToFit(160, 240)]
+        format = "WEBP"
+        options = {"quality": 80}
+
+    class PosterDesktop(ImageSpec):
+        processors = [ResizeToFit(220, 330)]
+        format = "WEBP"
+        options = {"quality": 80}
+
+    # imagekit only runs the strategy for registered generators
+    register.generator("benchmarks:poster_mobile", PosterMobile)
+    register.generator("benchmarks:poster_desktop", PosterDesktop)
+
+    media_root = tempfile.mkdtemp()
+    storage_calls = {"exists": 0}
+    original_exists = FileSystemStorage.exists
+
+    def counting_exists(self, name):
+        storage_calls["exists"] += 1
+        if args.storage_latency_ms:
+            time.sleep(args.storage_latency_ms / 1000)
+        return original_exists(self, name)
+
+    try:
+        with override_settings(MEDIA_ROOT=media_root), test_database():
+            # Seed: one small poster per movie
+            buffer = io.BytesIO()
+            Image.new("RGB", (400, 600), color=(40, 40, 160)).save(buffer, format="JPEG")
+            storage = FileSystemStorage()
+            Movie.objects.bulk_create([
+                Movie(
+                    title=f"Movie {i}", description="", year=2000, duration_minutes=90,
+                    poster_original=storage.save(f"movies/posters/bench_{i}.jpg", ContentFile(buffer.getvalue())),
+                )
+                for i in range(args.movies)
+            ])
+            # The manifest side only formats strings, so one real manifest
+            # copied to every movie is enough (and much faster to seed)
+            first = Movie.objects.first()
+            generate_renditions(first.pk)
+            first.refresh_from_db()
+            Movie.objects.update(renditions=first.renditions, renditions_status=first.renditions_status)
+            movies = list(Movie.objects.all())
+
+            # The imagekit side needs every file to exist, one per movie
+            old_specs = [
+                [spec(source=movie.poster_original) for spec in (PosterMobile, PosterDesktop)]
+                for movie in movies
+            ]
+            for specs in old_specs:
+                for spec in specs:
+                    ImageCacheFile(spec).generate()
+
+            def before():
+                for specs in old_specs:
+                    for spec in specs:
+                        ImageCacheFile(spec, cachefile_strategy=JustInTime()).url
+
+            def before_cold():
+                # A cold imagekit state cache (new deploy, evicted key) hits the storage
+                cache.clear()
+                before()
+
+            def after():
+                for movie in movies:
+                    rendition_url(movie, "poster_mobile")
+                    rendition_url(movie, "poster_desktop")
+
+            FileSystemStorage.exists = counting_exists
+            print(f"{args.movies} movies x 2 poster URLs, {args.repeat} runs\n")
+            for label, fn in (
+                ("before: imagekit .url", before),
+                ("before: imagekit .url, cache cleared", before_cold),
+                ("after: manifest", after),
+            ):
+                storage_calls["exists"] = 0
+                samples = measure(fn, args.repeat)
+                report(label, samples)
+                print(f"{'':<40} storage.exists() calls per run: {storage_calls['exists'] // args.repeat}")
+    finally:
+        FileSystemStorage.exists = original_exists
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Latency of searchMovies on a synthetic catalog (100k titles by default).
+
+Needs PostgreSQL (full-text search and pg_trgm). Measures what the
+resolver does for one page: the full-text existence check, the ranked
+page and, for typos, the trigram fallback.
+
+    python -m benchmarks.search --movies 100000 --repeat 200
+"""
+
+import argparse
+import random
+import sys
+
+from benchmarks import measure, report, setup_django, test_database
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ra", "te", "su", "no", "vi", "da", "ze", "ri", "pa",
+    "ton", "mar", "sel", "dor", "lin", "ves", "cor", "tan", "bel", "qui",
+]
+
+
+def make_vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_typo(rng, word):
+    # Drop or swap one letter, like a hurried user would
+    i = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def seed(rng, vocabulary, count):
+    """Create 'count' movies; returns the description words of the active ones."""
+    from streaming.models import Movie
+
+    batch = []
+    descriptions = []
+    for i in range(count):
+        description = [rng.choice(vocabulary) for _ in range(rng.randint(10, 30))]
+        movie = Movie(
+            title=" ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 4))).title(),
+            description=" ".join(description),
+            year=rng.randint(1950, 2025),
+            duration_minutes=rng.randint(60, 180),
+            is_active=rng.random() > 0.05,
+        )
+        batch.append(movie)
+        if movie.is_active:
+            descriptions.append(description)
+        if len(batch) == 5000:
+            Movie.objects.bulk_create(batch)
+            batch = []
+    Movie.objects.bulk_create(batch)
+    return descriptions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--movies", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=200, help="queries per kind")
+    parser.add_argument("--first", type=int, default=20, help="page size")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from asgiref.sync import async_to_sync
+    from django.db import connection
+
+    from streaming.pagination import paginate_ranked
+    from streaming.schema import active_movies
+    from streaming.search import search_movies
+
+    if connection.vendor != "postgresql":
+        sys.exit("searchMovies needs PostgreSQL")
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng, 20_000)
+
+    @async_to_sync
+    async def search_page(text):
+        queryset = await search_movies(active_movies(), text)
+        await paginate_ranked(queryset, args.first)
+
+    def run(queries):
+        queries = iter(queries)
+        return measure(lambda: search_page(next(queries)), args.repeat)
+
+    with test_database():
+        print(f"seeding {args.movies} movies...")
+        descriptions = seed(rng, vocabulary, args.movies)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE streaming_movie")
+
+        words = [rng.choice(vocabulary) for _ in range(args.repeat)]
+        # Two words that do appear together in some movie
+        pairs = [" ".join(rng.sample(rng.choice(descriptions), 2)) for _ in range(args.repeat)]
+        typos = [make_typo(rng, word) for word in words]
+
+        print(f"searchMovies(first: {args.first}), {args.repeat} queries each\n")
+        report("one word (full-text)", run(words))
+        report("two words (full-text)", run(pairs))
+        report("typo (trigram fallback)", run(typos))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StreamingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "streaming"
+
+    def ready(self):
+        # Connect the cache invalidation signals, register the system checks
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,219 @@
+"""
+Server-side response cache for the public catalog queries.
+
+The catalog (movies + categories) only changes when an admin edits it,
+so we keep the finished GraphQL result in the Django cache and serve it
+again until something changes.
+
+How invalidation works:
+    Every cache key contains a "catalog version" number. When a Movie or
+    Category changes (see signals.py), we bump that number once the change
+    commits. Old entries are simply never read again and expire on their own.
+
+HTTP caching:
+    Catalog queries sent with GET also get an ETag (derived from the same
+    key, so it changes with the catalog version) and a public Cache-Control
+    header. Browsers, nginx and CDNs can then keep the response, and a
+    request with a matching If-None-Match gets a bodyless 304 without
+    running the query. POST responses, responses with errors and requests
+    asking for the timing summary are never marked cacheable.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+from graphql import ExecutionResult, FieldNode, OperationType
+from graphql.utilities import get_operation_ast
+from strawberry.extensions import SchemaExtension
+
+VERSION_KEY = "catalog:version"
+KEY_PREFIX = "catalog:response"
+
+# Root fields that only read the public catalog. A query is cached only
+# if ALL of its root fields are in this set (so 'me' is never cached).
+CATALOG_FIELDS = {
+    "__typename",
+    "movies",
+    "categories",
+    "moviesByCategory",
+    "moviesConnection",
+    "moviesByCategoryConnection",
+    "searchMovies",
+    "catalog",
+    "homeRails",
+}
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock, not from 1: if the key gets evicted we must
+        # never go back to a number that old entries were stored under.
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response."""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Key was missing (first write or evicted)
+        get_catalog_version()
+        return cache.incr(VERSION_KEY)
+
+
+class CacheStats:
+    """Hit/miss counters for this process. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def is_catalog_operation(execution_context):
+    """True if the operation is a query that only touches catalog fields."""
+    document = execution_context.graphql_document
+    if document is None:
+        return False
+    operation = get_operation_ast(document, execution_context.operation_name)
+    if operation is None or operation.operation != OperationType.QUERY:
+        return False
+    for selection in operation.selection_set.selections:
+        # Fragments on the root type are rare; don't try to be clever with them
+        if not isinstance(selection, FieldNode):
+            return False
+        if selection.name.value not in CATALOG_FIELDS:
+            return False
+    return True
+
+
+def make_cache_key(execution_context, version):
+    payload = json.dumps(
+        [
+            execution_context.query,
+            execution_context.operation_name,
+            execution_context.variables or {},
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha256(payload.encode()).hexdigest()
+    return f"{KEY_PREFIX}:{version}:{digest}"
+
+
+def make_etag(cache_key):
+    # '<version>-<digest>': same query + same catalog -> same ETag. Only on
+    # every worker if they share the cache the version lives in (not LocMem)
+    _, _, version, digest = cache_key.split(":")
+    return quote_etag(f"{version}-{digest[:32]}")
+
+
+def etag_matches(request, etag):
+    """Does the request's If-None-Match accept 'etag'? (weak comparison)"""
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    # Proxies that compress the body turn our ETag into W/"..."
+    etags = {tag.removeprefix("W/") for tag in parse_etags(header)}
+    return etag in etags or "*" in etags
+
+
+class CatalogCacheExtension(SchemaExtension):
+    """
+    Serves catalog queries from the cache and stores fresh results.
+
+    Setting execution_context.result before 'yield' makes strawberry skip
+    execution completely, so a hit runs no SQL and no resolvers.
+    """
+
+    def on_execute(self):
+        execution_context = self.execution_context
+        if not is_catalog_operation(execution_context):
+            yield
+            return
+
+        key = make_cache_key(execution_context, get_catalog_version())
+
+        etag = None
+        request = getattr(execution_context.context, "request", None)
+        if request is not None and request.method == "GET":
+            if request.headers.get(settings.GRAPHQL_TIMING_HEADER):
+                # The response may carry a timing summary meant for this client
+                # only (Tau/metrics.py): keep it out of every shared cache
+                patch_cache_control(execution_context.context.response, private=True, no_store=True)
+            else:
+                etag = make_etag(key)
+
+        if etag is not None and etag_matches(request, etag):
+            # The client already has this exact response: the view sends
+            # a bodyless 304 (see TauGraphQLView.create_response)
+            stats.record(True)
+            self.set_header("HIT")
+            self.set_http_cache_headers(etag)
+            self.execution_context.context.response.status_code = 304
+            execution_context.result = ExecutionResult(data=None, errors=None)
+            yield
+            return
+
+        data = cache.get(key)
+        hit = data is not None
+        stats.record(hit)
+        self.set_header("HIT" if hit else "MISS")
+
+        if hit:
+            execution_context.result = ExecutionResult(data=data, errors=None)
+        yield
+
+        # Only a clean result may be stored or handed to shared caches: an
+        # error (a bad cursor, a timeout...) must not be served to others
+        result = execution_context.result
+        if result is None or result.errors:
+            return
+        if not hit:
+            cache.set(key, result.data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        if etag is not None:
+            self.set_http_cache_headers(etag)
+
+    def set_http_cache_headers(self, etag):
+        response = self.execution_context.context.response
+        response["ETag"] = etag
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=settings.CATALOG_HTTP_MAX_AGE,
+            stale_while_revalidate=settings.CATALOG_HTTP_STALE_WHILE_REVALIDATE,
+        )
+
+    def set_header(self, value):
+        # Handy for debugging from the browser / curl: X-Catalog-Cache: HIT
+        response = getattr(self.execution_context.context, "response", None)
+        if response is not None:
+            response["X-Catalog-Cache"] = value
@@ -0,0 +1,89 @@
+"""
+The catalog field: filters, sort orders and facet counts, all done in SQL.
+
+Facets are counted over the filtered catalog in one aggregate query: one
+COUNT(...) FILTER (WHERE ...) per flag and per category, instead of one
+COUNT(*) query per facet.
+"""
+
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import Category, Movie
+
+FLAGS = ("is_new", "is_student_production", "is_from_festival")
+
+# Every ordering ends with the id, so each row has a unique position and
+# paginate_sorted() can continue after it
+ORDERINGS = {
+    "id": ("id",),
+    "newest": ("-year", "-id"),
+    "oldest": ("year", "id"),
+    "title": ("title", "id"),
+    "shortest": ("duration_minutes", "id"),
+    "longest": ("-duration_minutes", "-id"),
+}
+
+
+def in_category(slugs):
+    # EXISTS instead of a join: a movie in two of the categories is still one row
+    return Exists(Movie.categories.through.objects.filter(movie_id=OuterRef("pk"), category__slug__in=slugs))
+
+
+def filter_catalog(
+    queryset,
+    flags=None,
+    year_min=None,
+    year_max=None,
+    duration_min=None,
+    duration_max=None,
+    category_slugs=None,
+    match_all_categories=False,
+):
+    """
+    Narrow down 'queryset'. 'flags' maps flag names (see FLAGS) to the
+    wanted value; None anywhere means "don't filter on this".
+    """
+    for flag, value in (flags or {}).items():
+        if value is not None:
+            queryset = queryset.filter(**{flag: value})
+    if year_min is not None:
+        queryset = queryset.filter(year__gte=year_min)
+    if year_max is not None:
+        queryset = queryset.filter(year__lte=year_max)
+    if duration_min is not None:
+        queryset = queryset.filter(duration_minutes__gte=duration_min)
+    if duration_max is not None:
+        queryset = queryset.filter(duration_minutes__lte=duration_max)
+    if category_slugs:
+        if match_all_categories:
+            for slug in set(category_slugs):
+                queryset = queryset.filter(in_category([slug]))
+        else:
+            queryset = queryset.filter(in_category(category_slugs))
+    return queryset
+
+
+async def catalog_facets(queryset):
+    """
+    Count the movies of 'queryset': in total, per flag and per category.
+
+    Returns a dict {"total": n, "flags": {flag: n}, "categories": [(category, n)]}
+    with every category, including the empty ones.
+    """
+    categories = [category async for category in Category.objects.order_by("name")]
+
+    # The category counts join the M2M table, so a movie shows up once per
+    # category: movie counts must be DISTINCT. (movie, category) pairs are
+    # unique, so the category counts need not be.
+    aggregates = {"total": Count("pk", distinct=True)}
+    for flag in FLAGS:
+        aggregates[flag] = Count("pk", distinct=True, filter=Q(**{flag: True}))
+    for category in categories:
+        aggregates[f"category_{category.pk}"] = Count("categories", filter=Q(categories=category.pk))
+
+    counts = await queryset.order_by().aaggregate(**aggregates)
+    return {
+        "total": counts["total"],
+        "flags": {flag: counts[flag] for flag in FLAGS},
+        "categories": [(category, counts[f"category_{category.pk}"]) for category in categories],
+    }
@@ -0,0 +1,54 @@
+"""
+System checks for the streaming app.
+
+The catalog version (cache.py) lives in the default cache. With the local
+memory backend every process has its own copy: an edit made through one
+server worker, a management command (import_movies, generate_renditions)
+or the admin of another worker never invalidates what the others serve.
+
+The rate limits of users/ratelimit.py have the same problem: with
+MemoryBackend, or CacheBackend on a local cache, every worker keeps its own
+buckets and a client gets the limit once per worker.
+"""
+
+from django.conf import settings
+from django.core import checks
+
+LOCAL_CACHES = {"django.core.cache.backends.locmem.LocMemCache"}
+LOCAL_RATE_LIMIT_BACKENDS = {"users.ratelimit.MemoryBackend"}
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.DEBUG or settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHES:
+        return []
+    return [
+        checks.Warning(
+            "The default cache is local to each process, so catalog changes "
+            "made by other processes don't invalidate the cached catalog.",
+            hint="Point DJANGO_CACHE_BACKEND and DJANGO_CACHE_LOCATION at a shared "
+            "cache, e.g. django.core.cache.backends.redis.RedisCache and redis://redis:6379/0.",
+            id="streaming.W001",
+        )
+    ]
+
+
+@checks.register(checks.Tags.security)
+def check_shared_rate_limits(app_configs, **kwargs):
+    if settings.DEBUG:
+        return []
+    backend = settings.RATE_LIMIT_BACKEND
+    if backend not in LOCAL_RATE_LIMIT_BACKENDS and not (
+        backend == "users.ratelimit.CacheBackend"
+        and settings.CACHES[settings.RATE_LIMIT_CACHE]["BACKEND"] in LOCAL_CACHES
+    ):
+        return []
+    return [
+        checks.Warning(
+            "The rate limit buckets are local to each process, so every worker "
+            "lets a client through up to the limit again.",
+            hint="Set RATE_LIMIT_BACKEND=users.ratelimit.CacheBackend, with "
+            "RATE_LIMIT_CACHE pointing at a shared cache.",
+            id="streaming.W002",
+        )
+    ]
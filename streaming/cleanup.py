@@ -0,0 +1,277 @@
+"""
+Bulk archive/delete of movies, and removal of the files they leave behind.
+
+QuerySet.delete() loads every movie to send post_delete and to clear the
+M2M rows one movie at a time. Here each chunk of movies is two DELETE
+statements (links, then movies) and nothing is loaded but the columns that
+name files.
+
+Files are not deleted inside the request: once a chunk commits, its
+originals and renditions go to a single background thread (the cleanup
+queue). Movies with identical images share files (storage.py), so a file
+is only deleted if no remaining movie uses its original, and no upload
+reused that original in the last MIN_AGE seconds (its row may not have
+committed yet). Anything that slips through (a crash, a replaced poster,
+a recently reused original) is found later by 'manage.py purge_orphan_media'.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from PIL import Image
+
+from .cache import bump_catalog_version
+from .models import Movie
+from .renditions import RENDITIONS, RENDITIONS_DIR
+from .storage import originals_storage
+from .uploads import ALLOWED_FORMATS
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+# Files checked against the database per query by find_orphans()
+ORPHAN_BATCH_SIZE = 1000
+
+# Files modified more recently than this (seconds) are never deleted: they
+# may belong to an upload whose movie hasn't committed yet
+MIN_AGE = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_cleanup_executor():
+    """The cleanup queue: one thread, so deletions never compete with requests."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-cleanup")
+        return _executor
+
+
+def movie_files(poster, backdrop, renditions):
+    """
+    A movie's files as (storage name, original) pairs: each original with
+    itself, each rendition with the original it was cut from.
+    """
+    originals = {"poster_original": poster, "backdrop_original": backdrop}
+    sources = {rendition.name: rendition.source for rendition in RENDITIONS}
+    files = [(name, name) for name in originals.values() if name]
+    for key, entry in renditions.items():
+        source = originals.get(sources.get(key))
+        # Manifests written before the registry stored the bare file name
+        files.append((entry if isinstance(entry, str) else entry["name"], source))
+    return files
+
+
+def used_originals(names):
+    """The originals among 'names' that some movie still points at."""
+    used = set()
+    for poster, backdrop in Movie.objects.filter(
+        Q(poster_original__in=names) | Q(backdrop_original__in=names)
+    ).values_list("poster_original", "backdrop_original"):
+        used.update((poster, backdrop))
+    return used
+
+
+def recently_used(storage, name):
+    """True if 'name' was written or reused (ContentAddressedMixin.touch) less than MIN_AGE ago."""
+    try:
+        modified = storage.get_modified_time(name)
+    except (OSError, NotImplementedError):
+        return False
+    return time.time() - modified.timestamp() < MIN_AGE
+
+
+def delete_files(files):
+    """
+    Delete (name, original) pairs, unless another movie still uses the
+    original or an upload has just reused it.
+    """
+    try:
+        sources = {source for _, source in files if source}
+        kept = used_originals(sources)
+        # An upload of the same bytes finds the original in storage and
+        # writes nothing; its movie row only shows up once it commits
+        kept.update(source for source in sources - kept if recently_used(originals_storage(), source))
+        for name, source in files:
+            if source in kept:
+                continue
+            storage = originals_storage() if name == source else default_storage
+            try:
+                storage.delete(name)
+            except Exception:
+                # Left for purge_orphan_media
+                logger.exception("Could not delete %s", name)
+    finally:
+        # The cleanup thread gets its own DB connection; don't leak it
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+def schedule_file_cleanup(files):
+    """Queue (name, original) pairs for deletion once the current transaction commits."""
+    files = list(files)
+    if files:
+        transaction.on_commit(lambda: get_cleanup_executor().submit(delete_files, files))
+
+
+def archive_movies(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Hide the movies of 'queryset' (is_active=False) with one UPDATE per
+    chunk. Files are kept, so an archived movie can come back as it was.
+    Returns how many movies were archived.
+    """
+    queryset = queryset.filter(is_active=True)
+    archived = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            break
+        archived += Movie.objects.filter(pk__in=ids).update(is_active=False)
+    # update() sends no post_save. After the commit, like signals.py does
+    if archived:
+        transaction.on_commit(bump_catalog_version)
+    return archived
+
+
+def delete_movies(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Delete the movies of 'queryset' a chunk at a time, and queue their
+    files for deletion. Returns how many movies were deleted.
+    """
+    Link = Movie.categories.through
+    deleted = 0
+    while True:
+        chunk = list(
+            queryset.order_by("pk")
+            .values_list("pk", "poster_original", "backdrop_original", "renditions")[:chunk_size]
+        )
+        if not chunk:
+            break
+        ids = [pk for pk, *_ in chunk]
+        with transaction.atomic():
+            # _raw_delete(): a plain DELETE ... WHERE, without collecting
+            # the rows first. Nothing else points at a movie but the links.
+            Link.objects.filter(movie_id__in=ids)._raw_delete(Link.objects.db)
+            count = Movie.objects.filter(pk__in=ids)._raw_delete(Movie.objects.db)
+            schedule_file_cleanup(name for _, *files in chunk for name in movie_files(*files))
+        deleted += count
+        if not count:
+            break
+    # No post_delete either
+    if deleted:
+        transaction.on_commit(bump_catalog_version)
+    return deleted
+
+
+# --- Orphan files ---------------------------------------------------------------
+
+def walk_files(path):
+    """
+    Yield the files under 'path' (os.DirEntry), depth first. Only one
+    directory listing per level is open at a time, however many files there are.
+    """
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from walk_files(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def image_extensions():
+    Image.init()
+    extensions = [ext for ext, fmt in Image.registered_extensions().items() if fmt in ALLOWED_FORMATS]
+    return extensions + [ext.upper() for ext in extensions]
+
+
+def rendition_source(folder, extensions):
+    """
+    The original a renditions folder was cut from, or None if we can't
+    tell. Folders are named '<stem>_<sha1 of the original name>' (see
+    renditions.storage_name), so we try the names the original could have.
+    """
+    stem, _, digest = folder.rpartition("_")
+    for field_name in ("poster_original", "backdrop_original"):
+        upload_to = Movie._meta.get_field(field_name).upload_to
+        for extension in extensions:
+            name = f"{upload_to}{stem}{extension}"
+            if hashlib.sha1(name.encode()).hexdigest()[:10] == digest:
+                return name
+    return None
+
+
+def find_orphans(media_root=None, min_age=MIN_AGE):
+    """
+    Yield the files under media/movies and media/CACHE that no movie uses,
+    as (storage name, DirEntry) pairs. Files newer than 'min_age' seconds
+    are left alone: they may belong to an upload that hasn't committed yet.
+
+    Files are checked ORPHAN_BATCH_SIZE at a time, one query per batch, so
+    memory doesn't grow with the size of the media directory.
+    """
+    media_root = str(media_root or settings.MEDIA_ROOT)
+    extensions = image_extensions()
+    cutoff = time.time() - min_age
+    files = (
+        (os.path.relpath(entry.path, media_root).replace(os.sep, "/"), entry)
+        for top in ("movies", "CACHE")
+        for entry in walk_files(os.path.join(media_root, top))
+        if entry.stat(follow_symlinks=False).st_mtime < cutoff
+    )
+    while batch := list(islice(files, ORPHAN_BATCH_SIZE)):
+        # Storage name -> the original that keeps it (None: nothing does)
+        needs = {}
+        sources = {}   # One lookup per renditions folder, not per file
+        for name, _ in batch:
+            if name.startswith("movies/"):
+                needs[name] = name
+            elif name.startswith(f"{RENDITIONS_DIR}/"):
+                folder = name[len(RENDITIONS_DIR) + 1:].split("/")[0]
+                if folder not in sources:
+                    sources[folder] = rendition_source(folder, extensions)
+                source = sources[folder]
+                # Can't tell which original it was cut from: leave it alone
+                if source is not None:
+                    needs[name] = source
+            else:
+                # Old imagekit files: nothing reads them anymore
+                needs[name] = None
+
+        used = used_originals({source for source in needs.values() if source})
+
+        for name, entry in batch:
+            if name in needs and needs[name] not in used:
+                yield name, entry
+
+
+def remove_empty_dirs(path):
+    """Remove the empty folders under 'path' (left by deleted renditions), bottom up."""
+    removed = 0
+    try:
+        with os.scandir(path) as entries:
+            folders = [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return 0
+    for folder in folders:
+        removed += remove_empty_dirs(folder)
+        try:
+            os.rmdir(folder)
+            removed += 1
+        except OSError:
+            pass  # Not empty
+    return removed
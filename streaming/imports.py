@@ -0,0 +1,321 @@
+"""
+Bulk movie import (the bulkImportMovies mutation and the import_movies command).
+
+A manifest lists one movie per row, as CSV or JSON Lines:
+
+    title,description,year,duration_minutes,categories,is_new,poster,backdrop
+    Alpha,A film,2024,95,drama|comedy,yes,alpha.jpg,alpha_wide.jpg
+
+    {"title": "Alpha", "year": 2024, "duration_minutes": 95, "categories": ["drama"], "poster": "alpha.jpg"}
+
+'poster' and 'backdrop' are paths inside an image directory or ZIP archive.
+
+Rows are checked first, and the category slugs of all of them are looked
+up in one query. Valid rows are then inserted in chunks: one bulk_create
+for the movies and one for their category links per chunk. A bad row is
+reported with its line number and skipped; the rest of the import goes on.
+"""
+
+import codecs
+import csv
+import json
+import os
+import zipfile
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.files import File
+from django.db import DatabaseError, transaction
+from PIL import Image
+
+from .cache import bump_catalog_version
+from .models import Category, Movie
+from .renditions import schedule_bulk_renditions
+from .storage import content_hash, originals_storage
+from .uploads import ALLOWED_FORMATS
+
+CHUNK_SIZE = 500
+
+FLAGS = ("is_new", "is_student_production", "is_from_festival", "is_active")
+IMAGE_FIELDS = {"poster": "poster_original", "backdrop": "backdrop_original"}
+
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+
+
+class InvalidRow(Exception):
+    """A row that can't be imported; the message tells the user why."""
+
+
+class RowError(NamedTuple):
+    line: int
+    message: str
+
+
+class ImportResult(NamedTuple):
+    created: list    # ids of the new movies
+    errors: list     # RowError, in manifest order
+
+
+class PreparedRow(NamedTuple):
+    line: int
+    movie: Movie
+    category_ids: list
+    stored: list     # Originals this row wrote (see store_images)
+
+
+# --- Reading the manifest ---------------------------------------------------
+
+def read_manifest(file, name):
+    """
+    Yield (line number, row) pairs from a CSV or JSONL manifest. A row is a
+    dict, or an InvalidRow if the line itself can't be read.
+    """
+    extension = os.path.splitext(name)[1].lower()
+    text = codecs.getreader("utf-8-sig")(file)
+    if extension == ".csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    elif extension in (".jsonl", ".ndjson"):
+        for line, content in enumerate(text, start=1):
+            if not content.strip():
+                continue
+            try:
+                row = json.loads(content)
+            except ValueError as error:
+                yield line, InvalidRow(f"invalid JSON: {error}")
+                continue
+            yield line, row if isinstance(row, dict) else InvalidRow("expected a JSON object")
+    else:
+        raise ValueError(f"'{name}': manifests must be .csv or .jsonl files")
+
+
+def parse_bool(row, column):
+    value = row.get(column)
+    if isinstance(value, bool):
+        return value
+    text = "" if value is None else str(value).strip().lower()
+    if not text:
+        # Missing or empty: the model default (is_active is True)
+        return Movie._meta.get_field(column).default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise InvalidRow(f"'{column}' must be true or false, not {value!r}")
+
+
+def parse_int(row, column, minimum):
+    value = row.get(column)
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        raise InvalidRow(f"'{column}' must be a whole number, not {value!r}")
+    if number < minimum:
+        raise InvalidRow(f"'{column}' must be at least {minimum}")
+    return number
+
+
+def parse_slugs(row):
+    value = row.get("categories") or []
+    if isinstance(value, str):
+        value = value.split("|")
+    return [slug.strip() for slug in value if slug.strip()]
+
+
+def parse_row(row):
+    """The Movie fields and category slugs of a row. Raises InvalidRow."""
+    title = (row.get("title") or "").strip()
+    if not title:
+        raise InvalidRow("'title' is required")
+    max_length = Movie._meta.get_field("title").max_length
+    if len(title) > max_length:
+        raise InvalidRow(f"'title' is longer than {max_length} characters")
+
+    fields = {
+        "title": title,
+        "description": (row.get("description") or "").strip(),
+        "year": parse_int(row, "year", 1800),
+        "duration_minutes": parse_int(row, "duration_minutes", 1),
+    }
+    for flag in FLAGS:
+        fields[flag] = parse_bool(row, flag)
+    return fields, parse_slugs(row)
+
+
+# --- Images -----------------------------------------------------------------
+
+class DirectoryImages:
+    """Images under a local directory; names can't leave it."""
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+
+    def open(self, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            raise InvalidRow(f"image '{name}' not found")
+        if os.path.getsize(path) > settings.MAX_IMAGE_UPLOAD_SIZE:
+            raise InvalidRow(f"image '{name}' is larger than the upload limit")
+        return open(path, "rb")
+
+
+class ZipImages:
+    """Images inside a ZIP archive (a path or an uploaded file)."""
+
+    def __init__(self, file):
+        try:
+            self.archive = zipfile.ZipFile(file)
+        except zipfile.BadZipFile:
+            raise ValueError("the images archive is not a valid ZIP file")
+
+    def open(self, name):
+        try:
+            info = self.archive.getinfo(name)
+        except KeyError:
+            raise InvalidRow(f"image '{name}' not found")
+        # Checked before decompressing anything
+        if info.file_size > settings.MAX_IMAGE_UPLOAD_SIZE:
+            raise InvalidRow(f"image '{name}' is larger than the upload limit")
+        return self.archive.open(info)
+
+
+def open_images(path):
+    if path is None:
+        return None
+    if os.path.isdir(path):
+        return DirectoryImages(path)
+    return ZipImages(path)
+
+
+def check_image(stream, name):
+    # Same rules as StreamingImageUploadHandler; only the header is read
+    try:
+        image = Image.open(stream)
+    except Exception:
+        raise InvalidRow(f"'{name}' is not a valid image")
+    if image.format not in ALLOWED_FORMATS:
+        raise InvalidRow(f"'{name}': {image.format} images are not allowed")
+    width, height = image.size
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise InvalidRow(f"'{name}' is too big ({width}x{height})")
+
+
+def store_images(movie, row, images, stored):
+    """
+    Copy the row's poster/backdrop into storage and point the movie at them.
+    Appends to 'stored' the names of the files that weren't in storage yet.
+    """
+    for column, field_name in IMAGE_FIELDS.items():
+        name = (row.get(column) or "").strip()
+        if not name:
+            continue
+        if images is None:
+            raise InvalidRow(f"'{column}' given but no images were provided")
+        field = Movie._meta.get_field(field_name)
+        with images.open(name) as stream:
+            check_image(stream, name)
+            stream.seek(0)
+            content = File(stream)
+            # Hashed once, here: save() reuses it. The name it saves under is
+            # then known up front, so we can tell whether the file is new
+            content.content_hash = content_hash(content)
+            extension = os.path.splitext(name)[1].lower()
+            target = field.generate_filename(movie, content.content_hash + extension)
+            existed = field.storage.exists(target)
+            saved = field.storage.save(target, content)
+        if not existed:
+            stored.append(saved)
+        setattr(movie, field_name, saved)
+
+
+def delete_images(stored):
+    """
+    Remove what store_images() wrote for a rejected row. Files that were
+    already there belong to other movies (or earlier rows): originals are
+    shared between identical images.
+    """
+    for name in stored:
+        originals_storage().delete(name)
+
+
+# --- Import -----------------------------------------------------------------
+
+def insert_chunk(prepared, created, errors):
+    Link = Movie.categories.through
+    try:
+        with transaction.atomic():
+            Movie.objects.bulk_create([row.movie for row in prepared])
+            Link.objects.bulk_create([
+                Link(movie_id=row.movie.pk, category_id=category_id)
+                for row in prepared for category_id in row.category_ids
+            ])
+    except DatabaseError:
+        if len(prepared) == 1:
+            row = prepared[0]
+            delete_images(row.stored)
+            errors.append(RowError(row.line, "could not be saved"))
+            return
+        # Find the bad rows one by one; the good ones still go in
+        for row in prepared:
+            row.movie.pk = None
+            insert_chunk([row], created, errors)
+        return
+    created.extend(row.movie.pk for row in prepared)
+
+
+def import_movies(rows, images=None, chunk_size=CHUNK_SIZE, renditions=True):
+    """
+    Import (line, row) pairs as from read_manifest(). 'images' is a
+    DirectoryImages/ZipImages, or None if the manifest has no images.
+
+    Each chunk commits on its own, so a failed import keeps the chunks
+    before it. With 'renditions', the new movies are queued on the
+    rendition process pool as their chunk commits.
+    """
+    created = []
+    errors = []
+
+    parsed = []
+    for line, row in rows:
+        try:
+            if isinstance(row, InvalidRow):
+                raise row
+            parsed.append((line, row) + parse_row(row))
+        except InvalidRow as error:
+            errors.append(RowError(line, str(error)))
+
+    # Every category of the manifest in one query
+    slugs = {slug for *_, row_slugs in parsed for slug in row_slugs}
+    category_ids = dict(Category.objects.filter(slug__in=slugs).values_list("slug", "id"))
+
+    for start in range(0, len(parsed), chunk_size):
+        prepared = []
+        for line, row, fields, row_slugs in parsed[start:start + chunk_size]:
+            movie = Movie(**fields)
+            stored = []
+            try:
+                unknown = [slug for slug in row_slugs if slug not in category_ids]
+                if unknown:
+                    raise InvalidRow(f"unknown categories: {', '.join(unknown)}")
+                store_images(movie, row, images, stored)
+            except InvalidRow as error:
+                delete_images(stored)
+                errors.append(RowError(line, str(error)))
+                continue
+            prepared.append(PreparedRow(line, movie, [category_ids[slug] for slug in row_slugs], stored))
+
+        if prepared:
+            chunk_created = []
+            insert_chunk(prepared, chunk_created, errors)
+            if renditions and chunk_created:
+                schedule_bulk_renditions(chunk_created)
+            created.extend(chunk_created)
+
+    # bulk_create sends no post_save/m2m_changed, so no signal did this.
+    # After the commit, like signals.py does
+    if created:
+        transaction.on_commit(bump_catalog_version)
+    errors.sort(key=lambda error: error.line)
+    return ImportResult(created, errors)
@@ -0,0 +1,19 @@
+"""
+Batch functions for the request-scoped DataLoaders (see Tau/context.py).
+
+Each one receives every key requested while a level of the query resolves
+and must return the results in the same order as the keys.
+"""
+
+from collections import defaultdict
+
+from .models import Movie
+
+
+async def load_categories(movie_ids):
+    """Categories of many movies, in one query on the M2M table."""
+    links = Movie.categories.through.objects.filter(movie_id__in=movie_ids)
+    by_movie = defaultdict(list)
+    async for link in links.select_related("category").order_by("category_id"):
+        by_movie[link.movie_id].append(link.category)
+    return [by_movie[movie_id] for movie_id in movie_ids]
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from streaming.cache import bump_catalog_version
+from streaming.models import Movie, RenditionStatus
+from streaming.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = "Generate poster/backdrop renditions for existing movies, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Number of movies processed at the same time (default: 4)",
+        )
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Process every movie, not only the ones that aren't READY",
+        )
+        parser.add_argument(
+            "--force", action="store_true",
+            help="Regenerate files even if they already exist in storage",
+        )
+
+    def handle(self, *args, **options):
+        movies = Movie.objects.all()
+        if not options["all"]:
+            movies = movies.exclude(renditions_status=RenditionStatus.READY)
+        movie_ids = list(movies.values_list("id", flat=True))
+
+        self.stdout.write(f"Generating renditions for {len(movie_ids)} movies...")
+
+        failed = 0
+        updated = False
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {
+                executor.submit(generate_renditions, movie_id, options["force"]): movie_id
+                for movie_id in movie_ids
+            }
+            for future in as_completed(futures):
+                status = future.result()
+                updated = updated or status is not None
+                if status == RenditionStatus.FAILED:
+                    failed += 1
+                    self.stderr.write(f"Movie {futures[future]}: failed")
+
+        if updated:
+            # Once, at the end. This runs outside the web server: it only
+            # reaches the server's cache if that is a shared one (see checks.py)
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {len(movie_ids) - failed} ready, {failed} failed"
+        ))
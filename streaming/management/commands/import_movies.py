@@ -0,0 +1,81 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from streaming.cache import bump_catalog_version
+from streaming.imports import CHUNK_SIZE, import_movies, open_images, read_manifest
+from streaming.models import RenditionStatus
+from streaming.renditions import generate_renditions
+from streaming.workers import setup_worker
+
+
+class Command(BaseCommand):
+    help = "Import movies from a CSV/JSONL manifest, then generate their renditions in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest", help="A .csv or .jsonl file, one movie per row")
+        parser.add_argument(
+            "--images",
+            help="Directory or .zip archive holding the posters/backdrops the manifest names",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=CHUNK_SIZE,
+            help=f"Movies inserted per bulk_create (default: {CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=4,
+            help="Processes generating renditions at the same time (default: 4)",
+        )
+        parser.add_argument(
+            "--skip-renditions", action="store_true",
+            help="Only import; run generate_renditions later",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            images = open_images(options["images"])
+            with open(options["manifest"], "rb") as manifest:
+                result = import_movies(
+                    read_manifest(manifest, options["manifest"]),
+                    images,
+                    chunk_size=options["chunk_size"],
+                    renditions=False,
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        for error in result.errors:
+            self.stderr.write(f"Line {error.line}: {error.message}")
+        self.stdout.write(f"Imported {len(result.created)} movies, {len(result.errors)} rows skipped")
+
+        if options["skip_renditions"] or not result.created:
+            return
+
+        self.stdout.write(f"Generating renditions with {options['workers']} processes...")
+        failed = 0
+        updated = False
+        with ProcessPoolExecutor(
+            max_workers=options["workers"],
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=setup_worker,
+        ) as executor:
+            futures = {
+                executor.submit(generate_renditions, movie_id): movie_id
+                for movie_id in result.created
+            }
+            for future in as_completed(futures):
+                status = future.result()
+                updated = updated or status is not None
+                if status == RenditionStatus.FAILED:
+                    failed += 1
+                    self.stderr.write(f"Movie {futures[future]}: failed")
+
+        if updated:
+            # Once, at the end. This runs outside the web server: it only
+            # reaches the server's cache if that is a shared one (see checks.py)
+            bump_catalog_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {len(result.created) - failed} ready, {failed} failed"
+        ))
@@ -0,0 +1,46 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from streaming.cleanup import find_orphans, remove_empty_dirs
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the files under media/movies and media/CACHE that no movie uses "
+        "(originals and renditions of deleted movies, replaced posters, old imagekit files)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only list the files that would be deleted",
+        )
+        parser.add_argument(
+            "--min-age", type=int, default=60,
+            help="Skip files modified in the last N minutes (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        deleted = freed = 0
+        for name, entry in find_orphans(min_age=options["min_age"] * 60):
+            size = entry.stat(follow_symlinks=False).st_size
+            if dry_run:
+                self.stdout.write(name)
+            else:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+            deleted += 1
+            freed += size
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {deleted} files ({freed / 1024 / 1024:.1f} MB)"
+        ))
+        if not dry_run:
+            folders = remove_empty_dirs(os.path.join(settings.MEDIA_ROOT, "CACHE"))
+            self.stdout.write(f"Removed {folders} empty folders")
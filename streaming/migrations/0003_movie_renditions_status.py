@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("streaming", "0002_category_remove_movie_category_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="renditions_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                help_text="State of the generated poster/backdrop renditions",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("streaming", "0003_movie_renditions_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="movie",
+            name="renditions",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
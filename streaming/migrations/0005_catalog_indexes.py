@@ -0,0 +1,55 @@
+# Generated by Django 5.0.6 on 2026-10-17 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("streaming", "0004_movie_renditions"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["id"],
+                name="movie_active_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                condition=models.Q(("is_active", True)),
+                fields=["year", "id"],
+                name="movie_active_year_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_new", True)),
+                fields=["year", "id"],
+                name="movie_rail_new_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                condition=models.Q(
+                    ("is_active", True), ("is_student_production", True)
+                ),
+                fields=["year", "id"],
+                name="movie_rail_student_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="movie",
+            index=models.Index(
+                condition=models.Q(("is_active", True), ("is_from_festival", True)),
+                fields=["year", "id"],
+                name="movie_rail_festival_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 13:17
+
+import streaming.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("streaming", "0006_movie_search"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="movie",
+            name="backdrop_original",
+            field=models.ImageField(
+                storage=streaming.storage.originals_storage,
+                upload_to="movies/backdrops/",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="movie",
+            name="poster_original",
+            field=models.ImageField(
+                storage=streaming.storage.originals_storage,
+                upload_to="movies/posters/",
+            ),
+        ),
+    ]
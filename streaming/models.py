@@ -1,6 +1,14 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
-from imagekit.models import ImageSpecField
-from imagekit.processors import ResizeToFit
+from django.db.models import Q
+
+from .storage import originals_storage
+
+# Text search configuration of Movie.search_vector. Titles and descriptions
+# mix Spanish and English, so we don't stem ('simple' only lowercases);
+# typos and near misses are caught by the trigram fallback in search.py.
+SEARCH_CONFIG = "simple"
 
 class Category(models.Model):
     """
@@ -16,37 +24,24 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class RenditionStatus(models.TextChoices):
+    """Where the optimized images (poster_mobile, etc.) of a Movie are at."""
+    PENDING = "pending", "Pending"
+    READY = "ready", "Ready"
+    FAILED = "failed", "Failed"
+
 class Movie(models.Model):
     title = models.CharField(max_length=200)
 
     # 1. The "Source" Files (Uploaded by Admin)
     # These go to S3, e.g., s3://bucket/movies/posters/matrix_master.jpg
-    poster_original = models.ImageField(upload_to='movies/posters/')
-    backdrop_original = models.ImageField(upload_to='movies/backdrops/')
-
-    # 2. The "Virtual" Optimized Files (Generated on the fly)
-    # This creates a 300x450 thumbnail for the UI
-    poster_mobile = ImageSpecField(
-        source='poster_original',
-        processors=[ResizeToFit(160, 240)], # Cut to fit exact dimensions
-        format='WEBP',                       # Modern, small format
-        options={'quality': 80}              # Compress to 80%
-    )
-    poster_desktop = ImageSpecField(
-        source='poster_original',
-        processors=[ResizeToFit(220, 330)], # Cut to fit exact dimensions
-        format='WEBP',                       # Modern, small format
-        options={'quality': 80}              # Compress to 80%
-    )
-
-    # This creates a 1920x1080 version for the header (downscaling 4K)
-    backdrop_large = ImageSpecField(
-        source='backdrop_original',
-        processors=[ResizeToFit(1920, 1080)],
-        format='WEBP',
-        options={'quality': 85}
-    )
+    # Named after a hash of their content, so identical images are stored once
+    poster_original = models.ImageField(upload_to='movies/posters/', storage=originals_storage)
+    backdrop_original = models.ImageField(upload_to='movies/backdrops/', storage=originals_storage)
 
+    # 2. The Optimized Files (posters for mobile/desktop, a 1920x1080 backdrop,
+    # and responsive AVIF/WebP sets) are declared in renditions.py and generated
+    # in the background after upload. See the 'renditions' manifest below.
 
     description = models.TextField()
     year = models.IntegerField()
@@ -86,5 +81,60 @@ class Movie(models.Model):
     )
     is_from_festival = models.BooleanField(default=False, help_text='is this movie from a festival?')
 
+    # Resolvers only hand out optimized URLs once this is READY
+    renditions_status = models.CharField(
+        max_length=10,
+        choices=RenditionStatus.choices,
+        default=RenditionStatus.PENDING,
+        help_text="State of the generated poster/backdrop renditions",
+    )
+    # Manifest of generated files, e.g.
+    # {"poster_mobile": {"name": "CACHE/renditions/.../poster_mobile.webp", "width": 160, ...}}
+    # Filled by the rendition worker so URLs never need a storage lookup
+    renditions = models.JSONField(default=dict, blank=True)
+
+    # Full-text search document: title (weight A) + description (weight B).
+    # A generated column, so PostgreSQL keeps it current on every INSERT and
+    # UPDATE, including bulk_create() and queryset.update().
+    search_vector = models.GeneratedField(
+        expression=(
+            SearchVector("title", weight="A", config=SEARCH_CONFIG)
+            + SearchVector("description", weight="B", config=SEARCH_CONFIG)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        # Every public query filters on is_active=True, so these are partial
+        # indexes: they only hold active movies, in the orders we read them
+        # (by id for cursor pagination, by year for "newest first").
+        # A B-tree is read backwards just as fast, so ASC and DESC both use them.
+        # The M2M table needs nothing extra: Django indexes its category_id
+        # column, and the unique (movie_id, category_id) constraint covers movie_id.
+        indexes = [
+            models.Index(fields=["id"], condition=Q(is_active=True), name="movie_active_id_idx"),
+            models.Index(fields=["year", "id"], condition=Q(is_active=True), name="movie_active_year_idx"),
+            # The rails of the home page ("New", "Made by Students", "Festivals")
+            models.Index(
+                fields=["year", "id"],
+                condition=Q(is_active=True, is_new=True),
+                name="movie_rail_new_idx",
+            ),
+            models.Index(
+                fields=["year", "id"],
+                condition=Q(is_active=True, is_student_production=True),
+                name="movie_rail_student_idx",
+            ),
+            models.Index(
+                fields=["year", "id"],
+                condition=Q(is_active=True, is_from_festival=True),
+                name="movie_rail_festival_idx",
+            ),
+            # searchMovies: full-text matches, then trigram matches on the title
+            GinIndex(fields=["search_vector"], name="movie_search_idx"),
+            GinIndex(OpClass("title", name="gin_trgm_ops"), name="movie_title_trgm_idx"),
+        ]
+
     def __str__(self):
         return self.title
@@ -0,0 +1,133 @@
+"""
+Keyset (cursor) pagination helpers for the catalog.
+
+Instead of OFFSET, we remember the id of the last row the client saw and
+ask the database for "the next N rows after that id". This keeps every
+page equally cheap, no matter how deep into the catalog the client is.
+
+Sorted results (the catalog field) continue from the sort key of the
+last row plus its id; see paginate_sorted(). Ranked results (search) have
+no stable key to continue from, so their cursors hold a plain offset
+instead; see paginate_ranked().
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+
+# Clients can't ask for more than this in one page
+MAX_PAGE_SIZE = 100
+DEFAULT_PAGE_SIZE = 20
+
+CURSOR_PREFIX = "movie:"
+OFFSET_PREFIX = "offset:"
+KEYSET_PREFIX = "keyset:"
+
+
+def encode_cursor(pk, prefix=CURSOR_PREFIX):
+    """Turn a primary key into an opaque cursor string (e.g. 'bW92aWU6NDI=')."""
+    return base64.b64encode(f"{prefix}{pk}".encode()).decode()
+
+
+def decode_cursor(cursor, prefix=CURSOR_PREFIX):
+    """Turn a cursor back into a primary key. Raises on garbage input."""
+    try:
+        value = base64.b64decode(cursor.encode()).decode()
+        if not value.startswith(prefix):
+            raise ValueError(value)
+        return int(value[len(prefix):])
+    except (ValueError, UnicodeDecodeError):
+        raise Exception("Invalid cursor")
+
+
+def encode_keyset_cursor(values):
+    """Like encode_cursor(), for the sort key values of a row, e.g. [2019, 42]."""
+    return base64.b64encode(f"{KEYSET_PREFIX}{json.dumps(values)}".encode()).decode()
+
+
+def decode_keyset_cursor(cursor, size):
+    try:
+        value = base64.b64decode(cursor.encode()).decode()
+        if not value.startswith(KEYSET_PREFIX):
+            raise ValueError(value)
+        values = json.loads(value[len(KEYSET_PREFIX):])
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError(value)
+        return values
+    except (ValueError, UnicodeDecodeError):
+        raise Exception("Invalid cursor")
+
+
+def after_filter(ordering, values):
+    """
+    The rows that come after 'values' in 'ordering', e.g. for ("-year", "id"):
+    year < 2019 OR (year = 2019 AND id > 42).
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def page_size(first):
+    if first is None:
+        return DEFAULT_PAGE_SIZE
+    if first < 0:
+        raise Exception("'first' must be a positive number")
+    return min(first, MAX_PAGE_SIZE)
+
+
+async def paginate(queryset, first=None, after=None):
+    """
+    Return one page of 'queryset' ordered by id.
+
+    Returns a tuple (rows, has_next_page). We fetch one extra row to know
+    if there is another page without running a COUNT(*).
+    """
+    first = page_size(first)
+
+    queryset = queryset.order_by("id")
+    if after:
+        queryset = queryset.filter(id__gt=decode_cursor(after))
+
+    rows = [row async for row in queryset[:first + 1]]
+    has_next_page = len(rows) > first
+    return rows[:first], has_next_page
+
+
+async def paginate_ranked(queryset, first=None, after=None):
+    """
+    Return one page of a queryset that keeps its own ordering (e.g. by
+    search rank), as a tuple (rows, cursors, has_next_page).
+    """
+    first = page_size(first)
+    offset = decode_cursor(after, OFFSET_PREFIX) if after else 0
+    if offset < 0:
+        raise Exception("Invalid cursor")
+
+    rows = [row async for row in queryset[offset:offset + first + 1]]
+    cursors = [encode_cursor(offset + i + 1, OFFSET_PREFIX) for i in range(len(rows))]
+    return rows[:first], cursors[:first], len(rows) > first
+
+
+async def paginate_sorted(queryset, ordering, first=None, after=None):
+    """
+    Return one page of 'queryset' sorted by 'ordering', a tuple of fields
+    that must end with the primary key so every row has a unique position,
+    e.g. ("-year", "-id"). Returns a tuple (rows, cursors, has_next_page).
+    """
+    first = page_size(first)
+    names = [field.lstrip("-") for field in ordering]
+
+    queryset = queryset.order_by(*ordering)
+    if after:
+        queryset = queryset.filter(after_filter(ordering, decode_keyset_cursor(after, len(ordering))))
+
+    rows = [row async for row in queryset[:first + 1]]
+    cursors = [encode_keyset_cursor([getattr(row, name) for name in names]) for row in rows]
+    return rows[:first], cursors[:first], len(rows) > first
@@ -0,0 +1,49 @@
+"""
+Home page rails: every category with its newest active movies.
+
+One query for the whole home page. The M2M rows are numbered within each
+category with ROW_NUMBER() OVER (PARTITION BY category ORDER BY newest),
+and only the first N of each category are kept.
+"""
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Movie
+
+
+async def home_rails(limit):
+    """
+    Returns a list of (category, movies) pairs, ordered by category name,
+    with at most 'limit' movies each. Categories without active movies
+    have no rail.
+    """
+    Link = Movie.categories.through
+    # Number only the link ids: the movie columns are read for the kept rows
+    # alone, not for every active movie of every category
+    top_links = (
+        Link.objects
+        .filter(movie__is_active=True)
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F("category_id"),
+            order_by=[F("movie__year").desc(), F("movie_id").desc()],
+        ))
+        # Django wraps the window in a subquery to filter on it
+        .filter(position__lte=limit)
+        .values("pk")
+    )
+    links = (
+        Link.objects
+        .filter(pk__in=top_links)
+        .select_related("movie", "category")
+        .defer("movie__search_vector")
+        .order_by("category__name", "category_id", "-movie__year", "-movie_id")
+    )
+
+    rails = []
+    async for link in links:
+        if not rails or rails[-1][0].pk != link.category_id:
+            rails.append((link.category, []))
+        rails[-1][1].append(link.movie)
+    return rails
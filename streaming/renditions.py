@@ -0,0 +1,346 @@
+"""
+Background generation of the optimized poster/backdrop images.
+
+Resizing a 4K backdrop is expensive, so it never happens inside a request.
+Right after a movie is saved we hand the work to a small thread pool. The
+worker records every generated file in Movie.renditions (the "manifest"),
+and resolvers build URLs from that manifest without asking the storage
+anything.
+
+What gets generated is declared once, in RENDITIONS below:
+    - the fixed-size images the apps already use (poster_mobile, ...)
+    - a responsive set (several widths, AVIF + WebP) for <img srcset>
+Each original is decoded ONCE per movie and every rendition is cut from
+that decoded image.
+
+Bulk imports queue hundreds of movies at once; those go to a pool of
+worker processes instead (see get_process_pool), since encoding is CPU
+bound and threads would all wait on the same GIL.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import ExifTags, Image, ImageOps
+
+from .cache import bump_catalog_version
+from .models import Movie, RenditionStatus
+from .workers import setup_worker
+
+try:
+    # Pillow < 11.2 can't write AVIF on its own
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Generated files live next to the old imagekit ones, under media/CACHE/
+RENDITIONS_DIR = "CACHE/renditions"
+
+
+class Rendition(NamedTuple):
+    """One generated file, e.g. 'the 320px wide AVIF of the poster'."""
+    name: str            # Key in the manifest
+    source: str          # Movie field it is cut from
+    width: int
+    height: int | None   # None: keep the aspect ratio
+    format: str          # Pillow format name
+    quality: int
+    upscale: bool = False
+    srcset: str | None = None   # Which srcset it belongs to ('poster'/'backdrop')
+
+
+# Format -> (file extension, extra Pillow save options)
+FORMATS = {
+    "AVIF": ("avif", {"speed": 6}),
+    "WEBP": ("webp", {"method": 4}),
+}
+
+# Quality per format. AVIF looks as good as WebP at a much lower number.
+SRCSET_QUALITY = {"AVIF": 50, "WEBP": 80}
+POSTER_WIDTHS = [160, 240, 320, 480]
+BACKDROP_WIDTHS = [640, 960, 1280, 1920]
+
+
+def build_registry():
+    renditions = [
+        # The fixed sizes the apps use today (posterMobileUrl, ...)
+        Rendition("poster_mobile", "poster_original", 160, 240, "WEBP", 80, upscale=True),
+        Rendition("poster_desktop", "poster_original", 220, 330, "WEBP", 80, upscale=True),
+        Rendition("backdrop_large", "backdrop_original", 1920, 1080, "WEBP", 85, upscale=True),
+    ]
+    for srcset, source, widths in (
+        ("poster", "poster_original", POSTER_WIDTHS),
+        ("backdrop", "backdrop_original", BACKDROP_WIDTHS),
+    ):
+        for image_format, quality in SRCSET_QUALITY.items():
+            for width in widths:
+                renditions.append(Rendition(
+                    name=f"{srcset}_{width}w_{image_format.lower()}",
+                    source=source,
+                    width=width,
+                    height=None,
+                    format=image_format,
+                    quality=quality,
+                    srcset=srcset,
+                ))
+    return renditions
+
+
+RENDITIONS = build_registry()
+
+
+def can_encode(image_format):
+    Image.init()
+    return image_format in Image.SAVE
+
+
+def fit_size(size, rendition):
+    """Final (width, height) of a rendition for a source of 'size'."""
+    width, height = size
+    scale = rendition.width / width
+    if rendition.height:
+        scale = min(scale, rendition.height / height)
+    if not rendition.upscale:
+        scale = min(scale, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def storage_name(movie, rendition):
+    # New upload -> new source name -> new folder, so old URLs never change content
+    source_name = getattr(movie, rendition.source).name
+    digest = hashlib.sha1(source_name.encode()).hexdigest()[:10]
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    extension = FORMATS[rendition.format][0]
+    return f"{RENDITIONS_DIR}/{stem}_{digest}/{rendition.name}.{extension}"
+
+
+def open_source(field_file, renditions):
+    """
+    Decode an original once, at the smallest size that still serves
+    every rendition (JPEG 'draft' mode decodes at 1/2, 1/4 or 1/8 scale).
+    """
+    with field_file.open("rb"):
+        image = Image.open(field_file)
+        if image.format == "MPO":
+            # A JPEG with extra frames: renditions are cut from the primary
+            # image, the first frame, which decodes (and drafts) like any JPEG
+            image.seek(0)
+        # Phone photos are stored sideways with an EXIF orientation: the size
+        # that counts is the upright one, after exif_transpose()
+        quarter_turn = image.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8)
+        full_size = image.size[::-1] if quarter_turn else image.size
+        needed = [fit_size(full_size, r) for r in renditions]
+        draft_size = (max(w for w, _ in needed), max(h for _, h in needed))
+        # draft() has to come before any decoding, so it sees the stored orientation
+        image.draft("RGB", draft_size[::-1] if quarter_turn else draft_size)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+        image.load()
+    return image, full_size
+
+
+def encode(image, full_size, rendition):
+    size = fit_size(full_size, rendition)
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    _, options = FORMATS[rendition.format]
+    buffer = io.BytesIO()
+    image.save(buffer, format=rendition.format, quality=rendition.quality, **options)
+    return buffer.getvalue(), size
+
+
+def rendition_url(movie, name):
+    """
+    URL of a generated rendition, straight from the manifest.
+
+    This is pure string formatting: no existence check, no storage call.
+    Returns '' if the rendition hasn't been generated yet.
+    """
+    entry = movie.renditions.get(name)
+    if not entry:
+        return ""
+    # Manifests written before the registry stored the bare file name
+    if isinstance(entry, str):
+        return default_storage.url(entry)
+    return default_storage.url(entry["name"])
+
+
+def srcset(movie, kind):
+    """
+    (name, entry) pairs of a srcset ('poster'/'backdrop'), smallest file first.
+    """
+    entries = [
+        (name, entry) for name, entry in movie.renditions.items()
+        if isinstance(entry, dict) and entry.get("srcset") == kind
+    ]
+    return sorted(entries, key=lambda item: item[1]["bytes"])
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process-wide worker pool (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RENDITION_WORKERS,
+                thread_name_prefix="renditions",
+            )
+        return _executor
+
+
+def wait_for_renditions():
+    """
+    Block until the renditions scheduled so far are done (benchmarks use
+    it). The next schedule_renditions() starts a new pool.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+_process_pool = None
+
+
+def get_process_pool():
+    """The process-wide pool of worker processes for bulk jobs (created on first use)."""
+    global _process_pool
+    with _executor_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=settings.RENDITION_PROCESSES,
+                # A fork would copy the server's threads and open DB connections
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=setup_worker,
+            )
+        return _process_pool
+
+
+def generate_source(movie, source, renditions, force, manifest):
+    """Generate all renditions cut from one original. Returns False on failure."""
+    todo = [r for r in renditions if can_encode(r.format)]
+    try:
+        image = full_size = None
+        for rendition in todo:
+            name = storage_name(movie, rendition)
+            if force or not default_storage.exists(name):
+                if image is None:
+                    image, full_size = open_source(getattr(movie, source), todo)
+                content, size = encode(image, full_size, rendition)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                default_storage.save(name, ContentFile(content))
+                file_bytes = len(content)
+            else:
+                with default_storage.open(name, "rb") as existing:
+                    size = Image.open(existing).size
+                file_bytes = default_storage.size(name)
+
+            manifest[rendition.name] = {
+                "name": name,
+                "width": size[0],
+                "height": size[1],
+                "format": rendition.format,
+                "bytes": file_bytes,
+                "srcset": rendition.srcset,
+            }
+        return True
+    except Exception:
+        logger.exception("Could not generate %s renditions for movie %s", source, movie.pk)
+        return False
+
+
+def generate_renditions(movie_id, force=False):
+    """
+    Generate every rendition of one movie and record the result.
+
+    Safe to call from any thread or worker process. Returns the new
+    RenditionStatus, or None if the movie no longer exists or no longer
+    has the same originals. The caller bumps the catalog version (see
+    bump_when_updated): a worker process can't reach the web process's
+    cache when it is a local memory one.
+    """
+    try:
+        try:
+            movie = Movie.objects.get(pk=movie_id)
+        except Movie.DoesNotExist:
+            return None
+
+        status = RenditionStatus.READY
+        manifest = {}
+        for source in ("poster_original", "backdrop_original"):
+            if not getattr(movie, source):
+                continue
+            renditions = [r for r in RENDITIONS if r.source == source]
+            if not generate_source(movie, source, renditions, force, manifest):
+                status = RenditionStatus.FAILED
+
+        # update() instead of save(): we don't want to touch the other columns
+        # in case an admin edited the movie while we were resizing. And only
+        # if it still has the originals we started from: if updateMovie
+        # replaced one meanwhile, this manifest is for the old image and the
+        # job for the new one may already have finished
+        updated = Movie.objects.filter(
+            pk=movie_id,
+            poster_original=movie.poster_original.name,
+            backdrop_original=movie.backdrop_original.name,
+        ).update(
+            renditions_status=status,
+            renditions=manifest,
+        )
+        if not updated:
+            return None
+        return status
+    finally:
+        # Worker threads get their own DB connection; don't leak it
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+def bump_when_updated(future):
+    """
+    Done-callback for a generate_renditions() job: cached catalog responses
+    still have the "pending" (empty) URLs. Runs in the process that
+    submitted the job, so it bumps the version that process reads.
+    """
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        bump_catalog_version()
+
+
+def schedule_renditions(movie_id):
+    """Queue the renditions of a movie once the current transaction commits."""
+
+    def submit():
+        get_executor().submit(generate_renditions, movie_id).add_done_callback(bump_when_updated)
+
+    transaction.on_commit(submit)
+
+
+def schedule_bulk_renditions(movie_ids):
+    """Like schedule_renditions(), for many movies, on the process pool."""
+    movie_ids = list(movie_ids)
+
+    def submit():
+        pool = get_process_pool()
+        for movie_id in movie_ids:
+            pool.submit(generate_renditions, movie_id).add_done_callback(bump_when_updated)
+
+    transaction.on_commit(submit)
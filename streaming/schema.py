@@ -1,5 +1,20 @@
+from enum import Enum
 import strawberry
-from .models import Movie, Category
+import strawberry.django
+from asgiref.sync import sync_to_async
+from strawberry.types import Info
+from Tau.context import get_loader
+from .catalog import FLAGS, ORDERINGS, catalog_facets, filter_catalog
+from .cleanup import archive_movies, delete_movies
+from .imports import ZipImages, import_movies, read_manifest
+from .loaders import load_categories
+from .models import Movie, Category, RenditionStatus
+from .pagination import encode_cursor, page_size, paginate, paginate_ranked, paginate_sorted
+from .rails import home_rails
+from .renditions import rendition_url, schedule_renditions, srcset
+from .search import search_movies
+from .storage import is_stored
+from .uploads import require_image
 from strawberry.file_uploads import Upload
 
 # 1. Define the "Type" (The Shape of Data)
@@ -10,6 +25,28 @@ class CategoryType:
     name: str
     slug: str
 
+# One file of a responsive image set: the client picks the smallest one
+# that is wide enough, in a format it supports (e.g. <img srcset> / <picture>)
+@strawberry.type
+class ImageSource:
+    url: str
+    width: int
+    height: int
+    format: str
+    bytes: int
+
+def image_sources(movie, kind):
+    return [
+        ImageSource(
+            url=rendition_url(movie, name),
+            width=entry["width"],
+            height=entry["height"],
+            format=entry["format"].lower(),
+            bytes=entry["bytes"],
+        )
+        for name, entry in srcset(movie, kind)
+    ]
+
 @strawberry.django.type(Movie)
 class MovieType:
     id: strawberry.ID
@@ -21,19 +58,34 @@ class MovieType:
     is_new:bool
     is_student_production:bool
     is_from_festival: bool
-    categories: list[CategoryType]
+    renditions_status: str
 
+    # Batched across all the movies of the response by a DataLoader
+    @strawberry.field
+    async def categories(self, info: Info) -> list[CategoryType]:
+        return await get_loader(info, load_categories).load(self.pk)
+
+    # The optimized URLs come from the manifest written by the background
+    # worker: empty until the files exist, and never a storage call.
     @strawberry.field
     def poster_mobile_url(self) -> str:
-        if self.poster_mobile:
-            return self.poster_mobile.url
-        return ""
+        return rendition_url(self, "poster_mobile")
 
     @strawberry.field
     def poster_desktop_url(self) -> str:
-        if self.poster_desktop:
-            return self.poster_desktop.url
-        return ""
+        return rendition_url(self, "poster_desktop")
+
+    @strawberry.field
+    def backdrop_large_url(self) -> str:
+        return rendition_url(self, "backdrop_large")
+
+    @strawberry.field
+    def poster_srcset(self) -> list[ImageSource]:
+        return image_sources(self, "poster")
+
+    @strawberry.field
+    def backdrop_srcset(self) -> list[ImageSource]:
+        return image_sources(self, "backdrop")
 
     @strawberry.field
     def poster_original_url(self) -> str:
@@ -48,21 +100,193 @@ class MovieType:
         return ""
     # Note: We can exclude 'is_active' if we don't want the frontend to see it
 
+# Relay-style connection types, so the frontend can load rows page by page.
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: str | None
+
+@strawberry.type
+class MovieEdge:
+    cursor: str
+    node: MovieType
+
+@strawberry.type
+class MovieConnection:
+    edges: list[MovieEdge]
+    page_info: PageInfo
+    # The unpaginated queryset, kept so we only COUNT(*) when asked for totalCount
+    queryset: strawberry.Private[object]
+
+    @strawberry.field
+    async def total_count(self) -> int:
+        return await self.queryset.acount()
+
+# One row of the home page: a category and its newest movies
+@strawberry.type
+class Rail:
+    category: CategoryType
+    movies: list[MovieType]
+
+@strawberry.type
+class CategoryFacet:
+    category: CategoryType
+    count: int
+
+@strawberry.type
+class CatalogFacets:
+    total: int
+    is_new: int
+    is_student_production: int
+    is_from_festival: int
+    categories: list[CategoryFacet]
+
+@strawberry.type
+class CatalogConnection(MovieConnection):
+    # Counted over the filtered catalog (all pages), in one aggregate query
+    @strawberry.field
+    async def facets(self) -> CatalogFacets:
+        counts = await catalog_facets(self.queryset)
+        return CatalogFacets(
+            total=counts["total"],
+            **counts["flags"],
+            categories=[
+                CategoryFacet(category=category, count=count)
+                for category, count in counts["categories"]
+            ],
+        )
+
+@strawberry.enum
+class CatalogOrder(Enum):
+    ID = "id"
+    NEWEST = "newest"
+    OLDEST = "oldest"
+    TITLE = "title"
+    SHORTEST = "shortest"
+    LONGEST = "longest"
+
+@strawberry.enum
+class CategoryMatch(Enum):
+    ANY = "any"
+    ALL = "all"
+
+# Every field is optional; the ones left out don't filter anything
+@strawberry.input
+class CatalogFilter:
+    is_new: bool | None = None
+    is_student_production: bool | None = None
+    is_from_festival: bool | None = None
+    year_min: int | None = None
+    year_max: int | None = None
+    duration_min: int | None = None
+    duration_max: int | None = None
+    # Category slugs; a movie matches if it is in any (or all) of them
+    categories: list[str] | None = None
+    category_match: CategoryMatch = CategoryMatch.ANY
+
+def catalog_movies(filter):
+    queryset = active_movies()
+    if filter is None:
+        return queryset
+    return filter_catalog(
+        queryset,
+        flags={flag: getattr(filter, flag) for flag in FLAGS},
+        year_min=filter.year_min,
+        year_max=filter.year_max,
+        duration_min=filter.duration_min,
+        duration_max=filter.duration_max,
+        category_slugs=filter.categories,
+        match_all_categories=filter.category_match == CategoryMatch.ALL,
+    )
+
+def active_movies(category_slug=None):
+    # Shared base queryset for the list fields and the connection fields.
+    # search_vector is only read by the database (search.py), never by resolvers
+    queryset = Movie.objects.filter(is_active=True).defer("search_vector")
+    if category_slug is not None:
+        queryset = queryset.filter(categories__slug=category_slug)
+    return queryset
+
+async def movie_connection(queryset, first, after):
+    rows, has_next_page = await paginate(queryset, first, after)
+    cursors = [encode_cursor(movie.pk) for movie in rows]
+    return build_connection(queryset, rows, cursors, has_next_page)
+
+async def ranked_movie_connection(queryset, first, after):
+    # Search results: ordered by rank, so cursors are offsets
+    rows, cursors, has_next_page = await paginate_ranked(queryset, first, after)
+    return build_connection(queryset, rows, cursors, has_next_page)
+
+def build_connection(queryset, rows, cursors, has_next_page, connection_type=MovieConnection):
+    edges = [MovieEdge(cursor=cursor, node=movie) for movie, cursor in zip(rows, cursors)]
+    return connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            has_next_page=has_next_page,
+            end_cursor=edges[-1].cursor if edges else None,
+        ),
+        queryset=queryset,
+    )
+
 # 2. Define the "Query" (The Logic)
 # This is your "View". It tells Django how to fetch the data.
+# Resolvers are async and use Django's async ORM. They return lists, not
+# querysets: iterating a queryset synchronously isn't allowed in async code.
 @strawberry.type
 class Query:
     @strawberry.field
-    def movies(self) -> list[MovieType]:
-        return Movie.objects.filter(is_active=True)
+    async def movies(self) -> list[MovieType]:
+        return [movie async for movie in active_movies()]
+
+    @strawberry.field
+    async def categories(self) -> list[CategoryType]:
+        return [category async for category in Category.objects.all()]
+
+    @strawberry.field
+    async def movies_by_category(self, category_slug: str) -> list[MovieType]:
+        return [movie async for movie in active_movies(category_slug)]
+
+    @strawberry.field
+    async def movies_connection(self, first: int | None = None, after: str | None = None) -> MovieConnection:
+        return await movie_connection(active_movies(), first, after)
+
+    @strawberry.field
+    async def movies_by_category_connection(
+        self,
+        category_slug: str,
+        first: int | None = None,
+        after: str | None = None
+    ) -> MovieConnection:
+        return await movie_connection(active_movies(category_slug), first, after)
 
     @strawberry.field
-    def categories(self) -> list[CategoryType]:
-        return Category.objects.all()
+    async def search_movies(
+        self,
+        query: str,
+        first: int | None = None,
+        after: str | None = None
+    ) -> MovieConnection:
+        """Active movies matching 'query' (title or description), best match first."""
+        return await ranked_movie_connection(await search_movies(active_movies(), query), first, after)
 
     @strawberry.field
-    def movies_by_category(self, category_slug: str) -> list[MovieType]:
-        return Movie.objects.filter(is_active=True, categories__slug=category_slug)
+    async def home_rails(self, limit_per_rail: int | None = None) -> list[Rail]:
+        """Every category with its newest active movies, in a single SQL query."""
+        rails = await home_rails(page_size(limit_per_rail))
+        return [Rail(category=category, movies=movies) for category, movies in rails]
+
+    @strawberry.field
+    async def catalog(
+        self,
+        filter: CatalogFilter | None = None,
+        order_by: CatalogOrder = CatalogOrder.ID,
+        first: int | None = None,
+        after: str | None = None
+    ) -> CatalogConnection:
+        """Active movies filtered and sorted in SQL, with facet counts for the filters."""
+        queryset = catalog_movies(filter)
+        rows, cursors, has_next_page = await paginate_sorted(queryset, ORDERINGS[order_by.value], first, after)
+        return build_connection(queryset, rows, cursors, has_next_page, CatalogConnection)
 
 @strawberry.input
 class CategoryInput: 
@@ -81,63 +305,115 @@ class MovieInput:
     poster_original: Upload | None = None
     backdrop_original: Upload | None = None
 
+# bulkImportMovies reports bad rows instead of failing the whole import
+@strawberry.type
+class ImportRowError:
+    line: int
+    message: str
+
+@strawberry.type
+class BulkImportResult:
+    created_ids: list[strawberry.ID]
+    errors: list[ImportRowError]
+
 @strawberry.type
 class Mutation:
     @strawberry.mutation
-    def create_category(self, category_data: CategoryInput) -> CategoryType:
-        category = Category.objects.create(
+    async def create_category(self, category_data: CategoryInput) -> CategoryType:
+        category = await Category.objects.acreate(
             name=category_data.name,
             slug=category_data.slug
         )
         return category
 
     @strawberry.mutation
-    def create_movie(self, movie_data: MovieInput) -> MovieType:
+    async def create_movie(self, movie_data: MovieInput) -> MovieType:
         # Create the movie instance without the files first
-        movie = Movie.objects.create(
+        movie = await Movie.objects.acreate(
             title=movie_data.title,
             description=movie_data.description,
             year=movie_data.year,
             duration_minutes=movie_data.duration_minutes,
-            poster_original=movie_data.poster_original,
-            backdrop_original=movie_data.backdrop_original,
+            poster_original=require_image(movie_data.poster_original),
+            backdrop_original=require_image(movie_data.backdrop_original),
             is_new = movie_data.is_new,
             is_student_production = movie_data.is_student_production,
             is_from_festival = movie_data.is_from_festival
         )
-        movie.categories.set(movie_data.category_ids)
+        await movie.categories.aset(movie_data.category_ids)
+        await sync_to_async(schedule_renditions)(movie.pk)
         return movie
 
     @strawberry.mutation
-    def update_movie(self, movie_id: strawberry.ID, movie_data: MovieInput) -> MovieType:
-        movie = Movie.objects.get(id=movie_id)
+    async def update_movie(self, movie_id: strawberry.ID, movie_data: MovieInput) -> MovieType:
+        movie = await Movie.objects.aget(id=movie_id)
         movie.title = movie_data.title
         movie.description = movie_data.description
         movie.year = movie_data.year
         movie.duration_minutes = movie_data.duration_minutes
         
-        if movie_data.poster_original:
-            movie.poster_original = movie_data.poster_original
-        if movie_data.backdrop_original:
-            movie.backdrop_original = movie_data.backdrop_original
-            
-        movie.save()
-        movie.categories.set(movie_data.category_ids)
+        # Re-uploading the image a movie already has changes nothing: the
+        # storage names files by content (storage.py), so we can compare names
+        images_changed = False
+        poster = require_image(movie_data.poster_original)
+        if poster and not is_stored(movie.poster_original, poster):
+            movie.poster_original = poster
+            images_changed = True
+        backdrop = require_image(movie_data.backdrop_original)
+        if backdrop and not is_stored(movie.backdrop_original, backdrop):
+            movie.backdrop_original = backdrop
+            images_changed = True
+
+        # New originals mean new renditions; hide the URLs until they exist
+        if images_changed:
+            movie.renditions_status = RenditionStatus.PENDING
+            movie.renditions = {}
+
+        await movie.asave()
+        await movie.categories.aset(movie_data.category_ids)
+        if images_changed:
+            await sync_to_async(schedule_renditions)(movie.pk)
         return movie
 
     @strawberry.mutation
-    def delete_movie(self, movie_id: strawberry.ID) -> bool:
+    async def bulk_import_movies(self, manifest: Upload, images: Upload | None = None) -> BulkImportResult:
+        """
+        Import the movies of a CSV/JSONL manifest; 'images' is a ZIP of the
+        posters and backdrops it names. See streaming/imports.py.
+        """
+        @sync_to_async
+        def run_import():
+            archive = ZipImages(images) if images else None
+            return import_movies(read_manifest(manifest, manifest.name), archive)
+
+        result = await run_import()
+        return BulkImportResult(
+            created_ids=result.created,
+            errors=[ImportRowError(line=error.line, message=error.message) for error in result.errors],
+        )
+
+    @strawberry.mutation
+    async def delete_movie(self, movie_id: strawberry.ID) -> bool:
         try:
-            movie = Movie.objects.get(id=movie_id)
-            movie.delete()
+            movie = await Movie.objects.aget(id=movie_id)
+            await movie.adelete()
             return True
         except Movie.DoesNotExist:
             return False
  
+    # The bulk mutations run set-based SQL in chunks (see cleanup.py); the
+    # files of deleted movies are removed in the background afterwards
+    @strawberry.mutation
+    async def archive_movies(self, movie_ids: list[strawberry.ID]) -> int:
+        return await sync_to_async(archive_movies)(Movie.objects.filter(pk__in=movie_ids))
+
+    @strawberry.mutation
+    async def delete_movies(self, movie_ids: list[strawberry.ID]) -> int:
+        return await sync_to_async(delete_movies)(Movie.objects.filter(pk__in=movie_ids))
+
     @strawberry.mutation
-    def delete_all_movies(self) -> int:
-        count, _ = Movie.objects.all().delete()
-        return count
+    async def delete_all_movies(self) -> int:
+        return await sync_to_async(delete_movies)(Movie.objects.all())
 
 # 3. Create the Schema object
 # schema = strawberry.Schema(query=Query, mutation=Mutation)
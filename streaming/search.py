@@ -0,0 +1,53 @@
+"""
+Movie search (the searchMovies query).
+
+Two passes, both served by a GIN index:
+
+1. Full-text: the query is matched against Movie.search_vector (title with
+   weight A, description with weight B) and results are ordered by
+   ts_rank, so title matches come first.
+
+2. Trigram fallback: when full-text finds nothing, it is usually a typo
+   ("interstelar") or a word cut short ("interst"). Then we compare the
+   query with the titles by trigram word similarity (pg_trgm), best first.
+   The cut-off is pg_trgm.word_similarity_threshold (0.6 by default).
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import F
+
+from .models import SEARCH_CONFIG
+
+
+def full_text_matches(queryset, text):
+    # websearch syntax: quoted phrases, 'or', '-excluded', never a syntax error
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "id")
+    )
+
+
+def trigram_matches(queryset, text):
+    # The lookup is the indexed '%>' operator; the annotation only ranks its rows
+    return (
+        queryset.filter(title__trigram_word_similar=text)
+        .annotate(rank=TrigramWordSimilarity(text, "title"))
+        .order_by("-rank", "id")
+    )
+
+
+async def search_movies(queryset, text):
+    """
+    The movies of 'queryset' that match 'text', best match first.
+
+    Returns a queryset, so the caller can paginate and count it.
+    """
+    text = text.strip()
+    if not text:
+        return queryset.none()
+    matches = full_text_matches(queryset, text)
+    if await matches.aexists():
+        return matches
+    return trigram_matches(queryset, text)
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .cleanup import movie_files, schedule_file_cleanup
+from .models import Category, Movie
+
+
+# Any write to the catalog makes every cached catalog response stale. The
+# version is bumped once the write commits: bumped before, a catalog request
+# in between would read the old rows and cache them under the new version.
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_on_save(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=Movie.categories.through)
+def invalidate_catalog_on_categories_change(sender, action, **kwargs):
+    # m2m_changed fires pre_* and post_*; only the post_* ones matter
+    if action.startswith("post_"):
+        transaction.on_commit(bump_catalog_version)
+
+
+# Bulk deletes (cleanup.delete_movies) skip signals and queue their files themselves
+@receiver(post_delete, sender=Movie)
+def delete_movie_files(sender, instance, **kwargs):
+    schedule_file_cleanup(movie_files(
+        instance.poster_original.name,
+        instance.backdrop_original.name,
+        instance.renditions,
+    ))
@@ -0,0 +1,83 @@
+"""
+Content-addressed storage for the poster/backdrop originals.
+
+Each file is named after the SHA-256 of its bytes, e.g.
+movies/posters/3f2a...c9.jpeg. An image uploaded twice (a re-upload in
+update_movie, the same poster on two movies) is stored once: the second
+save finds the name taken and uploads nothing.
+
+Renditions come for free: their folder is derived from the original's
+name (renditions.storage_name), so an identical image reuses the files
+already generated for it.
+
+The hash is normally computed by StreamingImageUploadHandler while it
+writes the upload to disk (UploadedFile.content_hash); other files (bulk
+imports, the admin's own uploads) are read once to hash them.
+
+Since movies can share files, deleting one never deletes a file another
+movie still uses, or one an upload has just reused; see
+cleanup.delete_files().
+"""
+
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+
+
+def content_hash(content):
+    """Hex SHA-256 of a file's bytes."""
+    digest = getattr(content, "content_hash", None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    # chunks() starts from the beginning of the file
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def is_stored(field_file, content):
+    """True if 'field_file' already holds exactly the bytes of 'content'."""
+    if not field_file:
+        return False
+    stem = os.path.splitext(os.path.basename(field_file.name))[0]
+    return stem == content_hash(content if hasattr(content, "chunks") else File(content))
+
+
+class ContentAddressedMixin:
+    """Storage mixin: the name of a saved file is the hash of its content."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        # Keep the folder (upload_to) and the extension, replace the rest
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(directory, content_hash(content) + extension)
+        if self.exists(name):
+            # Same bytes as a file we already have. Mark it as just used: the
+            # cleanup queue may be about to delete it, unaware of our row
+            # that hasn't committed yet (see cleanup.delete_files)
+            self.touch(name)
+            return name
+        # Two identical uploads at the same moment: the second one gets a
+        # suffixed name, like any name clash
+        return super().save(name, content, max_length)
+
+    def touch(self, name):
+        """Set the file's modified time to now, where the backend allows it."""
+
+
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    def touch(self, name):
+        os.utime(self.path(name))
+
+
+def originals_storage():
+    # A callable, so the backend comes from settings.STORAGES["originals"]
+    return storages["originals"]
@@ -1,3 +1,1204 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import Future
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core import signals
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.test.client import BOUNDARY, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from gqlauth.core.middlewares import USER_OR_ERROR_KEY, UserOrError
+from PIL import ExifTags, Image
+from Tau.asgi import application
+from .cache import bump_catalog_version, get_catalog_version, stats
+from .checks import check_shared_cache, check_shared_rate_limits
+from .cleanup import delete_movies
+from .imports import DirectoryImages, import_movies, read_manifest
+from .models import Movie, Category, RenditionStatus
+from .renditions import (
+    POSTER_WIDTHS, can_encode, encode, generate_renditions, generate_source, open_source,
+    schedule_bulk_renditions, srcset,
+)
+from .storage import originals_storage
+from .uploads import StreamingImageUploadHandler
 
-# Create your tests here.
+
+def create_movies(count, categories):
+    # Helper: build 'count' active movies, each linked to every category given
+    movies = []
+    for i in range(count):
+        movie = Movie.objects.create(
+            title=f"Movie {i}",
+            description="A test movie",
+            year=2000 + i,
+            duration_minutes=90,
+        )
+        movie.categories.set(categories)
+        movies.append(movie)
+    return movies
+
+
+def make_image(name, size=(400, 600), orientation=None):
+    # Helper: a small in-memory JPEG, good enough for Pillow/imagekit. With an
+    # EXIF 'orientation', 'size' is the stored (not the upright) size
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[ExifTags.Base.Orientation] = orientation
+    Image.new("RGB", size, color=(200, 30, 30)).save(buffer, format="JPEG", exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+def make_mpo(name, size=(400, 600)):
+    # Helper: a JPEG with an MPF segment and a second frame, as phones write
+    # them. Pillow reports its format as "MPO"
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=(200, 30, 30)).save(
+        buffer, format="MPO", save_all=True, append_images=[Image.new("RGB", size)]
+    )
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+def run_query(test, query, variables=None):
+    # Helper: POST a GraphQL document and fail the test on any GraphQL error
+    response = test.client.post(
+        "/graphql/",
+        data=json.dumps({"query": query, "variables": variables or {}}),
+        content_type="application/json"
+    )
+    test.assertEqual(response.status_code, 200, f"Server failed: {response.content}")
+    content = json.loads(response.content)
+    if "errors" in content:
+        test.fail(f"GraphQL Errors Found: {content['errors']}")
+    return content["data"]
+
+
+class MovieCategoriesQueryCountTest(TestCase):
+    """
+    The catalog queries must not fire one M2M query per movie.
+    We check that the number of SQL queries stays the same
+    whether the catalog has 2 movies or 20.
+    """
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+        self.comedy = Category.objects.create(name="Comedy", slug="comedy")
+
+
+    def test_movies_query_count_is_constant(self):
+        query = "{ movies { title categories { slug } } }"
+
+        for count in (2, 20):
+            # The catalog version is bumped when the writes commit
+            with self.captureOnCommitCallbacks(execute=True):
+                Movie.objects.all().delete()
+                create_movies(count, [self.drama, self.comedy])
+
+            # 1 query for the movies + 1 batched query for all their categories
+            with self.assertNumQueries(2):
+                data = run_query(self, query)
+
+            self.assertEqual(len(data["movies"]), count)
+            for movie in data["movies"]:
+                self.assertEqual(
+                    sorted(c["slug"] for c in movie["categories"]),
+                    ["comedy", "drama"]
+                )
+
+    def test_movies_by_category_query_count_is_constant(self):
+        query = '{ moviesByCategory(categorySlug: "drama") { title categories { slug } } }'
+
+        for count in (2, 20):
+            # The catalog version is bumped when the writes commit
+            with self.captureOnCommitCallbacks(execute=True):
+                Movie.objects.all().delete()
+                create_movies(count, [self.drama, self.comedy])
+
+            with self.assertNumQueries(2):
+                data = run_query(self, query)
+
+            self.assertEqual(len(data["moviesByCategory"]), count)
+
+
+class MoviesConnectionTest(TestCase):
+    """Cursor pagination walks the whole catalog without gaps or repeats."""
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+        self.movies = create_movies(5, [self.drama])
+
+
+    def test_pages_follow_cursor(self):
+        query = """
+            query ($after: String) {
+                moviesConnection(first: 2, after: $after) {
+                    edges { cursor node { id categories { slug } } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        """
+        seen = []
+        after = None
+        while True:
+            page = run_query(self, query, {"after": after})["moviesConnection"]
+            seen += [int(edge["node"]["id"]) for edge in page["edges"]]
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+
+        self.assertEqual(seen, [movie.id for movie in self.movies])
+
+    def test_total_count_only_when_requested(self):
+        query = "{ moviesConnection(first: 2) { edges { node { id } } } }"
+        # Just the page: no COUNT, and no categories since none were selected
+        with self.assertNumQueries(1):
+            run_query(self, query)
+
+        query = "{ moviesByCategoryConnection(categorySlug: \"drama\", first: 2) { totalCount } }"
+        data = run_query(self, query)
+        self.assertEqual(data["moviesByCategoryConnection"]["totalCount"], 5)
+
+
+class SearchMoviesTest(TestCase):
+    """searchMovies: ranked full-text matches, with a trigram fallback for typos."""
+
+    query = """
+        query ($query: String!, $first: Int, $after: String) {
+            searchMovies(query: $query, first: $first, after: $after) {
+                edges { cursor node { title } }
+                pageInfo { hasNextPage endCursor }
+                totalCount
+            }
+        }
+    """
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        for title, description in [
+            ("A Quiet Garden", "A gardener finds a door to the stars."),
+            ("Interstellar", "A journey beyond the stars."),
+            ("Stars of the Festival", "Student shorts."),
+            ("Night Train", "A thriller."),
+        ]:
+            Movie.objects.create(title=title, description=description, year=2020, duration_minutes=90)
+        Movie.objects.create(title="Hidden Stars", description="", year=2020, duration_minutes=90, is_active=False)
+
+    def search(self, text, **variables):
+        return run_query(self, self.query, {"query": text, **variables})["searchMovies"]
+
+    def titles(self, page):
+        return [edge["node"]["title"] for edge in page["edges"]]
+
+    def test_title_matches_rank_first(self):
+        page = self.search("stars")
+        self.assertEqual(self.titles(page)[0], "Stars of the Festival")
+        self.assertCountEqual(self.titles(page), ["Stars of the Festival", "A Quiet Garden", "Interstellar"])
+        self.assertEqual(page["totalCount"], 3)
+
+    def test_pages_follow_cursor(self):
+        seen = []
+        after = None
+        while True:
+            page = self.search("stars", first=1, after=after)
+            seen += self.titles(page)
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        self.assertEqual(seen, self.titles(self.search("stars")))
+
+    def test_typo_falls_back_to_trigrams(self):
+        self.assertEqual(self.titles(self.search("interstelar")), ["Interstellar"])
+
+    def test_no_match(self):
+        self.assertEqual(self.titles(self.search("   ")), [])
+        self.assertEqual(self.titles(self.search("xyzzy")), [])
+
+
+class CatalogQueryTest(TestCase):
+    """catalog: filters and sorting in SQL, facets in one aggregate query."""
+
+    query = """
+        query ($filter: CatalogFilter, $orderBy: CatalogOrder, $first: Int, $after: String) {
+            catalog(filter: $filter, orderBy: $orderBy, first: $first, after: $after) {
+                edges { node { title } }
+                pageInfo { hasNextPage endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+        self.comedy = Category.objects.create(name="Comedy", slug="comedy")
+        self.horror = Category.objects.create(name="Horror", slug="horror")
+        for title, year, duration, flags, categories in [
+            ("Alpha", 2001, 95, {"is_new": True}, [self.drama]),
+            ("Bravo", 2015, 120, {"is_student_production": True}, [self.drama, self.comedy]),
+            ("Charlie", 2015, 80, {"is_new": True, "is_from_festival": True}, [self.comedy]),
+            ("Delta", 2023, 150, {"is_from_festival": True}, []),
+        ]:
+            movie = Movie.objects.create(title=title, year=year, duration_minutes=duration, **flags)
+            movie.categories.set(categories)
+        hidden = Movie.objects.create(title="Hidden", year=2015, duration_minutes=90, is_new=True, is_active=False)
+        hidden.categories.set([self.drama])
+
+    def catalog(self, **variables):
+        return run_query(self, self.query, variables)["catalog"]
+
+    def titles(self, **variables):
+        return [edge["node"]["title"] for edge in self.catalog(**variables)["edges"]]
+
+    def test_filters(self):
+        self.assertEqual(self.titles(filter={"isNew": True}), ["Alpha", "Charlie"])
+        self.assertEqual(self.titles(filter={"isFromFestival": False}), ["Alpha", "Bravo"])
+        self.assertEqual(self.titles(filter={"yearMin": 2010, "yearMax": 2020}), ["Bravo", "Charlie"])
+        self.assertEqual(self.titles(filter={"durationMin": 90, "durationMax": 130}), ["Alpha", "Bravo"])
+        self.assertEqual(self.titles(filter={"isNew": True, "yearMin": 2010}), ["Charlie"])
+
+    def test_categories_any_or_all(self):
+        self.assertEqual(self.titles(filter={"categories": ["drama", "comedy"]}), ["Alpha", "Bravo", "Charlie"])
+        self.assertEqual(
+            self.titles(filter={"categories": ["drama", "comedy"], "categoryMatch": "ALL"}),
+            ["Bravo"]
+        )
+        self.assertEqual(self.titles(filter={"categories": ["horror"]}), [])
+
+    def test_sorted_pages_follow_cursor(self):
+        for order_by, expected in [
+            ("NEWEST", ["Delta", "Charlie", "Bravo", "Alpha"]),
+            ("OLDEST", ["Alpha", "Bravo", "Charlie", "Delta"]),
+            ("SHORTEST", ["Charlie", "Alpha", "Bravo", "Delta"]),
+            ("LONGEST", ["Delta", "Bravo", "Alpha", "Charlie"]),
+        ]:
+            with self.subTest(order_by):
+                self.assertEqual(self.titles(orderBy=order_by), expected)
+                seen = []
+                after = None
+                while True:
+                    page = self.catalog(orderBy=order_by, first=1, after=after)
+                    seen += [edge["node"]["title"] for edge in page["edges"]]
+                    if not page["pageInfo"]["hasNextPage"]:
+                        break
+                    after = page["pageInfo"]["endCursor"]
+                self.assertEqual(seen, expected)
+
+    def test_facets_in_one_query(self):
+        query = """
+            query ($filter: CatalogFilter) {
+                catalog(filter: $filter, first: 1) {
+                    facets {
+                        total isNew isStudentProduction isFromFestival
+                        categories { category { slug } count }
+                    }
+                }
+            }
+        """
+        # The page, the category list and one aggregate for all the counts
+        with self.assertNumQueries(3):
+            facets = run_query(self, query)["catalog"]["facets"]
+        self.assertEqual(
+            [facets["total"], facets["isNew"], facets["isStudentProduction"], facets["isFromFestival"]],
+            [4, 2, 1, 2]
+        )
+        self.assertEqual(
+            {facet["category"]["slug"]: facet["count"] for facet in facets["categories"]},
+            {"comedy": 2, "drama": 2, "horror": 0}
+        )
+
+        # Facets count the filtered catalog
+        facets = run_query(self, query, {"filter": {"yearMin": 2010}})["catalog"]["facets"]
+        self.assertEqual([facets["total"], facets["isNew"]], [3, 1])
+        self.assertEqual(
+            {facet["category"]["slug"]: facet["count"] for facet in facets["categories"]},
+            {"comedy": 2, "drama": 1, "horror": 0}
+        )
+
+
+class HomeRailsTest(TestCase):
+    """homeRails: the newest movies of every category, in one query."""
+
+    query = """
+        query ($limit: Int) {
+            homeRails(limitPerRail: $limit) { category { slug } movies { title } }
+        }
+    """
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+        self.comedy = Category.objects.create(name="Comedy", slug="comedy")
+        Category.objects.create(name="Empty", slug="empty")
+        for i in range(5):
+            movie = Movie.objects.create(title=f"Drama {i}", year=2000 + i, duration_minutes=90)
+            movie.categories.set([self.drama] + ([self.comedy] if i % 2 else []))
+        hidden = Movie.objects.create(title="Hidden", year=2030, duration_minutes=90, is_active=False)
+        hidden.categories.set([self.drama, self.comedy])
+
+    def rails(self, limit=None):
+        data = run_query(self, self.query, {"limit": limit})["homeRails"]
+        return {rail["category"]["slug"]: [movie["title"] for movie in rail["movies"]] for rail in data}
+
+    def test_newest_movies_per_category(self):
+        with self.assertNumQueries(1):
+            rails = self.rails(limit=2)
+        self.assertEqual(list(rails), ["comedy", "drama"])
+        self.assertEqual(rails["comedy"], ["Drama 3", "Drama 1"])
+        self.assertEqual(rails["drama"], ["Drama 4", "Drama 3"])
+
+        rails = self.rails()
+        self.assertEqual(rails["drama"], ["Drama 4", "Drama 3", "Drama 2", "Drama 1", "Drama 0"])
+
+    def test_cached_until_catalog_changes(self):
+        self.rails(limit=2)
+        with self.assertNumQueries(0):
+            self.rails(limit=2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movie = Movie.objects.create(title="Newest", year=2024, duration_minutes=90)
+            movie.categories.set([self.comedy])
+        self.assertEqual(self.rails(limit=2)["comedy"], ["Newest", "Drama 3"])
+
+
+class CatalogCacheTest(TestCase):
+    """Catalog queries are served from the cache until the catalog changes."""
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        stats.reset()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+        create_movies(3, [self.drama])
+
+    def test_second_request_hits_cache(self):
+        query = "{ movies { title categories { slug } } }"
+        first = run_query(self, query)
+        self.assertEqual(stats.as_dict(), {"hits": 0, "misses": 1})
+
+        # A hit does not touch the database at all
+        with self.assertNumQueries(0):
+            second = run_query(self, query)
+
+        self.assertEqual(first, second)
+        self.assertEqual(stats.as_dict(), {"hits": 1, "misses": 1})
+
+    def test_variables_are_part_of_the_key(self):
+        Category.objects.create(name="Comedy", slug="comedy")
+        query = "query ($slug: String!) { moviesByCategory(categorySlug: $slug) { title } }"
+        drama = run_query(self, query, {"slug": "drama"})
+        comedy = run_query(self, query, {"slug": "comedy"})
+        self.assertEqual(len(drama["moviesByCategory"]), 3)
+        self.assertEqual(comedy["moviesByCategory"], [])
+
+    def test_mutation_invalidates_cache(self):
+        query = "{ categories { slug } }"
+        run_query(self, query)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_query(self, 'mutation { createCategory(categoryData: {name: "Comedy", slug: "comedy"}) { id } }')
+
+        data = run_query(self, query)
+        self.assertEqual(sorted(c["slug"] for c in data["categories"]), ["comedy", "drama"])
+        self.assertEqual(stats.as_dict()["hits"], 0)
+
+    def test_version_is_bumped_once_the_write_commits(self):
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Comedy", slug="comedy")
+            # A request now still sees the old rows: it must cache them under the old version
+            self.assertEqual(get_catalog_version(), version)
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_m2m_change_invalidates_cache(self):
+        query = "{ movies { categories { slug } } }"
+        run_query(self, query)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            comedy = Category.objects.create(name="Comedy", slug="comedy")
+            Movie.objects.first().categories.add(comedy)
+
+        data = run_query(self, query)
+        slugs = [c["slug"] for movie in data["movies"] for c in movie["categories"]]
+        self.assertIn("comedy", slugs)
+
+    def test_non_catalog_fields_are_not_cached(self):
+        run_query(self, "{ me { username } movies { title } }")
+        run_query(self, "{ me { username } movies { title } }")
+        self.assertEqual(stats.as_dict(), {"hits": 0, "misses": 0})
+
+
+class HttpCacheTest(TestCase):
+    """GET catalog queries carry an ETag and answer If-None-Match with a 304."""
+
+    query = "{ movies { title } }"
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        create_movies(2, [])
+
+    def get(self, query, **headers):
+        return self.client.get("/graphql/", {"query": query}, headers=headers)
+
+    def test_get_response_is_cacheable(self):
+        response = self.get(self.query)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("stale-while-revalidate=", response["Cache-Control"])
+        # Same query, same catalog: same ETag
+        self.assertEqual(self.get(self.query)["ETag"], response["ETag"])
+
+    def test_if_none_match_returns_304_without_running_the_query(self):
+        etag = self.get(self.query)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.get(self.query, if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        # nginx with gzip on hands out weak ETags; those match too
+        self.assertEqual(self.get(self.query, if_none_match=f"W/{etag}").status_code, 304)
+
+    def test_catalog_change_changes_etag(self):
+        etag = self.get(self.query)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name="Comedy", slug="comedy")
+
+        response = self.get(self.query, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_errors_are_not_cacheable(self):
+        response = self.get('{ moviesConnection(after: "garbage") { edges { cursor } } }')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["errors"][0]["message"], "Invalid cursor")
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Cache-Control"))
+
+    def test_timing_summary_is_not_shared(self):
+        etag = self.get(self.query)["ETag"]
+
+        response = self.get(self.query, if_none_match=etag, x_debug_timing="1")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertNotIn("public", response["Cache-Control"])
+
+    def test_post_and_private_queries_are_not_cacheable(self):
+        response = self.client.post(
+            "/graphql/", data=json.dumps({"query": self.query}), content_type="application/json"
+        )
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Cache-Control"))
+
+        response = self.get("{ me { username } }")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Cache-Control"))
+
+
+class SharedCacheCheckTest(TestCase):
+    @override_settings(DEBUG=False)
+    def test_local_memory_cache_is_reported(self):
+        with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ["streaming.W001"])
+        with override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://redis:6379/0",
+        }}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(DEBUG=False)
+    def test_per_process_rate_limits_are_reported(self):
+        redis = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://redis:6379/0"}
+        local = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+        with override_settings(RATE_LIMIT_BACKEND="users.ratelimit.MemoryBackend", CACHES={"default": redis}):
+            self.assertEqual([warning.id for warning in check_shared_rate_limits(None)], ["streaming.W002"])
+        with override_settings(RATE_LIMIT_BACKEND="users.ratelimit.CacheBackend", CACHES={"default": local}):
+            self.assertEqual([warning.id for warning in check_shared_rate_limits(None)], ["streaming.W002"])
+        with override_settings(RATE_LIMIT_BACKEND="users.ratelimit.CacheBackend", CACHES={"default": redis}):
+            self.assertEqual(check_shared_rate_limits(None), [])
+
+
+class InlineExecutor:
+    # Stand-in for the worker pool that runs the job right away
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def jobs(callbacks):
+    # Helper: the on-commit callbacks that queue work, without the catalog version bumps
+    return [callback for callback in callbacks if callback is not bump_catalog_version]
+
+
+class TempMediaRootMixin:
+    """Each test gets an empty MEDIA_ROOT of its own, deleted afterwards."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def media_files(self):
+        """Storage names of every file under MEDIA_ROOT, sorted."""
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.media_root).replace(os.sep, "/")
+            for path, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def age_media_files(self, seconds=2 * 3600):
+        """Make every file under MEDIA_ROOT look 'seconds' old to the cleanup queue."""
+        past = time.time() - seconds
+        for name in self.media_files():
+            os.utime(os.path.join(self.media_root, name), (past, past))
+
+
+class RenditionsTest(TempMediaRootMixin, TestCase):
+    """Renditions are generated by the worker, never by a resolver."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+        self.movie = Movie.objects.create(
+            title="Poster test",
+            description="A test movie",
+            year=2024,
+            duration_minutes=90,
+            poster_original=make_image("poster.jpg"),
+            backdrop_original=make_image("backdrop.jpg", (1600, 900)),
+        )
+
+    def cache_files(self):
+        return [name for name in self.media_files() if name.startswith("CACHE/")]
+
+    def test_pending_movie_resolves_without_generating(self):
+        data = run_query(self, "{ movies { posterMobileUrl posterDesktopUrl renditionsStatus } }")
+
+        self.assertEqual(data["movies"][0]["posterMobileUrl"], "")
+        self.assertEqual(data["movies"][0]["renditionsStatus"], RenditionStatus.PENDING)
+        self.assertEqual(self.cache_files(), [])
+
+    def test_generate_renditions_writes_files_and_marks_ready(self):
+        with mock.patch("streaming.renditions.open_source", wraps=open_source) as opened:
+            status = generate_renditions(self.movie.pk)
+
+        self.assertEqual(status, RenditionStatus.READY)
+        # Each original is decoded once, however many renditions it feeds
+        self.assertEqual(opened.call_count, 2)
+
+        self.movie.refresh_from_db()
+        self.assertEqual(len(self.cache_files()), len(self.movie.renditions))
+        for name in ("poster_mobile", "poster_desktop", "backdrop_large"):
+            self.assertIn(name, self.movie.renditions)
+
+        # URLs are built from the manifest: no storage access at all
+        with mock.patch("django.core.files.storage.FileSystemStorage.exists") as exists, \
+                mock.patch("django.core.files.storage.FileSystemStorage.open") as open_:
+            data = run_query(self, "{ movies { posterMobileUrl posterDesktopUrl backdropLargeUrl } }")
+        exists.assert_not_called()
+        open_.assert_not_called()
+
+        movie = data["movies"][0]
+        self.assertEqual(movie["posterMobileUrl"], "/media/" + self.movie.renditions["poster_mobile"]["name"])
+        self.assertTrue(movie["posterDesktopUrl"].endswith(".webp"))
+        self.assertTrue(movie["backdropLargeUrl"].endswith(".webp"))
+
+    def test_exif_rotated_original_keeps_its_proportions(self):
+        # Stored 600x400 landscape, shown 400x600 portrait (orientation 6: rotate 90° clockwise)
+        self.movie.poster_original = make_image("phone.jpg", (600, 400), orientation=6)
+        self.movie.save()
+        self.assertEqual(generate_renditions(self.movie.pk), RenditionStatus.READY)
+
+        self.movie.refresh_from_db()
+        mobile = self.movie.renditions["poster_mobile"]
+        self.assertEqual((mobile["width"], mobile["height"]), (160, 240))
+        for _, entry in srcset(self.movie, "poster"):
+            with Image.open(os.path.join(self.media_root, entry["name"])) as image:
+                self.assertEqual(image.size, (entry["width"], entry["height"]))
+            self.assertAlmostEqual(entry["height"] / entry["width"], 1.5, delta=0.02)
+
+    def test_mpo_original_is_cut_like_a_jpeg(self):
+        self.movie.poster_original = make_mpo("camera.jpg")
+        self.movie.save()
+        self.assertEqual(generate_renditions(self.movie.pk), RenditionStatus.READY)
+
+        self.movie.refresh_from_db()
+        mobile = self.movie.renditions["poster_mobile"]
+        self.assertEqual((mobile["width"], mobile["height"]), (160, 240))
+        # From the first frame (red), not the second (black)
+        with Image.open(os.path.join(self.media_root, mobile["name"])) as image:
+            red, green, blue = image.convert("RGB").getpixel((80, 120))
+        self.assertGreater(red, 150)
+
+    def test_stale_job_does_not_overwrite_a_newer_manifest(self):
+        def replace_poster(*args):
+            # updateMovie stores a new poster while this job is still resizing the old one
+            Movie.objects.filter(pk=self.movie.pk).update(poster_original="movies/posters/new.jpg")
+            return generate_source(*args)
+
+        with mock.patch("streaming.renditions.generate_source", side_effect=replace_poster):
+            self.assertIsNone(generate_renditions(self.movie.pk))
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.renditions_status, RenditionStatus.PENDING)
+        self.assertEqual(self.movie.renditions, {})
+
+    def test_version_is_bumped_by_the_process_that_queued_the_job(self):
+        # A worker process may have a cache of its own: the job leaves the version alone...
+        version = get_catalog_version()
+        self.assertEqual(generate_renditions(self.movie.pk), RenditionStatus.READY)
+        self.assertEqual(get_catalog_version(), version)
+
+        # ...and the web process bumps it once the job is done
+        with mock.patch("streaming.renditions.get_process_pool", return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_bulk_renditions([self.movie.pk])
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_srcset_lists_every_width_and_format(self):
+        generate_renditions(self.movie.pk)
+
+        data = run_query(self, "{ movies { posterSrcset { url width height format bytes } } }")
+        sources = data["movies"][0]["posterSrcset"]
+
+        formats = {"webp", "avif"} if can_encode("AVIF") else {"webp"}
+        self.assertEqual({source["format"] for source in sources}, formats)
+        self.assertEqual(len(sources), len(POSTER_WIDTHS) * len(formats))
+        # Smallest file first, and never upscaled past the 400px original
+        self.assertEqual([s["bytes"] for s in sources], sorted(s["bytes"] for s in sources))
+        self.assertTrue(all(source["width"] <= 400 for source in sources))
+        self.assertIn(160, [source["width"] for source in sources])
+
+    def test_create_movie_schedules_renditions_after_commit(self):
+        mutation = """
+            mutation {
+                createMovie(movieData: {
+                    title: "New", description: "d", year: 2024, durationMinutes: 80,
+                    categoryIds: [], isNew: true, isStudentProduction: false, isFromFestival: false
+                }) { id renditionsStatus }
+            }
+        """
+        with mock.patch("streaming.renditions.get_executor", return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                data = run_query(self, mutation)
+
+        # Nothing ran inside the request; the job was queued for after commit
+        self.assertEqual(data["createMovie"]["renditionsStatus"], RenditionStatus.PENDING)
+        self.assertEqual(len(jobs(callbacks)), 1)
+        movie = Movie.objects.get(pk=data["createMovie"]["id"])
+        self.assertEqual(movie.renditions_status, RenditionStatus.READY)
+
+
+class ContentAddressedStorageTest(TempMediaRootMixin, TestCase):
+    """Identical originals are stored once and share their renditions."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+
+    def create_movie(self, poster_name):
+        return Movie.objects.create(
+            title=poster_name, year=2024, duration_minutes=90, poster_original=make_image(poster_name),
+        )
+
+    def test_identical_images_are_stored_once(self):
+        first = self.create_movie("poster.jpg")
+        second = self.create_movie("poster.jpg")
+        other = self.create_movie("small.jpg")
+        other.poster_original = make_image("small.jpg", (200, 300))
+        other.save()
+
+        digest = hashlib.sha256(make_image("poster.jpg").read()).hexdigest()
+        self.assertEqual(first.poster_original.name, f"movies/posters/{digest}.jpg")
+        self.assertEqual(second.poster_original.name, first.poster_original.name)
+        self.assertNotEqual(other.poster_original.name, first.poster_original.name)
+        self.assertEqual(len(os.listdir(os.path.join(self.media_root, "movies", "posters"))), 2)
+
+    def test_renditions_are_reused(self):
+        first = self.create_movie("poster.jpg")
+        generate_renditions(first.pk)
+        second = self.create_movie("copy.jpg")
+
+        with mock.patch("streaming.renditions.encode", wraps=encode) as encoded:
+            self.assertEqual(generate_renditions(second.pk), RenditionStatus.READY)
+        encoded.assert_not_called()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.renditions, first.renditions)
+
+    def test_deleting_a_movie_keeps_files_another_one_uses(self):
+        first = self.create_movie("poster.jpg")
+        generate_renditions(first.pk)
+        second = self.create_movie("poster.jpg")
+        generate_renditions(second.pk)
+        second.refresh_from_db()
+        shared = [second.poster_original.name] + [entry["name"] for entry in second.renditions.values()]
+        self.age_media_files()
+
+        with mock.patch("streaming.cleanup.get_cleanup_executor", return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                run_query(self, "mutation ($ids: [ID!]!) { deleteMovies(movieIds: $ids) }", {"ids": [first.pk]})
+        for name in shared:
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, name)), name)
+
+        # The last movie using them takes the files with it
+        with mock.patch("streaming.cleanup.get_cleanup_executor", return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                second.delete()
+        for name in shared:
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)), name)
+
+
+    def test_original_reused_while_cleanup_is_queued_is_kept(self):
+        movie = self.create_movie("poster.jpg")
+        generate_renditions(movie.pk)
+        self.age_media_files()
+        before = self.media_files()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            movie.delete()
+        # Meanwhile, an upload of the same poster: save() finds the file and
+        # writes nothing, and its movie isn't committed yet
+        name = originals_storage().save("movies/posters/x.jpg", make_image("poster.jpg"))
+        self.assertEqual(name, movie.poster_original.name)
+        with mock.patch("streaming.cleanup.get_cleanup_executor", return_value=InlineExecutor()):
+            for callback in jobs(callbacks):
+                callback()
+
+        # Left for purge_orphan_media, which waits for MIN_AGE too
+        self.assertEqual(self.media_files(), before)
+
+
+class BulkImportTest(TempMediaRootMixin, TestCase):
+    """Bulk import: chunked inserts, one category lookup, per-row errors."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+        self.comedy = Category.objects.create(name="Comedy", slug="comedy")
+
+    def csv_rows(self, text):
+        return read_manifest(io.BytesIO(text.encode()), "movies.csv")
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        images_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, images_dir, ignore_errors=True)
+        with open(os.path.join(images_dir, "alpha.jpg"), "wb") as image:
+            image.write(make_image("alpha.jpg").read())
+        with open(os.path.join(images_dir, "notes.jpg"), "wb") as not_image:
+            not_image.write(b"not an image")
+
+        result = import_movies(self.csv_rows(
+            "title,year,duration_minutes,categories,is_new,poster\n"
+            "Alpha,2024,95,drama|comedy,yes,alpha.jpg\n"
+            "Bravo,2020,80,,,\n"
+            "Charlie,2021,80,horror,,\n"
+            "Delta,soon,80,,,\n"
+            "Echo,2022,80,,,missing.jpg\n"
+            "Foxtrot,2022,80,,,notes.jpg\n"
+            "Golf,2022,80,,maybe,\n"
+        ), DirectoryImages(images_dir), renditions=False)
+
+        self.assertEqual(
+            result.errors,
+            [
+                (4, "unknown categories: horror"),
+                (5, "'year' must be a whole number, not 'soon'"),
+                (6, "image 'missing.jpg' not found"),
+                (7, "'notes.jpg' is not a valid image"),
+                (8, "'is_new' must be true or false, not 'maybe'"),
+            ]
+        )
+        alpha, bravo = Movie.objects.filter(pk__in=result.created).order_by("title")
+        self.assertEqual(sorted(c.slug for c in alpha.categories.all()), ["comedy", "drama"])
+        self.assertTrue(alpha.is_new and alpha.is_active)
+        digest = hashlib.sha256(make_image("alpha.jpg").read()).hexdigest()
+        self.assertEqual(alpha.poster_original.name, f"movies/posters/{digest}.jpg")
+        self.assertFalse(bravo.poster_original)
+        self.assertFalse(bravo.categories.exists())
+        # Only Alpha's poster was kept: the rejected images were never stored
+        posters_dir = os.path.join(self.media_root, "movies", "posters")
+        self.assertEqual(len(os.listdir(posters_dir)), 1)
+
+    def test_rejected_row_keeps_the_images_others_share(self):
+        images_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, images_dir, ignore_errors=True)
+        for name, size in (("shared.jpg", (400, 600)), ("own.jpg", (200, 300))):
+            with open(os.path.join(images_dir, name), "wb") as image:
+                image.write(make_image(name, size).read())
+        with open(os.path.join(images_dir, "notes.jpg"), "wb") as not_image:
+            not_image.write(b"not an image")
+
+        result = import_movies(self.csv_rows(
+            "title,year,duration_minutes,poster,backdrop\n"
+            "Alpha,2024,95,shared.jpg,\n"
+            # Same poster as Alpha, and a backdrop that isn't an image
+            "Bravo,2024,95,shared.jpg,notes.jpg\n"
+            "Charlie,2024,95,own.jpg,notes.jpg\n"
+        ), DirectoryImages(images_dir), renditions=False)
+
+        self.assertEqual([error.line for error in result.errors], [3, 4])
+        alpha = Movie.objects.get(pk__in=result.created)
+        self.assertTrue(os.path.exists(alpha.poster_original.path))
+        # What a rejected row stored for itself alone is removed
+        self.assertEqual(self.media_files(), [alpha.poster_original.name])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        counts = []
+        for rows in (3, 30):
+            manifest = "title,year,duration_minutes,categories\n" + "".join(
+                f"Movie {i},2024,90,drama|comedy\n" for i in range(rows)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                result = import_movies(self.csv_rows(manifest), chunk_size=100, renditions=False)
+            self.assertEqual(len(result.created), rows)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Movie.categories.through.objects.count(), 2 * 33)
+
+    def test_mutation_imports_zip_and_queues_renditions(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as images:
+            images.writestr("posters/alpha.jpg", make_image("alpha.jpg").read())
+        manifest = (
+            '{"title": "Alpha", "year": 2024, "duration_minutes": 95, '
+            '"categories": ["drama"], "poster": "posters/alpha.jpg"}\n'
+            "not json\n"
+        )
+        mutation = """
+            mutation ($manifest: Upload!, $images: Upload) {
+                bulkImportMovies(manifest: $manifest, images: $images) {
+                    createdIds errors { line message }
+                }
+            }
+        """
+        with mock.patch("streaming.renditions.get_process_pool", return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/graphql/import/", data={
+                    "operations": json.dumps({"query": mutation, "variables": {"manifest": None, "images": None}}),
+                    "map": json.dumps({"0": ["variables.manifest"], "1": ["variables.images"]}),
+                    "0": SimpleUploadedFile("movies.jsonl", manifest.encode()),
+                    "1": SimpleUploadedFile("images.zip", archive.getvalue()),
+                })
+
+        self.assertEqual(response.status_code, 200, response.content)
+        content = json.loads(response.content)
+        self.assertNotIn("errors", content)
+        result = content["data"]["bulkImportMovies"]
+        self.assertEqual(len(result["createdIds"]), 1)
+        self.assertEqual(result["errors"][0]["line"], 2)
+        self.assertIn("invalid JSON", result["errors"][0]["message"])
+
+        movie = Movie.objects.get(pk=result["createdIds"][0])
+        self.assertEqual(movie.renditions_status, RenditionStatus.READY)
+        self.assertIn("poster_mobile", movie.renditions)
+
+
+class BulkDeleteTest(TempMediaRootMixin, TestCase):
+    """Bulk archive/delete: set-based SQL per chunk, files removed after commit."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        cache.clear()
+        self.drama = Category.objects.create(name="Drama", slug="drama")
+
+    def test_delete_all_movies_removes_rows_and_files(self):
+        movie = Movie.objects.create(
+            title="With files", year=2024, duration_minutes=90,
+            poster_original=make_image("poster.jpg"),
+        )
+        generate_renditions(movie.pk)
+        create_movies(3, [self.drama])
+        self.assertTrue(self.media_files())
+        self.age_media_files()
+
+        with mock.patch("streaming.cleanup.get_cleanup_executor", return_value=InlineExecutor()):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                data = run_query(self, "mutation { deleteAllMovies }")
+
+        self.assertEqual(data["deleteAllMovies"], 4)
+        self.assertFalse(Movie.objects.exists())
+        self.assertFalse(Movie.categories.through.objects.exists())
+        # One cleanup job per chunk, and the files are gone
+        self.assertEqual(len(jobs(callbacks)), 1)
+        self.assertEqual(self.media_files(), [])
+
+    def test_query_count_depends_on_chunks_not_movies(self):
+        counts = []
+        for count in (3, 30):
+            create_movies(count, [self.drama])
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(delete_movies(Movie.objects.all(), chunk_size=100), count)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_archive_hides_movies_and_keeps_files(self):
+        movies = create_movies(3, [self.drama])
+        ids = [movies[0].pk, movies[1].pk]
+        data = run_query(self, "mutation ($ids: [ID!]!) { archiveMovies(movieIds: $ids) }", {"ids": ids})
+
+        self.assertEqual(data["archiveMovies"], 2)
+        self.assertEqual(run_query(self, "{ movies { title } }")["movies"], [{"title": "Movie 2"}])
+        self.assertEqual(Movie.objects.count(), 3)
+
+    def test_purge_orphan_media(self):
+        kept = Movie.objects.create(
+            title="Kept", year=2024, duration_minutes=90, poster_original=make_image("kept.jpg"),
+        )
+        generate_renditions(kept.pk)
+        gone = Movie.objects.create(
+            title="Gone", year=2024, duration_minutes=90, poster_original=make_image("gone.jpg"),
+        )
+        generate_renditions(gone.pk)
+        # A raw delete, like a crash before the cleanup queue ran: files stay
+        Movie.objects.filter(pk=gone.pk)._raw_delete(Movie.objects.db)
+        for name in ("CACHE/images/movies/posters/old/abc.webp", "CACHE/renditions/unknown/x.webp"):
+            os.makedirs(os.path.join(self.media_root, os.path.dirname(name)))
+            open(os.path.join(self.media_root, name), "wb").close()
+        before = self.media_files()
+
+        out = io.StringIO()
+        call_command("purge_orphan_media", min_age=0, stdout=out)
+
+        kept.refresh_from_db()
+        expected = [kept.poster_original.name] + [entry["name"] for entry in kept.renditions.values()]
+        # Renditions we can't trace back to an original are left alone
+        expected.append("CACHE/renditions/unknown/x.webp")
+        self.assertEqual(self.media_files(), sorted(expected))
+        self.assertIn(f"Deleted {len(before) - len(expected)} files", out.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "CACHE", "images")))
+
+
+class StreamingUploadTest(TempMediaRootMixin, TestCase):
+    """Uploads go to disk chunk by chunk and are checked while they arrive."""
+
+    mutation = """
+        mutation ($poster: Upload) {
+            createMovie(movieData: {
+                title: "Upload", description: "d", year: 2024, durationMinutes: 80,
+                categoryIds: [], isNew: false, isStudentProduction: false, isFromFestival: false,
+                posterOriginal: $poster
+            }) { id }
+        }
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def view(self, request):
+        # The view is async; run it to completion from this sync test, then
+        # clean up the uploaded temp files like Django's handler does
+        try:
+            return async_to_sync(resolve(request.path).func)(request)
+        finally:
+            request.close()
+
+    def make_request(self, upload, path="/graphql/"):
+        # Multipart request following the GraphQL multipart spec
+        request = RequestFactory().post(path, data={
+            "operations": json.dumps({"query": self.mutation, "variables": {"poster": None}}),
+            "map": json.dumps({"0": ["variables.poster"]}),
+            "0": upload,
+        })
+        # What the JWT middleware would attach for an anonymous client
+        setattr(request, USER_OR_ERROR_KEY, UserOrError())
+        return request
+
+    @staticmethod
+    def large_png(padding):
+        # A real PNG header (4000x3000) followed by 'padding' bytes of data
+        buffer = io.BytesIO()
+        Image.new("L", (4000, 3000)).save(buffer, format="PNG")
+        return SimpleUploadedFile("big.png", buffer.getvalue() + b"\0" * padding, content_type="image/png")
+
+    def test_large_upload_memory_stays_flat(self):
+        size = 20 * 1024 * 1024
+        request = self.make_request(self.large_png(size))
+
+        tracemalloc.start()
+        try:
+            response = self.view(request)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(response.status_code, 200, response.content)
+        content = json.loads(response.content)
+        self.assertNotIn("errors", content)
+        movie = Movie.objects.get(pk=content["data"]["createMovie"]["id"])
+        self.assertGreater(movie.poster_original.size, size)
+        # Named by the hash the handler computed while writing the upload
+        self.assertEqual(
+            movie.poster_original.name,
+            f"movies/posters/{hashlib.sha256(self.large_png(size).read()).hexdigest()}.png"
+        )
+        # The 20 MB file never sits in memory: peak stays a small fraction of it
+        self.assertLess(peak, 4 * 1024 * 1024)
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=1024 * 1024)
+    def test_file_over_limit_is_rejected(self):
+        response = self.view(self.make_request(self.large_png(2 * 1024 * 1024)))
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Movie.objects.exists())
+
+    def test_import_file_is_not_a_poster(self):
+        # On the import endpoint .zip skips the image header check, so it must not reach the model
+        upload = SimpleUploadedFile("poster.zip", b"PK\x05\x06" + b"\0" * 18)
+        response = self.view(self.make_request(upload, path="/graphql/import/"))
+
+        content = json.loads(response.content)
+        self.assertIn("not an image upload", content["errors"][0]["message"])
+        self.assertFalse(Movie.objects.exists())
+
+    def test_import_files_only_on_the_import_endpoint(self):
+        # Anywhere else the extension counts for nothing: it's checked like any image
+        upload = SimpleUploadedFile("poster.zip", b"PK\x05\x06" + b"\0" * 18)
+        response = self.view(self.make_request(upload))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"not a valid image", response.content)
+
+    @override_settings(MAX_UPLOAD_REQUEST_SIZE=1024, MAX_IMPORT_REQUEST_SIZE=1024 * 1024)
+    def test_body_size_is_checked_before_reading_it(self):
+        # Only the import endpoint takes bodies over MAX_UPLOAD_REQUEST_SIZE
+        response = self.view(self.make_request(make_image("poster.jpg")))
+        self.assertEqual(response.status_code, 413)
+
+        response = self.view(self.make_request(make_image("poster.jpg"), path="/graphql/import/"))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(Movie.objects.exists())
+
+    def test_mpo_jpeg_is_accepted(self):
+        response = self.view(self.make_request(make_mpo("camera.jpg")))
+
+        self.assertEqual(response.status_code, 200, response.content)
+        content = json.loads(response.content)
+        self.assertNotIn("errors", content)
+        self.assertTrue(Movie.objects.get(pk=content["data"]["createMovie"]["id"]).poster_original)
+
+    def test_non_image_is_rejected(self):
+        upload = SimpleUploadedFile("poster.jpg", b"#!/bin/sh\n" * 100, content_type="image/jpeg")
+        response = self.view(self.make_request(upload))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"not a valid image", response.content)
+        self.assertFalse(Movie.objects.exists())
+
+
+class AsgiUploadTest(TempMediaRootMixin, TestCase):
+    """
+    Uploads through the ASGI application, as under uvicorn: Django reads
+    the whole body before any view runs, so the size limits must act first.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Like django.test.Client: a request must not close the test's connection
+        for signal in (signals.request_started, signals.request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+    def post(self, path, upload, content_length=True, chunk_size=64 * 1024):
+        """Send a createMovie multipart request. Returns (status, body, bytes the app read)."""
+        body = encode_multipart(BOUNDARY, {
+            "operations": json.dumps({"query": StreamingUploadTest.mutation, "variables": {"poster": None}}),
+            "map": json.dumps({"0": ["variables.poster"]}),
+            "0": upload,
+        })
+        chunks = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+        headers = [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())]
+        if content_length:
+            headers.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": headers, "client": ("127.0.0.1", 40000), "server": ("testserver", 80),
+        }
+        read = 0
+        sent = []
+
+        async def receive():
+            nonlocal read
+            if not chunks:
+                # Django listens for a disconnect while the view runs: never comes
+                await asyncio.Event().wait()
+            chunk = chunks.pop(0)
+            read += len(chunk)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+        async def send(message):
+            sent.append(message)
+
+        async_to_sync(application)(scope, receive, send)
+        return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:]), read
+
+    @override_settings(MAX_UPLOAD_REQUEST_SIZE=1024 * 1024)
+    def test_oversized_body_is_refused_before_it_is_read(self):
+        upload = StreamingUploadTest.large_png(2 * 1024 * 1024)
+
+        status, _, read = self.post("/graphql/", upload)
+        self.assertEqual((status, read), (413, 0))
+
+        # Without a Content-Length, it's cut off once the limit is passed
+        upload.seek(0)
+        status, _, read = self.post("/graphql/", upload, content_length=False)
+        self.assertEqual(status, 413)
+        self.assertLess(read, 1024 * 1024 + 64 * 1024 + 1)
+        self.assertFalse(Movie.objects.exists())
+
+    @override_settings(MAX_UPLOAD_REQUEST_SIZE=1024, MAX_IMPORT_REQUEST_SIZE=1024 * 1024)
+    def test_upload_is_parsed_off_the_event_loop(self):
+        loops = []
+        receive_data_chunk = StreamingImageUploadHandler.receive_data_chunk
+
+        def record_loop(handler, raw_data, start):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return receive_data_chunk(handler, raw_data, start)
+
+        # The import endpoint takes the larger body
+        with mock.patch.object(StreamingImageUploadHandler, "receive_data_chunk", record_loop):
+            status, body, _ = self.post("/graphql/import/", make_image("poster.jpg"))
+
+        self.assertEqual(status, 200, body)
+        self.assertNotIn("errors", json.loads(body))
+        self.assertTrue(Movie.objects.exists())
+        self.assertTrue(loops)
+        self.assertEqual(set(loops), {None})
@@ -0,0 +1,103 @@
+"""
+EXPLAIN checks for the catalog indexes (see Movie.Meta and migration 0005).
+
+We seed a realistic 100k movie catalog and ask PostgreSQL how it would
+run the queries behind our resolvers. The assertions read the plan text:
+the name of the index used, sequential scans and sorts.
+
+Seeding takes a few seconds; skip it with:
+    python manage.py test --exclude-tag=slow
+"""
+
+from django.db import connection
+from django.test import TestCase, tag
+
+from .models import Category, Movie
+from .schema import active_movies
+
+MOVIES = 100_000
+GENRES = 12
+
+# One statement per table instead of 100k ORM objects. Every 10th movie is
+# inactive, and the rails are small slices like in production.
+SEED_MOVIES = """
+    WITH RECURSIVE seq(n) AS (
+        SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s
+    )
+    INSERT INTO streaming_movie (
+        title, description, poster_original, backdrop_original, year,
+        duration_minutes, is_active, is_new, is_student_production,
+        is_from_festival, renditions_status, renditions
+    )
+    SELECT
+        'Movie ' || n, '', '', '', 1950 + n %% 75,
+        80 + n %% 60, n %% 10 <> 0, n %% 20 = 0, n %% 33 = 0,
+        n %% 12 = 0, 'ready', '{}'
+    FROM seq
+"""
+
+SEED_CATEGORIES = """
+    INSERT INTO streaming_movie_categories (movie_id, category_id)
+    SELECT movie.id, category.id
+    FROM streaming_movie movie
+    JOIN streaming_category category ON category.slug = 'genre-' || (movie.id %% %s)
+"""
+
+
+@tag("slow")
+class CatalogIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.bulk_create(
+            Category(name=f"Genre {i}", slug=f"genre-{i}") for i in range(GENRES)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(SEED_MOVIES, [MOVIES])
+            cursor.execute(SEED_CATEGORIES, [GENRES])
+            # Fresh statistics, or the planner guesses on an "empty" table
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def assertNoScanOrSort(self, queryset):
+        """Rows come out of an index, already in order: no full scan, no sort."""
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan on streaming_movie ", plan + " ", plan)
+        self.assertNotIn("Sort", plan, plan)
+
+    def assertNoFullScan(self, queryset, table):
+        plan = queryset.explain()
+        self.assertNotIn(f"Seq Scan on {table} ", plan + " ", plan)
+
+    def test_seeded(self):
+        self.assertEqual(Movie.objects.count(), MOVIES)
+
+    def test_cursor_pagination(self):
+        # What paginate() runs for moviesConnection
+        self.assertNoScanOrSort(active_movies().order_by("id")[:21])
+        self.assertNoScanOrSort(active_movies().filter(id__gt=50_000).order_by("id")[:21])
+
+    def test_newest_first(self):
+        queryset = active_movies().order_by("-year", "-id")[:20]
+        self.assertUsesIndex(queryset, "movie_active_year_idx")
+        self.assertNoScanOrSort(queryset)
+
+    def test_movies_by_category(self):
+        # The M2M table is searched with Django's own category_id index (or
+        # walked in movie order for a short page), never read in full
+        for queryset in (active_movies("genre-3"), active_movies("genre-3").order_by("id")[:21]):
+            self.assertNoFullScan(queryset, "streaming_movie_categories")
+
+    def test_rails(self):
+        for flag, index_name in [
+            ("is_new", "movie_rail_new_idx"),
+            ("is_student_production", "movie_rail_student_idx"),
+            ("is_from_festival", "movie_rail_festival_idx"),
+        ]:
+            with self.subTest(flag):
+                queryset = active_movies().filter(**{flag: True}).order_by("-year", "-id")[:20]
+                self.assertUsesIndex(queryset, index_name)
+                self.assertNoScanOrSort(queryset)
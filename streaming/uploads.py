@@ -0,0 +1,144 @@
+"""
+Upload handler for poster/backdrop uploads.
+
+Django hands the request body to upload handlers in small chunks (64 KB).
+This handler:
+    - writes every chunk straight to a temporary file on disk, so a big
+      backdrop never sits in worker RAM
+    - checks the image header (format and dimensions) as soon as the first
+      chunks arrive, and rejects non-images without parsing the rest
+    - stops parsing the moment a file goes over MAX_IMAGE_UPLOAD_SIZE
+    - hashes the bytes as they go by (UploadedFile.content_hash), so the
+      content-addressed storage (storage.py) never reads the file again
+
+Under ASGI (production), Django has already received the whole body, in
+a temporary file, by the time the handler runs: refusing a request before
+its bytes arrive is the job of nginx and of Tau/limits.py, which apply the
+same request limits. The parsing itself runs in a worker thread, off the
+event loop (TauGraphQLView.parse_http_body).
+
+Bulk import files (see imports.py) are only accepted on the import
+endpoint (/graphql/import/, which sets request.allow_import_uploads), and
+told apart there by their extension. They skip the image checks, get
+MAX_IMPORT_UPLOAD_SIZE instead, and are marked as such so they can't be
+used as a poster; see require_image(). Anywhere else a .zip is just a file
+that doesn't pass the image checks, and the whole request is held to
+MAX_UPLOAD_REQUEST_SIZE.
+"""
+
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from strawberry.http.exceptions import HTTPException
+
+# MPO is what Pillow calls a JPEG with an MPF segment (extra frames: a
+# preview, a depth map), as many cameras and phones write them
+ALLOWED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "AVIF"}
+IMPORT_EXTENSIONS = {".csv", ".jsonl", ".ndjson", ".zip"}
+
+# Set on every file this handler completes (UploadedFile.upload_kind)
+IMAGE = "image"
+IMPORT = "import"
+
+# If Pillow can't read the header within this many bytes, it's not an image we want
+HEADER_MAX_BYTES = 256 * 1024
+
+
+class UploadRejected(HTTPException):
+    """
+    Raised from inside the upload handler. It's an HTTPException so the
+    GraphQL view turns it into a plain error response (413/400).
+    """
+
+
+class StreamingImageUploadHandler(TemporaryFileUploadHandler):
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Cheapest check first: a body that is too big for any valid upload
+        # is refused before parsing any of it (under WSGI, before reading it)
+        if self.imports_allowed():
+            max_request_size = settings.MAX_IMPORT_REQUEST_SIZE
+        else:
+            max_request_size = settings.MAX_UPLOAD_REQUEST_SIZE
+        if content_length and content_length > max_request_size:
+            self.reject(413, "Request body is too large")
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.sha256 = hashlib.sha256()
+        if self.imports_allowed() and os.path.splitext(self.file_name)[1].lower() in IMPORT_EXTENSIONS:
+            self.kind = IMPORT
+            self.max_size = settings.MAX_IMPORT_UPLOAD_SIZE
+            # Its images are checked one by one when the archive is read
+            self.header = None
+            self.header_checked = True
+        else:
+            self.kind = IMAGE
+            self.max_size = settings.MAX_IMAGE_UPLOAD_SIZE
+            self.header = io.BytesIO()
+            self.header_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.reject(413, f"'{self.file_name}' is larger than the upload limit")
+
+        if not self.header_checked:
+            # Keep a copy of the first bytes only until the header parses
+            self.header.write(raw_data)
+            self.check_header()
+
+        self.sha256.update(raw_data)
+        # Parent writes the chunk to the temporary file
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.header_checked:
+            # Tiny file: every byte arrived without a readable header
+            self.check_header(final=True)
+        file = super().file_complete(file_size)
+        file.upload_kind = self.kind
+        file.content_hash = self.sha256.hexdigest()
+        return file
+
+    def imports_allowed(self):
+        # Set by the view serving the import endpoint, before the body is read
+        return getattr(self.request, "allow_import_uploads", False)
+
+    def reject(self, status_code, reason):
+        # Delete the half-written temporary file before bailing out
+        self.upload_interrupted()
+        raise UploadRejected(status_code, reason)
+
+    def check_header(self, final=False):
+        data = self.header.getvalue()
+        try:
+            # Image.open only parses the header; it doesn't decode pixels
+            image = Image.open(io.BytesIO(data))
+        except Exception:
+            if final or len(data) >= HEADER_MAX_BYTES:
+                self.reject(400, f"'{self.file_name}' is not a valid image")
+            return  # Need more bytes
+
+        if image.format not in ALLOWED_FORMATS:
+            self.reject(400, f"'{self.file_name}': {image.format} images are not allowed")
+        width, height = image.size
+        if width * height > settings.MAX_IMAGE_PIXELS:
+            self.reject(400, f"'{self.file_name}' is too big ({width}x{height})")
+
+        self.header_checked = True
+        self.header = None
+
+
+def require_image(upload):
+    """Refuse an upload that skipped the image checks (a bulk import file)."""
+    if upload and getattr(upload, "upload_kind", IMAGE) != IMAGE:
+        raise Exception(f"'{upload.name}' is not an image upload")
+    return upload
+
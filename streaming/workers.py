@@ -0,0 +1,11 @@
+"""
+Start-up of the rendition worker processes (see renditions.get_process_pool).
+
+Kept out of renditions.py on purpose: a spawned process loads this module
+before Django is set up, so it must not import any models.
+"""
+
+
+def setup_worker():
+    import django
+    django.setup()
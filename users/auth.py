@@ -0,0 +1,152 @@
+"""
+JWT authentication with cached token verification and user lookup.
+
+gqlauth's django_jwt_middleware decodes the Authorization token and loads
+its user (one query) on every request, and the 'me' query used to do it
+again for the cookie. Here:
+
+- token_users maps a token to its user, per process: an LRU of
+  JWT_USER_CACHE_SIZE tokens. An entry lives JWT_USER_CACHE_TTL seconds at
+  most, and never past the token's own expiry. Saving or deleting a user
+  drops their tokens (see signals.py), so a deactivated account isn't
+  served from the cache.
+- Each request remembers the tokens it has resolved, so the middleware and
+  any resolver asking again (me's cookie fallback) decode a token once.
+
+The key is the whole token, signature included: a hit is only possible
+for the exact string that was verified.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from gqlauth.core.exceptions import TokenExpired
+from gqlauth.core.middlewares import UserOrError
+from gqlauth.core.types_ import GQLAuthError, GQLAuthErrors
+from gqlauth.core.utils import app_settings
+from gqlauth.jwt.types_ import TokenType
+from jwt import PyJWTError
+
+# Attribute of the request holding {token: UserOrError}
+REQUEST_MEMO = "_token_users"
+
+
+class TokenUserCache:
+    """Thread-safe LRU of token -> user, each entry with its own deadline."""
+
+    def __init__(self):
+        self._entries = OrderedDict()  # token -> (user, time.monotonic() deadline)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token):
+        """A copy of the token's user, or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                user, deadline = entry
+                if time.monotonic() < deadline:
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    # A copy: requests may change their user (update_account)
+                    return copy.copy(user)
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def set(self, token, user, expires_in):
+        """Cache 'user' for at most 'expires_in' seconds (the token's remaining life)."""
+        ttl = min(settings.JWT_USER_CACHE_TTL, expires_in)
+        size = settings.JWT_USER_CACHE_SIZE
+        if ttl <= 0 or size <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (copy.copy(user), time.monotonic() + ttl)
+            self._entries.move_to_end(token)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def forget_user(self, pk):
+        """Drop every token of the user 'pk'."""
+        with self._lock:
+            for token in [token for token, (user, _) in self._entries.items() if user.pk == pk]:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_users = TokenUserCache()
+
+
+def cached_user_or_error(token):
+    """UserOrError from the cache, or None. Never touches the database."""
+    user = token_users.get(token)
+    return None if user is None else UserOrError(user=user)
+
+
+def load_user_or_error(token):
+    """Verify the token and load its user (one query), then cache it."""
+    try:
+        token_type = TokenType.from_token(token=token)
+        user = token_type.get_user_instance()
+    except PyJWTError:
+        return UserOrError(error=GQLAuthError(code=GQLAuthErrors.INVALID_TOKEN))
+    except TokenExpired:
+        return UserOrError(error=GQLAuthError(code=GQLAuthErrors.EXPIRED_TOKEN))
+    except get_user_model().DoesNotExist:
+        # A valid token for a deleted account
+        return UserOrError(error=GQLAuthError(code=GQLAuthErrors.INVALID_TOKEN))
+    # payload.exp is naive UTC, like utcnow()
+    token_users.set(token, user, (token_type.payload.exp - datetime.utcnow()).total_seconds())
+    return UserOrError(user=user)
+
+
+def request_memo(request):
+    memo = getattr(request, REQUEST_MEMO, None)
+    if memo is None:
+        memo = {}
+        setattr(request, REQUEST_MEMO, memo)
+    return memo
+
+
+def find_token(request, token):
+    # Without an explicit token, the Authorization header ("JWT <token>")
+    return app_settings.JWT_TOKEN_FINDER(request) if token is None else token
+
+
+def get_user_or_error(request, token=None):
+    """
+    Like gqlauth's get_user_or_error(), through the caches. 'token'
+    defaults to the one in the Authorization header.
+    """
+    token = find_token(request, token)
+    if not token:
+        return UserOrError(error=GQLAuthError(code=GQLAuthErrors.MISSING_TOKEN))
+    memo = request_memo(request)
+    if token not in memo:
+        memo[token] = cached_user_or_error(token) or load_user_or_error(token)
+    return memo[token]
+
+
+async def aget_user_or_error(request, token=None):
+    """get_user_or_error() for async code: only a cache miss leaves the event loop."""
+    token = find_token(request, token)
+    if not token:
+        return UserOrError(error=GQLAuthError(code=GQLAuthErrors.MISSING_TOKEN))
+    memo = request_memo(request)
+    if token not in memo:
+        memo[token] = cached_user_or_error(token) or await sync_to_async(load_user_or_error)(token)
+    return memo[token]
@@ -8,6 +8,9 @@ USERNAME_FIELD = "email".
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+from .hashers import check_dummy_password
 
 UserModel = get_user_model()
 
@@ -18,7 +21,13 @@ class EmailBackend(ModelBackend):
     
     This is necessary because our CustomUser model uses email as the
     USERNAME_FIELD, but we want to support both email and username
-    for flexibility.
+    for flexibility. It does ModelBackend's lookup by email too, so it has
+    the last word on a username/password login: a failed one raises
+    PermissionDenied, which stops authenticate() before ModelBackend
+    hashes the password a second time. ModelBackend stays listed after it
+    only for the sessions it logged in (see AUTHENTICATION_BACKENDS).
+
+    A successful login re-hashes an outdated password (see hashers.py).
     """
     
     def authenticate(self, request, username=None, password=None, **kwargs):
@@ -32,7 +41,12 @@ class EmailBackend(ModelBackend):
             **kwargs: Additional keyword arguments
             
         Returns:
-            User object if authentication succeeds, None otherwise
+            User object if authentication succeeds, None if there are no
+            username and password to check
+
+        Raises:
+            PermissionDenied: the username and password don't match an
+                active user
         """
         if username is None:
             username = kwargs.get(UserModel.USERNAME_FIELD)
@@ -49,12 +63,11 @@ class EmailBackend(ModelBackend):
                 # Fall back to username field
                 user = UserModel.objects.get(username=username)
         except UserModel.DoesNotExist:
-            # Run the default password hasher once to reduce the timing
-            # difference between an existing and a nonexistent user
-            UserModel().set_password(password)
-            return None
+            # Check the password anyway, with the current hasher, so that a
+            # nonexistent user takes as long as a wrong password
+            check_dummy_password(password)
         else:
             if user.check_password(password) and self.user_can_authenticate(user):
                 return user
-        
-        return None
+
+        raise PermissionDenied
@@ -0,0 +1,77 @@
+"""
+Password hashers whose cost comes from settings, and the dummy check for
+logins to accounts that don't exist.
+
+PASSWORD_HASHER picks the hasher for new passwords: "scrypt" (the
+default), "argon2" (needs argon2-cffi) or "pbkdf2". The other hashers
+stay in PASSWORD_HASHERS so existing hashes still verify. Whenever a
+password checks out against a hash made by another hasher, or with other
+cost parameters than the current ones, Django hashes it again with the
+current settings and saves it (AbstractBaseUser.check_password). Raising
+a cost or switching hashers thus upgrades every account the next time
+its owner logs in.
+
+The costs are read from settings on every call, so override_settings
+works in tests.
+"""
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.crypto import get_random_string
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    # An upper bound for OpenSSL, not an allocation: a hash needs 128 * n * r
+    # bytes, more than the default limit (32 MiB) from n=2**15, r=8 on
+    maxmem = 2**30
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+# A hash of a random password with the current hasher and costs, made once
+_dummy_hash = None
+
+
+def check_dummy_password(password):
+    """
+    Check 'password' against a hash no password matches, made with the
+    current hasher and costs. For logins to accounts that don't exist: it
+    costs what checking a real, up to date hash costs, so the response
+    time doesn't tell whether the account exists.
+    """
+    global _dummy_hash
+    hasher = hashers.get_hasher()
+    encoded = _dummy_hash
+    if encoded is None or not encoded.startswith(f"{hasher.algorithm}$") or hasher.must_update(encoded):
+        encoded = _dummy_hash = hasher.encode(get_random_string(32), hasher.salt())
+    hasher.verify(password, encoded)
@@ -0,0 +1,20 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from .models import OutboxEmail
+
+
+class OutboxBackend(BaseEmailBackend):
+    """
+    EMAIL_BACKEND that queues messages in the outbox instead of sending
+    them; 'manage.py send_queued_email' delivers them with
+    EMAIL_DELIVERY_BACKEND.
+
+    The rows are written in the caller's transaction: a request no longer
+    waits for SMTP, and an email only goes out if whatever triggered it
+    commits (a registration that rolls back sends nothing).
+    """
+
+    def send_messages(self, email_messages):
+        emails = [OutboxEmail.from_message(message) for message in email_messages]
+        OutboxEmail.objects.bulk_create(emails)
+        return len(emails)
@@ -0,0 +1,39 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from users.outbox import run_worker
+
+
+class Command(BaseCommand):
+    help = "Deliver the emails queued in the outbox (activation, password reset...)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--connections", type=int, default=2,
+            help="Emails sent at the same time, each over its own connection (default: 2)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=50,
+            help="Emails claimed from the outbox at a time (default: 50)",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0,
+            help="Seconds between checks when the outbox is empty (default: 2)",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once nothing is due instead of waiting for new emails",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sent, failed = asyncio.run(run_worker(
+                connections=options["connections"],
+                batch_size=options["batch_size"],
+                poll_interval=options["poll_interval"],
+                once=options["once"],
+            ))
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f"Done: {sent} sent, {failed} failed"))
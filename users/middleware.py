@@ -0,0 +1,33 @@
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.decorators import sync_and_async_middleware
+from gqlauth.core.middlewares import USER_OR_ERROR_KEY
+
+from .auth import aget_user_or_error, get_user_or_error
+
+
+@sync_and_async_middleware
+def jwt_middleware(get_response):
+    """
+    Drop-in replacement for gqlauth's django_jwt_middleware (JwtSchema reads
+    the same request attribute), with the token -> user caches of auth.py.
+    Unlike gqlauth's, a cached token costs no thread hop under ASGI.
+
+    The time it took is left in request.auth_seconds (see Tau/metrics.py).
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not hasattr(request, USER_OR_ERROR_KEY):
+                start = time.perf_counter()
+                setattr(request, USER_OR_ERROR_KEY, await aget_user_or_error(request))
+                request.auth_seconds = time.perf_counter() - start
+            return await get_response(request)
+    else:
+        def middleware(request):
+            if not hasattr(request, USER_OR_ERROR_KEY):
+                start = time.perf_counter()
+                setattr(request, USER_OR_ERROR_KEY, get_user_or_error(request))
+                request.auth_seconds = time.perf_counter() - start
+            return get_response(request)
+    return middleware
@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.mail import EmailMultiAlternatives
 from django.db import models
+from django.utils import timezone
 
 class CustomUser(AbstractUser):
     # We make email unique and required for a modern auth system
@@ -14,4 +16,82 @@ class CustomUser(AbstractUser):
     REQUIRED_FIELDS = ["username"]
 
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+
+class EmailStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    SENT = "sent", "Sent"
+    FAILED = "failed", "Failed"  # Gave up after EMAIL_OUTBOX_MAX_ATTEMPTS
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent (activation, password reset...).
+    Written by mail.OutboxBackend, delivered by 'manage.py send_queued_email'.
+    """
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    subject = models.TextField()
+    # Both blanked once the email is sent or given up on (outbox.record)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+
+    status = models.CharField(max_length=10, choices=EmailStatus.choices, default=EmailStatus.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # When a worker may pick it up: now, after a backoff, or when a worker's lease runs out
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Workers only ever look for due, pending emails
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="outbox_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)}"
+
+    @classmethod
+    def from_message(cls, message):
+        if message.attachments:
+            # Nothing we send has any; don't drop them silently
+            raise ValueError("The email outbox doesn't store attachments")
+        html_body = next(
+            (content for content, mimetype in getattr(message, "alternatives", []) if mimetype == "text/html"),
+            "",
+        )
+        return cls(
+            from_email=message.from_email,
+            to=list(message.to),
+            cc=list(message.cc),
+            bcc=list(message.bcc),
+            reply_to=list(message.reply_to),
+            subject=message.subject,
+            body=message.body,
+            html_body=html_body,
+        )
+
+    def to_message(self, connection=None):
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.to,
+            cc=self.cc,
+            bcc=self.bcc,
+            reply_to=self.reply_to,
+            connection=connection,
+        )
+        if self.html_body:
+            message.attach_alternative(self.html_body, "text/html")
+        return message
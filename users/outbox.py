@@ -0,0 +1,206 @@
+"""
+Delivery of the emails queued by mail.OutboxBackend.
+
+Due emails are claimed a batch at a time with SELECT ... FOR UPDATE SKIP
+LOCKED and leased (their next_attempt_at moves LEASE seconds ahead), so two
+workers never send the same email and a worker that dies mid-batch only
+delays it. A batch that waited or sent for too long stops LEASE_MARGIN
+seconds before its lease runs out and hands the rest back, rather than
+sending emails another worker may have claimed meanwhile. Each batch goes
+out over an already open connection of EMAIL_DELIVERY_BACKEND: one SMTP
+handshake per connection, not per email.
+
+A failed email is retried after EMAIL_OUTBOX_RETRY_DELAY seconds, doubling
+each time (capped at MAX_RETRY_DELAY), until EMAIL_OUTBOX_MAX_ATTEMPTS.
+Once an email is sent or given up on, its body is blanked: activation and
+password reset links must not outlive their delivery in the database.
+"""
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailStatus, OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# Seconds a claimed batch is reserved for its worker
+LEASE = 300
+# Seconds before the lease runs out at which a worker stops sending a batch
+LEASE_MARGIN = 30
+MAX_RETRY_DELAY = 3600
+# Seconds without work after which a worker closes its connection
+IDLE_TIMEOUT = 30
+
+
+def delivery_connection():
+    return get_connection(settings.EMAIL_DELIVERY_BACKEND)
+
+
+def close_db_connections():
+    # Run through sync_to_async: closes the connections of its thread
+    connections.close_all()
+
+
+def claim(batch_size):
+    """Lease up to 'batch_size' due emails, oldest first."""
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects
+            .filter(status=EmailStatus.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "pk")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if emails:
+            leased_until = now + timedelta(seconds=LEASE)
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                next_attempt_at=leased_until
+            )
+            for email in emails:
+                email.next_attempt_at = leased_until
+    return emails
+
+
+class LeaseExpired(Exception):
+    """The email's lease ran out (nearly) before send() got to it."""
+
+
+def send(emails, connection):
+    """
+    Send 'emails' over 'connection', which stays open for the next batch.
+    Returns (email, exception or None) pairs; emails whose lease is about
+    to run out are skipped with LeaseExpired. No database access, so it can
+    run in any thread.
+    """
+    results = []
+    for email in emails:
+        if timezone.now() >= email.next_attempt_at - timedelta(seconds=LEASE_MARGIN):
+            results.append((email, LeaseExpired()))
+            continue
+        try:
+            # No-op while the connection is open; reconnects after a failure
+            connection.open()
+            connection.send_messages([email.to_message(connection)])
+        except Exception as error:
+            results.append((email, error))
+            # Don't reuse a connection in an unknown state
+            connection.close()
+        else:
+            results.append((email, None))
+    return results
+
+
+def retry_delay(attempts):
+    return min(settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def record(results):
+    """Save the outcome of send(). Returns (sent, failed) counts."""
+    now = timezone.now()
+    sent = [email.pk for email, error in results if error is None]
+    if sent:
+        OutboxEmail.objects.filter(pk__in=sent).update(
+            status=EmailStatus.SENT, sent_at=now, attempts=F("attempts") + 1, last_error="",
+            body="", html_body="",
+        )
+
+    # Not attempted: due again right away, for this worker or another one
+    released = [email.pk for email, error in results if isinstance(error, LeaseExpired)]
+    if released:
+        OutboxEmail.objects.filter(pk__in=released).update(next_attempt_at=now)
+
+    failed = []
+    for email, error in results:
+        if error is None or isinstance(error, LeaseExpired):
+            continue
+        email.attempts += 1
+        email.last_error = f"{type(error).__name__}: {error}"
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = EmailStatus.FAILED
+            email.body = email.html_body = ""
+            logger.error("Giving up on email %s to %s: %s", email.pk, email.to, email.last_error)
+        else:
+            email.next_attempt_at = now + timedelta(seconds=retry_delay(email.attempts))
+            logger.warning("Email %s to %s failed, retrying: %s", email.pk, email.to, email.last_error)
+        failed.append(email)
+    OutboxEmail.objects.bulk_update(
+        failed, ["attempts", "last_error", "status", "next_attempt_at", "body", "html_body"]
+    )
+    return len(sent), len(failed)
+
+
+def send_queued(connection=None, batch_size=50):
+    """Claim and send one batch in this thread. Returns (sent, failed) counts."""
+    emails = claim(batch_size)
+    if not emails:
+        return 0, 0
+    connection = connection or delivery_connection()
+    try:
+        return record(send(emails, connection))
+    finally:
+        connection.close()
+
+
+async def run_worker(connections=2, batch_size=50, poll_interval=2.0, once=False):
+    """
+    Deliver queued emails until cancelled (or, with 'once', until nothing
+    is due). One task claims batches; 'connections' tasks send them, each
+    over its own connection, kept open while there is work.
+    Returns the total (sent, failed) counts.
+    """
+    queue = asyncio.Queue(maxsize=connections)
+    totals = [0, 0]
+
+    async def sender():
+        connection = delivery_connection()
+        try:
+            while True:
+                try:
+                    batch = await asyncio.wait_for(queue.get(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(connection.close)
+                    continue
+                if batch is None:
+                    return
+                try:
+                    # SMTP blocks: run it in a thread, off the event loop
+                    results = await asyncio.to_thread(send, batch, connection)
+                    sent, failed = await sync_to_async(record)(results)
+                except Exception:
+                    # The batch stays leased and is retried once LEASE runs out
+                    logger.exception("Could not deliver a batch of %s emails", len(batch))
+                    continue
+                totals[0] += sent
+                totals[1] += failed
+        finally:
+            await asyncio.to_thread(connection.close)
+
+    senders = [asyncio.create_task(sender()) for _ in range(connections)]
+    try:
+        while True:
+            # A worker lives for days: drop connections past CONN_MAX_AGE or broken
+            await sync_to_async(close_old_connections)()
+            batch = await sync_to_async(claim)(batch_size)
+            if batch:
+                # Waits while every connection is busy
+                await queue.put(batch)
+            elif once:
+                break
+            else:
+                await asyncio.sleep(poll_interval)
+        for _ in senders:
+            await queue.put(None)
+        await asyncio.gather(*senders)
+    finally:
+        for task in senders:
+            task.cancel()
+        await sync_to_async(close_db_connections)()
+    return tuple(totals)
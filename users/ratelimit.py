@@ -0,0 +1,188 @@
+"""
+Rate limits for the mutations that hash a password or send an email.
+
+Every protected operation has limits per client IP and/or per account in
+settings.RATE_LIMITS, as (attempts, seconds):
+
+    "login": {"ip": (30, 60), "account": (10, 300)}
+
+i.e. 30 attempts a minute from one IP, and 10 every five minutes on one
+account, whoever makes them. Each limit is a token bucket: it holds up to
+'attempts' tokens (the burst) and refills at attempts/seconds. An attempt
+takes a token from every bucket that applies and is refused, with a
+RATE_LIMITED error and a Retry-After header, when one is empty.
+
+rate_limit() is the first thing the resolvers call: a refused attempt
+costs a dictionary lookup, not a PBKDF2 hash (EmailBackend hashes even
+for unknown users, on purpose), so a credential-stuffing burst can't pin
+the CPUs.
+
+Where the buckets live is RATE_LIMIT_BACKEND:
+
+- MemoryBackend (default): in this process. Right for a single node; with
+  several workers each has its own buckets (streaming.W002 warns about it).
+- CacheBackend: in the Django cache, shared by every worker and node when
+  that cache is Redis or memcached. The cache API has no compare-and-set,
+  so it counts attempts in fixed windows of 'seconds' with atomic incr()
+  instead: a burst straddling two windows can get up to twice the limit.
+
+Any class with the same hit() method can be plugged in.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from graphql import GraphQLError
+
+from Tau.metrics import RATE_LIMIT_ALLOWED, RATE_LIMIT_REFUSED
+
+
+class RateLimited(GraphQLError):
+    def __init__(self, retry_after):
+        self.retry_after = math.ceil(retry_after)
+        super().__init__(
+            "Too many attempts, try again later",
+            extensions={"code": "RATE_LIMITED", "retryAfter": self.retry_after},
+        )
+
+
+class MemoryBackend:
+    """Token buckets in this process. Thread safe."""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, last update), least recently used first
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        """Take a token. Returns 0 if there was one, else the seconds until there is."""
+        rate = limit / period
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit, now))
+            tokens = min(limit, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # The bucket idle the longest, most likely full again anyway
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBackend:
+    """Fixed-window counters in the Django cache (RATE_LIMIT_CACHE), shared by every process."""
+
+    def __init__(self):
+        self.cache = caches[settings.RATE_LIMIT_CACHE]
+
+    def hit(self, key, limit, period):
+        now = time.time()
+        window = int(now // period)
+        key = f"{key}:{window}"
+        if self.cache.add(key, 1, timeout=period + 1):
+            count = 1
+        else:
+            try:
+                count = self.cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                self.cache.add(key, 1, timeout=period + 1)
+                count = 1
+        if count <= limit:
+            return 0
+        return (window + 1) * period - now
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(settings.RATE_LIMIT_BACKEND)()
+        return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    # Tests switch backends and limits with override_settings: start afresh
+    global _backend
+    if setting in ("RATE_LIMITS", "RATE_LIMIT_BACKEND", "RATE_LIMIT_CACHE"):
+        _backend = None
+
+
+def client_ip(request):
+    """
+    The client's address. Behind RATE_LIMIT_TRUSTED_PROXIES proxies (e.g.
+    1 for our nginx), the address the first of them saw, from
+    X-Forwarded-For: earlier entries can be made up by the client.
+    """
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [
+            address.strip() for address in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if address.strip()
+        ]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def account_key(account):
+    # Hashed: cache keys can't hold any character, and needn't hold emails
+    if account in (None, ""):
+        return None
+    return hashlib.sha256(str(account).strip().lower().encode()).hexdigest()[:32]
+
+
+def rate_limit(info, operation, account=None):
+    """
+    Count an attempt at 'operation' by the client of this request, and on
+    'account' (a username, email or pk) if given. Raises RateLimited when
+    a limit is reached. Call it before any expensive work.
+    """
+    limits = settings.RATE_LIMITS.get(operation)
+    if not limits:
+        return
+    request = info.context.request
+    values = {"ip": client_ip(request), "account": account_key(account)}
+    backend = get_backend()
+    for scope, (limit, period) in limits.items():
+        value = values.get(scope)
+        if not value:
+            continue
+        wait = backend.hit(f"ratelimit:{operation}:{scope}:{value}", limit, period)
+        if wait:
+            RATE_LIMIT_REFUSED.inc(1, operation, scope)
+            error = RateLimited(wait)
+            response = getattr(info.context, "response", None)
+            if response is not None:
+                response["Retry-After"] = str(error.retry_after)
+            raise error
+    RATE_LIMIT_ALLOWED.inc(1, operation)
+
+
+# For async resolvers: a CacheBackend does network I/O
+arate_limit = sync_to_async(rate_limit)
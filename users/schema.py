@@ -1,13 +1,19 @@
 import strawberry
 import strawberry_django
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from gqlauth.user import arg_mutations as mutations
 from gqlauth.user.queries import UserQueries
 from gqlauth.core.middlewares import JwtSchema
 from gqlauth.jwt.types_ import TokenType, ObtainJSONWebTokenInput, ObtainJSONWebTokenType
+from .auth import aget_user_or_error
 from .models import CustomUser
+from .ratelimit import arate_limit, rate_limit
 
 # 1. Define Custom User Type
 # We use this instead of the library's default so we can control exactly
@@ -23,42 +29,22 @@ class AccountType:
 @strawberry.type
 class Query:
     @strawberry.field
-    def me(self, info) -> AccountType | None:
+    async def me(self, info) -> AccountType | None:
         """Return the currently authenticated user."""
-        user = info.context.request.user
-        
-        # Fallback: Manual authentication if middleware failed but cookie is present
-        # This handles the case where gqlauth produces a nested JSON payload string
+        request = info.context.request
+        user = request.user
+
+        # Fallback: the token in the cookie, for browsers that don't send the
+        # Authorization header. Same verification and caches as the middleware,
+        # so a cookie holding the header's token is not decoded twice.
         if not user.is_authenticated:
-            import jwt
-            import json
-            from django.conf import settings
-            from django.contrib.auth import get_user_model
-            
-            token = info.context.request.COOKIES.get(settings.GRAPHQL_JWT['JWT_AUTH_COOKIE'])
+            token = request.COOKIES.get(settings.GRAPHQL_JWT['JWT_AUTH_COOKIE'])
             if token:
-                try:
-                    # Decode the token
-                    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-                    
-                    # Handle nested payload structure from gqlauth
-                    if 'payload' in payload and isinstance(payload['payload'], str):
-                        inner_payload = json.loads(payload['payload'])
-                        username = inner_payload.get('username')
-                    else:
-                        username = payload.get('username')
-                        
-                    if username:
-                        User = get_user_model()
-                        try:
-                            user = User.objects.get(username=username)
-                            # Manually set the user on the request for subsequent resolvers
-                            info.context.request.user = user
-                        except User.DoesNotExist:
-                            pass
-                except Exception:
-                    # Token invalid or expired
-                    pass
+                user_or_error = await aget_user_or_error(request, token)
+                if user_or_error.error is None:
+                    user = user_or_error.user
+                    # Set the user on the request for subsequent resolvers
+                    request.user = user
 
         if user.is_authenticated:
             return user
@@ -69,6 +55,9 @@ class Query:
 class CustomObtainJSONWebToken(mutations.ObtainJSONWebToken):
     @classmethod
     def resolve_mutation(cls, info, input_: ObtainJSONWebTokenInput) -> ObtainJSONWebTokenType:
+        # Before authenticate(): a refused attempt must not cost a password hash
+        rate_limit(info, "login", getattr(input_, "username", None))
+
         # Fix for "ObtainJSONWebTokenInput object has no attribute 'email'"
         # gqlauth expects 'email' attribute because USERNAME_FIELD='email',
         # but the input object only has 'username'.
@@ -259,6 +248,38 @@ class CustomVerifyAccount(mutations.VerifyAccount):
         
         return result
 
+# Rate limited versions of the gqlauth mutations that hash a password or send
+# an email (see ratelimit.py). The limit is checked before anything else.
+class CustomPasswordChange(mutations.PasswordChange):
+    @classmethod
+    def resolve_mutation(cls, info, input_: resolvers.PasswordChangeMixin.PasswordChangeInput) -> ObtainJSONWebTokenType:
+        rate_limit(info, "password_change", info.context.request.user.pk)
+        return super().resolve_mutation(info, input_)
+
+class CustomDeleteAccount(mutations.DeleteAccount):
+    @classmethod
+    def resolve_mutation(cls, info, input_: resolvers.ArchiveOrDeleteMixin.ArchiveOrDeleteMixinInput) -> resolvers.MutationNormalOutput:
+        rate_limit(info, "delete_account", info.context.request.user.pk)
+        return super().resolve_mutation(info, input_)
+
+class CustomPasswordReset(mutations.PasswordReset):
+    @classmethod
+    def resolve_mutation(cls, info, input_: resolvers.PasswordResetMixin.PasswordResetInput) -> resolvers.MutationNormalOutput:
+        rate_limit(info, "password_reset")
+        return super().resolve_mutation(info, input_)
+
+class CustomPasswordSet(mutations.PasswordSet):
+    @classmethod
+    def resolve_mutation(cls, info, input_: resolvers.PasswordSetMixin.PasswordSetInput) -> resolvers.MutationNormalOutput:
+        rate_limit(info, "password_reset")
+        return super().resolve_mutation(info, input_)
+
+class CustomSendPasswordResetEmail(mutations.SendPasswordResetEmail):
+    @classmethod
+    def resolve_mutation(cls, info, input_: resolvers.SendPasswordResetEmailMixin.SendPasswordResetEmailInput) -> resolvers.MutationNormalOutput:
+        rate_limit(info, "password_reset_email", input_.email)
+        return super().resolve_mutation(info, input_)
+
 @strawberry.type
 class Mutation:
     # --- Standard Auth Tools (Login/Tokens) ---
@@ -270,63 +291,79 @@ class Mutation:
     # --- Account Management Helpers ---
     verify_account = CustomVerifyAccount.field
     update_account = mutations.UpdateAccount.field
-    delete_account = mutations.DeleteAccount.field
-    password_change = mutations.PasswordChange.field
-    password_reset = mutations.PasswordReset.field
-    password_set = mutations.PasswordSet.field
+    delete_account = CustomDeleteAccount.field
+    password_change = CustomPasswordChange.field
+    password_reset = CustomPasswordReset.field
+    send_password_reset_email = CustomSendPasswordResetEmail.field
+    password_set = CustomPasswordSet.field
     
     # --- CUSTOM REGISTRATION LOGIC ---
     @strawberry.mutation
-    def register(
+    async def register(
         self, 
         info,
         username: str, 
         email: str, 
         password: str
     ) -> AccountType:
-        
-        # Step A: Security - Check Password Strength
-        # This runs against the validators in your settings.py
-        try:
-            validate_password(password)
-        except ValidationError as e:
-            # Return the specific reason (e.g., "Password too short")
-            raise Exception(f"Weak Password: {e.messages[0]}")
-
-        # Step B: Check duplicates
-        if CustomUser.objects.filter(email=email).exists():
-             raise Exception("Email already exists")
-        
-        if CustomUser.objects.filter(username=username).exists():
-             raise Exception("Username already exists")
-
-        # Step C: Create the user safely
-        # .create_user() handles the password hashing for us.
-        # We use transaction.atomic to ensure user creation and email sending (or status update) happen together
-        from django.db import transaction
-
-        with transaction.atomic():
-            user = CustomUser.objects.create_user(
-                username=username, 
-                email=email, 
-                password=password
-            )
-            
-            # Force "Unverified" state
-            user.is_active = False
-            user.save()
-            
-            # Send Email using Library Utility
-            # gqlauth attaches a 'status' OneToOne field to the user (UserStatus model)
-            # We call the method on that related object.
-            if hasattr(user, 'status'):
-                user.status.send_activation_email(info)
-        
-        return user
+        # Before anything else, password hashing included (see ratelimit.py)
+        await arate_limit(info, "register", email)
+
+        # Step A: Create the user, inactive ("unverified"), in a single INSERT.
+        # No exists() checks first: they would race with concurrent sign-ups
+        # anyway. The unique constraints on email/username decide, and we
+        # translate their IntegrityError below.
+        user = CustomUser(
+            username=CustomUser.normalize_username(username),
+            email=CustomUser.objects.normalize_email(email),
+            is_active=False,
+        )
+
+        # Step B: Save the user and queue the activation email together
+        # Transactions don't exist in async code, so this block runs in a thread.
+        # So do the password checks and the hashing (slow on purpose): on the
+        # event loop they would stall every other request of this worker
+        @sync_to_async
+        def create_user():
+            # Security - Check Password Strength
+            # This runs against the validators in your settings.py
+            try:
+                validate_password(password)
+            except ValidationError as e:
+                # Return the specific reason (e.g., "Password too short")
+                raise Exception(f"Weak Password: {e.messages[0]}")
+
+            # Hashed before the transaction starts
+            user.set_password(password)
+
+            try:
+                with transaction.atomic():
+                    user.save()
+
+                    # Send Email using Library Utility
+                    # gqlauth attaches a 'status' OneToOne field to the user (UserStatus model)
+                    # We call the method on that related object.
+                    if hasattr(user, 'status'):
+                        user.status.send_activation_email(info)
+            except IntegrityError:
+                # Only on the failure path: which of the two was taken?
+                taken = list(
+                    CustomUser.objects
+                    .filter(Q(email=user.email) | Q(username=user.username))
+                    .values_list("email", flat=True)
+                )
+                if user.email in taken:
+                    raise Exception("Email already exists")
+                if taken:
+                    raise Exception("Username already exists")
+                raise
+            return user
+
+        return await create_user()
 
     @strawberry.mutation
-    def delete_all_users(self) -> str:
-        count, _ = CustomUser.objects.all().delete()
+    async def delete_all_users(self) -> str:
+        count, _ = await CustomUser.objects.all().adelete()
         return f"Deleted {count} users"
 
 # 4. Schema Wrapper
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import token_users
+from .models import CustomUser
+
+
+# A changed account (deactivated, new password, deleted) must not keep
+# authenticating from the token cache. Other processes catch up within
+# JWT_USER_CACHE_TTL.
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_cached_tokens(sender, instance, **kwargs):
+    token_users.forget_user(instance.pk)
@@ -1,6 +1,12 @@
 from django.test import TestCase
+import asyncio
 import json
-from django.test import TestCase, Client
+import threading
+from unittest import mock
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from .models import CustomUser
 
 class RegisterMutationTest(TestCase):
@@ -54,4 +60,92 @@ class RegisterMutationTest(TestCase):
         user = CustomUser.objects.get(email="test@example.com")
         
         # Verify password was hashed (not plain text)
-        self.assertTrue(user.check_password("Str0ng!Passw0rd123"))
\ No newline at end of file
+        self.assertTrue(user.check_password("Str0ng!Passw0rd123"))
+
+REGISTER = """
+    mutation Register($username: String!, $email: String!) {
+        register(username: $username, email: $email, password: "Str0ng!Passw0rd123") {
+            username
+        }
+    }
+"""
+
+
+def register(client, username, email):
+    response = client.post(
+        "/graphql/",
+        data=json.dumps({"query": REGISTER, "variables": {"username": username, "email": email}}),
+        content_type="application/json",
+    )
+    return json.loads(response.content)
+
+
+class RegisterDuplicatesTest(TestCase):
+    def setUp(self):
+        CustomUser.objects.create_user(username="taken", email="taken@example.com", password="x")
+
+    def test_new_user_is_inactive(self):
+        with CaptureQueriesContext(connection) as queries:
+            content = register(Client(), "newuser", "new@example.com")
+        self.assertNotIn("errors", content)
+        # A single write of the user: no exists() checks, no second save()
+        user_queries = [query["sql"] for query in queries if '"users_customuser"' in query["sql"]]
+        self.assertEqual(len(user_queries), 1)
+        self.assertTrue(user_queries[0].startswith("INSERT"))
+        self.assertFalse(CustomUser.objects.get(email="new@example.com").is_active)
+
+    def test_password_is_hashed_off_the_event_loop(self):
+        loops = []
+
+        def set_password(user, password):
+            # Raises RuntimeError in a thread without an event loop
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            user.password = make_password(password)
+
+        with mock.patch.object(CustomUser, "set_password", set_password):
+            content = register(Client(), "newuser", "new@example.com")
+        self.assertNotIn("errors", content)
+        self.assertEqual(loops, [None])
+
+    def test_duplicate_email(self):
+        content = register(Client(), "other", "taken@example.com")
+        self.assertEqual(content["errors"][0]["message"], "Email already exists")
+
+    def test_duplicate_username(self):
+        content = register(Client(), "taken", "other@example.com")
+        self.assertEqual(content["errors"][0]["message"], "Username already exists")
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+
+# Twelve sign-ups of one address from one client are over the rate limits
+# (users/ratelimit.py), which aren't what this test is about
+@override_settings(RATE_LIMITS={})
+class ConcurrentRegisterTest(TransactionTestCase):
+    def test_simultaneous_registrations_of_one_email(self):
+        # Signup campaign: the same address submitted many times at once
+        attempts = 12
+        barrier = threading.Barrier(attempts)
+        results = []
+
+        def attempt(number):
+            client = Client()
+            try:
+                barrier.wait()
+                results.append(register(client, f"user{number}", "rush@example.com"))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(number,)) for number in range(attempts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        succeeded = [result for result in results if "errors" not in result]
+        errors = [result["errors"][0]["message"] for result in results if "errors" in result]
+        self.assertEqual(len(succeeded), 1)
+        self.assertEqual(errors, ["Email already exists"] * (attempts - 1))
+        self.assertEqual(CustomUser.objects.filter(email="rush@example.com").count(), 1)
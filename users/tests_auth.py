@@ -0,0 +1,122 @@
+import json
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import jwt
+from django.conf import settings
+from django.test import Client, RequestFactory, TestCase, override_settings
+from gqlauth.core.types_ import GQLAuthErrors
+from gqlauth.core.utils import app_settings
+from gqlauth.jwt.types_ import TokenPayloadType
+
+from .auth import get_user_or_error, token_users
+from .models import CustomUser
+
+ME_QUERY = "{ me { username email } }"
+
+
+def make_token(user, expires_in):
+    """A token like gqlauth's, expiring in 'expires_in' seconds."""
+    pk_name = app_settings.JWT_PAYLOAD_PK.python_name
+    payload = TokenPayloadType(
+        **{pk_name: getattr(user, pk_name)},
+        exp=datetime.utcnow() + timedelta(seconds=expires_in),
+    )
+    return jwt.encode(
+        {"payload": json.dumps(payload.as_dict(), sort_keys=True, indent=1)},
+        key=app_settings.JWT_SECRET_KEY.value,
+        algorithm=app_settings.JWT_ALGORITHM,
+    )
+
+
+class CachedJwtAuthTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = CustomUser.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="Str0ng!Passw0rd123",
+        )
+        token_users.clear()
+        self.addCleanup(token_users.clear)
+        self.token = make_token(self.user, 900)
+
+    def me(self, **headers):
+        response = self.client.post(
+            "/graphql/",
+            data=json.dumps({"query": ME_QUERY}),
+            content_type="application/json",
+            **headers,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["data"]["me"]
+
+    def test_token_is_verified_once_per_process(self):
+        with self.assertNumQueries(1):
+            me = self.me(HTTP_AUTHORIZATION=f"JWT {self.token}")
+        self.assertEqual(me["username"], "testuser")
+
+        # Next request with the same token: no query at all
+        with self.assertNumQueries(0):
+            me = self.me(HTTP_AUTHORIZATION=f"JWT {self.token}")
+        self.assertEqual(me["username"], "testuser")
+
+    def test_cookie_token_uses_the_same_cache(self):
+        self.client.cookies[settings.GRAPHQL_JWT["JWT_AUTH_COOKIE"]] = self.token
+        with self.assertNumQueries(1):
+            self.assertEqual(self.me()["email"], "test@example.com")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me()["email"], "test@example.com")
+
+    @override_settings(JWT_USER_CACHE_SIZE=0)
+    def test_token_is_resolved_once_per_request(self):
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {self.token}")
+        with self.assertNumQueries(1):
+            first = get_user_or_error(request)
+            # e.g. me's cookie fallback, holding the same token
+            second = get_user_or_error(request, self.token)
+        self.assertIs(first, second)
+        self.assertEqual(first.user, self.user)
+
+        # Without the process cache, another request loads the user again
+        other = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {self.token}")
+        with self.assertNumQueries(1):
+            get_user_or_error(other)
+
+    def test_entry_never_outlives_its_token(self):
+        token = make_token(self.user, 5)  # Expires well before JWT_USER_CACHE_TTL
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {token}")
+        self.assertIsNone(get_user_or_error(request).error)
+
+        now = time.monotonic()
+        with mock.patch("users.auth.time.monotonic", return_value=now + 4):
+            self.assertEqual(token_users.get(token), self.user)
+        with mock.patch("users.auth.time.monotonic", return_value=now + 6):
+            self.assertIsNone(token_users.get(token))
+
+    def test_expired_and_invalid_tokens(self):
+        expired = make_token(self.user, -1)
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {expired}")
+        self.assertEqual(get_user_or_error(request).error.message, GQLAuthErrors.EXPIRED_TOKEN.value)
+
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {self.token}x")
+        self.assertEqual(get_user_or_error(request).error.message, GQLAuthErrors.INVALID_TOKEN.value)
+        self.assertEqual(len(token_users), 0)
+
+    def test_saving_or_deleting_the_user_drops_its_tokens(self):
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {self.token}")
+        get_user_or_error(request)
+        self.assertEqual(len(token_users), 1)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(token_users.get(self.token))
+
+        get_user_or_error(RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {self.token}"))
+        self.user.delete()
+        self.assertIsNone(token_users.get(self.token))
+
+        # A token of a deleted account is rejected, not a server error
+        request = RequestFactory().post("/graphql/", HTTP_AUTHORIZATION=f"JWT {self.token}")
+        self.assertEqual(get_user_or_error(request).error.message, GQLAuthErrors.INVALID_TOKEN.value)
@@ -0,0 +1,106 @@
+import hashlib
+import unittest
+from unittest import mock
+
+from django.contrib.auth import authenticate, get_user
+from django.contrib.auth.hashers import make_password
+from django.http import HttpRequest
+from django.test import TestCase, override_settings
+
+from . import hashers
+from .models import CustomUser
+
+PASSWORD = "Str0ng!Passw0rd123"
+
+# Cheap costs: the tests are about which parameters are used, not how slow they are
+SCRYPT = {
+    "PASSWORD_HASHERS": [
+        "users.hashers.ScryptPasswordHasher",
+        "users.hashers.Argon2PasswordHasher",
+        "users.hashers.PBKDF2PasswordHasher",
+    ],
+    "PASSWORD_SCRYPT_WORK_FACTOR": 2**10,
+    "PASSWORD_SCRYPT_BLOCK_SIZE": 8,
+    "PASSWORD_SCRYPT_PARALLELISM": 1,
+    "PASSWORD_PBKDF2_ITERATIONS": 1000,
+}
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+
+@override_settings(**SCRYPT)
+class PasswordHashingTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="testuser", email="test@example.com", password=PASSWORD
+        )
+
+    def stored_password(self):
+        self.user.refresh_from_db()
+        return self.user.password
+
+    def test_new_passwords_use_the_configured_costs(self):
+        algorithm, work_factor, _, block_size, parallelism, _ = self.stored_password().split("$")
+        self.assertEqual((algorithm, work_factor, block_size, parallelism), ("scrypt", "1024", "8", "1"))
+
+    def test_login_upgrades_an_older_hash(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            password=make_password(PASSWORD, hasher="pbkdf2_sha256")
+        )
+
+        # A wrong password leaves it alone
+        self.assertIsNone(authenticate(None, username="test@example.com", password="wrong"))
+        self.assertTrue(self.stored_password().startswith("pbkdf2_sha256$1000$"))
+
+        self.assertEqual(authenticate(None, username="testuser", password=PASSWORD), self.user)
+        self.assertTrue(self.stored_password().startswith("scrypt$1024$"))
+
+    def test_login_upgrades_a_hash_with_lower_costs(self):
+        with override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2**11):
+            self.assertEqual(authenticate(None, username="test@example.com", password=PASSWORD), self.user)
+        self.assertTrue(self.stored_password().startswith("scrypt$2048$"))
+        # And back down: what counts is matching the settings
+        self.assertEqual(authenticate(None, username="test@example.com", password=PASSWORD), self.user)
+        self.assertTrue(self.stored_password().startswith("scrypt$1024$"))
+
+    def test_failed_logins_cost_one_hash(self):
+        # The dummy hash is made once; don't count that
+        authenticate(None, username="nobody@example.com", password=PASSWORD)
+
+        with mock.patch.object(hashlib, "scrypt", wraps=hashlib.scrypt) as scrypt:
+            self.assertIsNone(authenticate(None, username="nobody@example.com", password=PASSWORD))
+            self.assertEqual(scrypt.call_count, 1)
+            self.assertIsNone(authenticate(None, username="nobody", password=PASSWORD))
+            self.assertEqual(scrypt.call_count, 2)
+            self.assertIsNone(authenticate(None, username="test@example.com", password="wrong"))
+            self.assertEqual(scrypt.call_count, 3)
+
+    def test_model_backend_sessions_still_load_their_user(self):
+        # Logged in before EmailBackend took over password logins
+        self.client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        request = HttpRequest()
+        request.session = self.client.session
+        self.assertEqual(get_user(request), self.user)
+
+    def test_dummy_hash_follows_the_settings(self):
+        hashers.check_dummy_password(PASSWORD)
+        with override_settings(PASSWORD_SCRYPT_WORK_FACTOR=2**11):
+            hashers.check_dummy_password(PASSWORD)
+            self.assertTrue(hashers._dummy_hash.startswith("scrypt$2048$"))
+        with override_settings(PASSWORD_HASHERS=["users.hashers.PBKDF2PasswordHasher"]):
+            hashers.check_dummy_password(PASSWORD)
+            self.assertTrue(hashers._dummy_hash.startswith("pbkdf2_sha256$1000$"))
+
+    @unittest.skipIf(argon2 is None, "argon2-cffi is not installed")
+    @override_settings(
+        PASSWORD_HASHERS=SCRYPT["PASSWORD_HASHERS"][1:] + SCRYPT["PASSWORD_HASHERS"][:1],
+        PASSWORD_ARGON2_TIME_COST=1,
+        PASSWORD_ARGON2_MEMORY_COST=1024,
+        PASSWORD_ARGON2_PARALLELISM=1,
+    )
+    def test_argon2(self):
+        self.assertEqual(authenticate(None, username="test@example.com", password=PASSWORD), self.user)
+        self.assertTrue(self.stored_password().startswith("argon2$argon2id$v=19$m=1024,t=1,p=1$"))
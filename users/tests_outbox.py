@@ -0,0 +1,207 @@
+import json
+import socketserver
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from gqlauth.models import UserStatus
+
+from .models import CustomUser, EmailStatus, OutboxEmail
+from .outbox import LEASE, LEASE_MARGIN, claim, record, send, send_queued
+
+OUTBOX = {"EMAIL_BACKEND": "users.mail.OutboxBackend"}
+LOCMEM = "django.core.mail.backends.locmem.EmailBackend"
+SMTP = "django.core.mail.backends.smtp.EmailBackend"
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: accepts everything, or refuses every recipient."""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply("220 stub")
+        data = None
+        for raw in self.rfile:
+            line = raw.decode().rstrip("\r\n")
+            if data is not None:
+                if line == ".":
+                    with server.lock:
+                        server.messages.append("\n".join(data))
+                    data = None
+                    self.reply("250 OK")
+                else:
+                    data.append(line)
+                continue
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 stub")
+            elif command == "RCPT" and server.refuse:
+                self.reply("550 No such user")
+            elif command == "DATA":
+                data = []
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self, refuse=False):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.refuse = refuse
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = []
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def settings(self):
+        return override_settings(
+            EMAIL_DELIVERY_BACKEND=SMTP,
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+        )
+
+
+def queue_emails(count):
+    with override_settings(**OUTBOX):
+        for number in range(count):
+            mail.send_mail(f"Hello {number}", "Body", "tau@example.com", [f"user{number}@example.com"])
+
+
+@override_settings(**OUTBOX, EMAIL_DELIVERY_BACKEND=LOCMEM)
+class EmailOutboxTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def graphql(self, query):
+        response = self.client.post("/graphql/", data=json.dumps({"query": query}), content_type="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        content = response.json()
+        self.assertNotIn("errors", content)
+        return content["data"]
+
+    def test_register_only_queues_the_activation_email(self):
+        self.graphql("""
+            mutation {
+                register(username: "testuser", email: "test@example.com", password: "Str0ng!Passw0rd123") {
+                    username
+                }
+            }
+        """)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ["test@example.com"])
+        self.assertEqual(email.status, EmailStatus.PENDING)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(send_queued(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["test@example.com"])
+        # gqlauth's HTML template is sent as an alternative
+        self.assertEqual(mail.outbox[0].alternatives[0][1], "text/html")
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.SENT)
+        self.assertIsNotNone(email.sent_at)
+        # The activation link doesn't stay in the database
+        self.assertEqual((email.body, email.html_body), ("", ""))
+
+    def test_password_reset_email_goes_through_the_outbox(self):
+        user = CustomUser.objects.create_user(
+            username="testuser", email="test@example.com", password="Str0ng!Passw0rd123"
+        )
+        UserStatus.objects.filter(user=user).update(verified=True)
+
+        data = self.graphql('mutation { sendPasswordResetEmail(email: "test@example.com") { success errors } }')
+        self.assertTrue(data["sendPasswordResetEmail"]["success"])
+        self.assertEqual(OutboxEmail.objects.get().to, ["test@example.com"])
+        self.assertEqual(send_queued(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        queue_emails(1)
+        stub = SMTPStub(refuse=True).start()
+        self.addCleanup(stub.stop)
+
+        with stub.settings(), override_settings(EMAIL_OUTBOX_RETRY_DELAY=30, EMAIL_OUTBOX_MAX_ATTEMPTS=2):
+            before = timezone.now()
+            with self.assertLogs("users.outbox", "WARNING"):
+                self.assertEqual(send_queued(), (0, 1))
+            email = OutboxEmail.objects.get()
+            self.assertEqual(email.status, EmailStatus.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertIn("SMTPRecipientsRefused", email.last_error)
+            self.assertGreaterEqual(email.next_attempt_at, before + timedelta(seconds=30))
+            # Not due yet
+            self.assertEqual(claim(10), [])
+
+            # The second attempt is the last one
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs("users.outbox", "ERROR"):
+                self.assertEqual(send_queued(), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.status, EmailStatus.FAILED)
+            self.assertEqual(email.body, "")
+            self.assertEqual(claim(10), [])
+
+    def test_claimed_emails_are_leased(self):
+        queue_emails(3)
+        self.assertEqual(len(claim(2)), 2)
+        # Another worker only gets what's left
+        self.assertEqual(len(claim(10)), 1)
+        self.assertEqual(claim(10), [])
+
+
+    def test_batch_stops_before_its_lease_runs_out(self):
+        queue_emails(3)
+        emails = claim(10)
+        # The first email took most of the lease to send
+        later = timezone.now() + timedelta(seconds=LEASE - LEASE_MARGIN)
+        with mock.patch("users.outbox.timezone.now", side_effect=[timezone.now(), later, later]):
+            results = send(emails, mail.get_connection(LOCMEM))
+
+        self.assertEqual(record(results), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        # The other two are due again, no attempt counted
+        self.assertEqual(OutboxEmail.objects.filter(status=EmailStatus.SENT).count(), 1)
+        self.assertEqual(sorted(email.attempts for email in claim(10)), [0, 0])
+
+
+class SendQueuedEmailCommandTest(TransactionTestCase):
+    def test_batches_share_one_smtp_connection(self):
+        queue_emails(5)
+        stub = SMTPStub().start()
+        self.addCleanup(stub.stop)
+
+        with stub.settings():
+            call_command(
+                "send_queued_email", "--once", "--connections", "1", "--batch-size", "2",
+                stdout=StringIO(),
+            )
+
+        self.assertEqual(len(stub.messages), 5)
+        # Three batches, one handshake
+        self.assertEqual(stub.connections, 1)
+        self.assertEqual(OutboxEmail.objects.filter(status=EmailStatus.SENT).count(), 5)
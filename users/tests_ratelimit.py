@@ -0,0 +1,195 @@
+import json
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from gqlauth.models import UserStatus
+
+from Tau.metrics import RATE_LIMIT_ALLOWED, RATE_LIMIT_REFUSED, render_metrics
+
+from .hashers import check_dummy_password
+from .models import CustomUser
+from .ratelimit import CacheBackend, MemoryBackend, get_backend
+from .tests_auth import make_token
+
+LOGIN = """
+mutation Login($username: String!, $password: String!) {
+    tokenAuth(username: $username, password: $password) { success }
+}
+"""
+
+REGISTER = """
+mutation Register($email: String!) {
+    register(username: $email, email: $email, password: "Str0ng!Passw0rd123") { email }
+}
+"""
+
+PASSWORD_CHANGE = """
+mutation {
+    passwordChange(oldPassword: "wrong", newPassword1: "N3w!Passw0rd123", newPassword2: "N3w!Passw0rd123") {
+        success
+    }
+}
+"""
+
+DELETE_ACCOUNT = """
+mutation { deleteAccount(password: "wrong") { success } }
+"""
+
+LIMITS = {
+    "login": {"ip": (5, 60), "account": (2, 60)},
+    "register": {"ip": (1, 3600)},
+    "password_change": {"ip": (1, 60)},
+    "delete_account": {"ip": (1, 60)},
+}
+
+
+@override_settings(RATE_LIMITS=LIMITS, RATE_LIMIT_TRUSTED_PROXIES=0)
+class RateLimitTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        get_backend().clear()
+        self.addCleanup(get_backend().clear)
+        RATE_LIMIT_ALLOWED.clear()
+        RATE_LIMIT_REFUSED.clear()
+
+    def post(self, query, variables, **headers):
+        response = self.client.post(
+            "/graphql/",
+            data=json.dumps({"query": query, "variables": variables}),
+            content_type="application/json",
+            **headers,
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def login(self, username, **headers):
+        return self.post(LOGIN, {"username": username, "password": "wrong"}, **headers)
+
+    @staticmethod
+    def error_code(response):
+        errors = response.json().get("errors") or [{}]
+        return errors[0].get("extensions", {}).get("code")
+
+    def test_refused_logins_cost_no_password_hash(self):
+        with mock.patch("users.backends.check_dummy_password", wraps=check_dummy_password) as check:
+            for _ in range(2):
+                self.assertIsNone(self.error_code(self.login("ghost@example.com")))
+            self.assertEqual(check.call_count, 2)
+
+            # The account's limit is reached, whatever the case of the address
+            response = self.login("Ghost@Example.com")
+            self.assertEqual(self.error_code(response), "RATE_LIMITED")
+            self.assertEqual(check.call_count, 2)
+
+        # A token every 30 seconds, less the time the hashing above took
+        retry_after = response.json()["errors"][0]["extensions"]["retryAfter"]
+        self.assertTrue(0 < retry_after <= 30, retry_after)
+        self.assertEqual(response["Retry-After"], str(retry_after))
+
+    def test_limits_per_ip(self):
+        for number in range(5):
+            self.assertIsNone(self.error_code(self.login(f"user{number}@example.com")))
+        self.assertEqual(self.error_code(self.login("user5@example.com")), "RATE_LIMITED")
+        # Someone else
+        self.assertIsNone(self.error_code(self.login("user5@example.com", REMOTE_ADDR="10.0.0.2")))
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_client_address_behind_a_proxy(self):
+        for number in range(5):
+            # What the client put in X-Forwarded-For doesn't matter, only what the proxy added
+            self.login(f"user{number}@example.com", HTTP_X_FORWARDED_FOR=f"10.1.1.{number}, 10.0.0.2")
+        response = self.login("user5@example.com", HTTP_X_FORWARDED_FOR="10.1.1.9, 10.0.0.2")
+        self.assertEqual(self.error_code(response), "RATE_LIMITED")
+        response = self.login("user5@example.com", HTTP_X_FORWARDED_FOR="10.0.0.3")
+        self.assertIsNone(self.error_code(response))
+
+    def test_register_is_limited_before_creating_the_user(self):
+        response = self.post(REGISTER, {"email": "first@example.com"})
+        self.assertEqual(response.json()["data"]["register"]["email"], "first@example.com")
+
+        response = self.post(REGISTER, {"email": "second@example.com"})
+        self.assertEqual(self.error_code(response), "RATE_LIMITED")
+        self.assertFalse(CustomUser.objects.filter(email="second@example.com").exists())
+
+    def test_delete_account_has_its_own_limit(self):
+        user = CustomUser.objects.create_user(
+            username="testuser", email="test@example.com", password="Str0ng!Passw0rd123"
+        )
+        UserStatus.objects.filter(user=user).update(verified=True)
+        authorization = f"JWT {make_token(user, 900)}"
+        for query in (PASSWORD_CHANGE, DELETE_ACCOUNT):
+            self.assertIsNone(self.error_code(self.post(query, {}, HTTP_AUTHORIZATION=authorization)), query)
+        for query in (PASSWORD_CHANGE, DELETE_ACCOUNT):
+            response = self.post(query, {}, HTTP_AUTHORIZATION=authorization)
+            self.assertEqual(self.error_code(response), "RATE_LIMITED", query)
+
+    def test_counters_are_exported(self):
+        for _ in range(3):
+            self.login("ghost@example.com")
+        metrics = render_metrics()
+        self.assertIn('tau_rate_limit_allowed_total{operation="login"} 2', metrics)
+        self.assertIn('tau_rate_limit_refused_total{operation="login",scope="account"} 1', metrics)
+
+    @override_settings(RATE_LIMITS={})
+    def test_no_limits(self):
+        for _ in range(5):
+            self.assertIsNone(self.error_code(self.login("ghost@example.com")))
+
+
+class MemoryBackendTest(TestCase):
+    def test_bucket_refills(self):
+        backend = MemoryBackend()
+        with mock.patch("users.ratelimit.time.monotonic", return_value=100.0) as monotonic:
+            # A burst of 'limit' attempts, then one every period/limit seconds
+            self.assertEqual(backend.hit("key", 2, 10), 0)
+            self.assertEqual(backend.hit("key", 2, 10), 0)
+            self.assertEqual(backend.hit("key", 2, 10), 5)
+            self.assertEqual(backend.hit("other", 2, 10), 0)
+
+            monotonic.return_value = 103.0
+            self.assertAlmostEqual(backend.hit("key", 2, 10), 2)
+            monotonic.return_value = 105.0
+            self.assertEqual(backend.hit("key", 2, 10), 0)
+            self.assertAlmostEqual(backend.hit("key", 2, 10), 5)
+
+    def test_number_of_keys_is_bounded(self):
+        backend = MemoryBackend(max_keys=2)
+        for key in ("a", "b", "c"):
+            backend.hit(key, 1, 60)
+        # "a" was forgotten, i.e. its bucket is full again
+        self.assertEqual(backend.hit("a", 1, 60), 0)
+        self.assertGreater(backend.hit("c", 1, 60), 0)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class CacheBackendTest(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+
+    def test_fixed_window(self):
+        backend = CacheBackend()
+        with mock.patch("users.ratelimit.time.time", return_value=1000.0) as now:
+            self.assertEqual(backend.hit("key", 2, 60), 0)
+            self.assertEqual(backend.hit("key", 2, 60), 0)
+            # Until the window starting at 1020
+            self.assertEqual(backend.hit("key", 2, 60), 20)
+            now.return_value = 1020.0
+            self.assertEqual(backend.hit("key", 2, 60), 0)
+
+    @override_settings(
+        RATE_LIMITS={"login": {"account": (1, 60)}},
+        RATE_LIMIT_BACKEND="users.ratelimit.CacheBackend",
+    )
+    def test_limits_with_the_cache_backend(self):
+        client = Client()
+        codes = []
+        for _ in range(2):
+            response = client.post(
+                "/graphql/",
+                data=json.dumps({"query": LOGIN, "variables": {"username": "ghost@example.com", "password": "x"}}),
+                content_type="application/json",
+            )
+            codes.append(((response.json().get("errors") or [{}])[0]).get("extensions", {}).get("code"))
+        self.assertEqual(codes, [None, "RATE_LIMITED"])